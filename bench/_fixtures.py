@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Офлайн-фикстуры для бенчмарков: синтетический ru/kk корпус жалоб
+и крошечные бандлы моделей того же формата, что пишут train_priority/train_aspect.
+"""
+import os, random, tempfile
+from typing import Dict, List, Optional, Tuple
+import numpy as np, joblib
+from scipy.sparse import hstack
+from sklearn.svm import LinearSVC
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.linear_model import LogisticRegression
+
+from src.augment_noise import augment_text
+from src.featurize import SharedFeaturizer, make_word_vectorizer, make_char_vectorizer
+
+SEED = 42
+
+PHRASES: Dict[str, List[Tuple[str, str]]] = {
+    # priority -> [(фраза, аспект)]
+    "low": [
+        ("в салоне грязно", "vehicle_condition"), ("көлікте лас", "vehicle_condition"),
+        ("в автобусе холодно", "temperature"), ("автобуста суық", "temperature"),
+        ("сильный шум в салоне", "vehicle_condition"),
+    ],
+    "medium": [
+        ("автобус опоздал на 20 минут", "punctuality"), ("автобус кешікті", "punctuality"),
+        ("большой интервал между автобусами", "punctuality"), ("валидатор не работает", "payment"),
+        ("onay карта не проходит", "payment"), ("төлем өтпеді", "payment"),
+    ],
+    "high": [
+        ("автобус переполнен", "crowding"), ("автобус толы, сығылыс", "crowding"),
+        ("водитель грубил пассажирам", "staff_behavior"), ("кондуктор хамил", "staff_behavior"),
+        ("жүргізуші дөрекі сөйледі", "staff_behavior"),
+    ],
+    "critical": [
+        ("в салоне драка", "safety"), ("авария на перекрестке", "safety"),
+        ("опасно едет водитель", "safety"), ("автобуста өрт шықты", "safety"),
+        ("жолаушы жарақат алды", "safety"),
+    ],
+}
+CITIES = ["Астана", "Алматы", "Astana", "Almaty", ""]
+STOPS = ["Сарыарка", "Сарыарқа", "Сайран", "Ақсай", "Абай", "Достык", "Тулпар"]
+ROUTE_FMT = ["маршрут {r}", "автобус {r}", "№{r}", "{r} бағыт", "{r} маршрут"]
+STOP_FMT = ["на остановке {s}", "у остановки {s}", "{s} аялдамасына", "{s}"]
+TIME_FMT = ["в {h:02d}:{m:02d}", "утром", "вечером", "таңертең", "кешке", ""]
+
+def synthetic_corpus(n: int, seed: int = SEED, noise: float = 0.3) -> List[Dict[str, str]]:
+    rnd = random.Random(seed)
+    random.seed(seed)  # augment_text пользуется глобальным random
+    out = []
+    prios = list(PHRASES)
+    for _ in range(n):
+        pr = rnd.choice(prios)
+        phrase, asp = rnd.choice(PHRASES[pr])
+        parts = [
+            rnd.choice(CITIES),
+            rnd.choice(ROUTE_FMT).format(r=rnd.randint(1, 200)),
+            phrase,
+            rnd.choice(STOP_FMT).format(s=rnd.choice(STOPS)),
+            rnd.choice(TIME_FMT).format(h=rnd.randint(5, 23), m=rnd.randint(0, 59)),
+        ]
+        text = " ".join(p for p in parts if p).strip()
+        if rnd.random() < noise:
+            text = augment_text(text, n=2)
+        out.append({"text": text, "priority": pr, "aspect": asp})
+    return out
+
+# слоги для правдоподобных ru/kk названий остановок
+_SYL = ["са", "ры", "ар", "ка", "ай", "ран", "ақ", "сай", "аб", "ай", "дос", "тык", "тул", "пар", "қа",
+        "зақ", "бе", "рі", "кет", "мұ", "ра", "жол", "та", "ма", "ла", "ну", "ра", "құ", "дық", "ес", "іл"]
+_STOP_SUFFIX = ["", "", "", " мкр", " базар", " ТРЦ", " көшесі", " бекеті", " площадь", " 2"]
+
+def synthetic_stop_dict(n: int, seed: int = SEED, cities: int = 4) -> Dict[str, List[dict]]:
+    """Словарь остановок формата place_dict.STOP_DICT на n записей: {city: [{name, aliases, lat, lon}]}.
+
+    Первые записи — реальные STOPS из корпуса, чтобы тексты synthetic_corpus находили совпадения
+    и в маленьком, и в большом словаре; остальное — случайные уникальные имена с алиасами."""
+    rnd = random.Random(seed)
+    names: List[str] = []
+    seen = set()
+    for s in STOPS[:max(0, n)]:
+        if s not in seen:
+            seen.add(s); names.append(s)
+    while len(names) < n:
+        name = "".join(rnd.choice(_SYL) for _ in range(rnd.randint(2, 4))).capitalize() + rnd.choice(_STOP_SUFFIX)
+        if name not in seen:
+            seen.add(name); names.append(name)
+    city_names = ["Almaty", "Astana", "Shymkent", "Karaganda", "Aktobe", "Pavlodar"][:max(1, cities)]
+    out: Dict[str, List[dict]] = {c: [] for c in city_names}
+    for i, name in enumerate(names):
+        aliases = [name.replace("қ", "к").replace("ұ", "у").replace("і", "и")] if rnd.random() < 0.3 else []
+        aliases = [a for a in aliases if a != name]
+        out[city_names[i % len(city_names)]].append({
+            "name": name, "aliases": aliases,
+            "lat": round(43.0 + rnd.random() * 9.0, 6), "lon": round(51.0 + rnd.random() * 26.0, 6),
+        })
+    return out
+
+def long_text(base: str, length: int) -> str:
+    if not base:
+        return ""
+    reps = length // (len(base) + 1) + 1
+    return " ".join([base] * reps)[:length]
+
+def train_tiny_bundles(out_dir: Optional[str] = None, n: int = 800, seed: int = SEED,
+                       hashing: bool = False, word_bits: int = 18, char_bits: int = 19,
+                       char_analyzer: str = "char") -> Tuple[str, str]:
+    """Пишет models/priority.joblib и models/aspect_lr.joblib в out_dir (по умолчанию — temp).
+    char_analyzer — как --char_analyzer у train_priority (по умолчанию тот же char)."""
+    out_dir = out_dir or tempfile.mkdtemp(prefix="haka-bench-")
+    models = os.path.join(out_dir, "models")
+    os.makedirs(models, exist_ok=True)
+    rows = synthetic_corpus(n, seed=seed)
+    texts = [r["text"] for r in rows]
+    y = np.array([r["priority"] for r in rows])
+    ya = np.array([r["aspect"] for r in rows])
+
+    fmt = "hashing" if hashing else "vocab"
+    vect_word = make_word_vectorizer(hashing=hashing, n_features=2 ** word_bits, min_df=1)
+    vect_char = make_char_vectorizer(hashing=hashing, n_features=2 ** char_bits, min_df=1, analyzer=char_analyzer)
+    F = SharedFeaturizer({"word": vect_word, "char": vect_char}).fit_transform(texts)
+    Xw, Xc = F["word"], F["char"]
+    X = hstack([Xw, Xc], format="csr")
+    base_word = LinearSVC(class_weight="balanced", dual=True, random_state=seed).fit(Xw, y)
+    cut = int(len(texts) * 0.8)
+    inner = LinearSVC(class_weight="balanced", dual=True, random_state=seed).fit(X[:cut], y[:cut])
+    clf = CalibratedClassifierCV(inner, method="sigmoid", cv="prefit").fit(X[cut:], y[cut:])
+    p_path = os.path.join(models, "priority.joblib")
+    joblib.dump({"vect_word": vect_word, "vect_char": vect_char, "base_word": base_word,
+                 "clf": clf, "classes": np.unique(y), "format": fmt}, p_path)
+
+    vect = make_char_vectorizer(hashing=hashing, n_features=2 ** char_bits, min_df=1)
+    lr = LogisticRegression(class_weight="balanced", solver="liblinear", max_iter=200, random_state=seed)
+    lr.fit(SharedFeaturizer({"aspect": vect}).fit_transform(texts)["aspect"], ya)
+    a_path = os.path.join(models, "aspect_lr.joblib")
+    joblib.dump({"vect": vect, "clf": lr, "classes": np.unique(ya), "format": fmt}, a_path)
+    return p_path, a_path
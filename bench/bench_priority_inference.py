@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+sklearn predict + predict_proba  vs  CompiledCalibratedLinear (один matmul).
+
+    python -m bench.bench_priority_inference                       # tiny-бандл на лету
+    python -m bench.bench_priority_inference --priority models/priority.joblib --out reports/bench_priority.json
+"""
+import argparse, json, time
+import numpy as np, joblib
+from scipy.sparse import hstack
+
+from src.compiled_model import CompiledCalibratedLinear
+from ._fixtures import synthetic_corpus, train_tiny_bundles
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--priority", default=None, help="путь к priority.joblib (по умолчанию — tiny-бандл)")
+    ap.add_argument("--batches", default="1,8,64,256")
+    ap.add_argument("--calls", type=int, default=200, help="вызовов на замер")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    args = ap.parse_args()
+
+    path = args.priority or train_tiny_bundles()[0]
+    bundle = joblib.load(path)
+    clf = bundle["clf"]
+    comp = CompiledCalibratedLinear.from_sklearn(clf)
+    if comp is None:
+        raise SystemExit("model is not a sigmoid-calibrated linear classifier")
+
+    vw = bundle.get("vect_word") or bundle.get("vect")
+    vc = bundle.get("vect_char")
+    texts = [r["text"] for r in synthetic_corpus(max(int(b) for b in args.batches.split(",")))]
+    parts = [v.transform(texts) for v in (vw, vc) if v is not None]
+    X_all = hstack(parts, format="csr") if len(parts) > 1 else parts[0]
+
+    # корректность: побитовое совпадение
+    p_ref, P_ref = clf.predict(X_all), clf.predict_proba(X_all)
+    p_cmp, P_cmp = comp.predict_with_proba(X_all)
+    identical = bool(np.array_equal(P_ref, P_cmp) and np.array_equal(p_ref, p_cmp))
+
+    rows = []
+    for b in (int(x) for x in args.batches.split(",")):
+        X = X_all[:b]
+        def ref():
+            for _ in range(args.calls):
+                clf.predict(X); clf.predict_proba(X)
+        def fast():
+            for _ in range(args.calls):
+                comp.predict_with_proba(X)
+        t_ref = _best_of(ref, args.repeat) / args.calls
+        t_fast = _best_of(fast, args.repeat) / args.calls
+        rows.append({"batch": b, "sklearn_us": t_ref * 1e6, "compiled_us": t_fast * 1e6,
+                     "speedup": t_ref / t_fast if t_fast else None})
+
+    print(f"identical outputs: {identical}  (n_features={comp.n_features}, classes={list(comp.classes_)})")
+    print(f"{'batch':>6} {'sklearn, us':>12} {'compiled, us':>13} {'speedup':>8}")
+    for r in rows:
+        print(f"{r['batch']:>6} {r['sklearn_us']:>12.1f} {r['compiled_us']:>13.1f} {r['speedup']:>7.1f}x")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"model": path, "identical": identical, "results": rows}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Словарные (TfidfVectorizer) vs hashing (HashingTfidf) бандлы:
+качество (accuracy / macro-F1 на отложенных текстах), размер на диске,
+время joblib.load и прирост RSS после загрузки (в отдельном процессе).
+
+    python -m bench.compare_hashing                                  # оба tiny-бандла на лету
+    python -m bench.compare_hashing --vocab_dir . --hashing_dir /tmp/h --out reports/hashing.json
+"""
+import argparse, json, os, subprocess, sys
+import joblib
+from sklearn.metrics import accuracy_score, f1_score
+
+from src.featurize import SharedFeaturizer, hstack_features
+from ._fixtures import synthetic_corpus, train_tiny_bundles
+
+_RSS_PROBE = """
+import sys, time, joblib
+import sklearn.feature_extraction.text, sklearn.svm, sklearn.calibration, sklearn.linear_model
+import src.featurize
+def rss():
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmRSS:"))
+r0 = rss()
+t0 = time.perf_counter()
+objs = [joblib.load(p) for p in sys.argv[1:]]
+dt = time.perf_counter() - t0
+print(dt, rss() - r0)
+"""
+
+def _load_probe(paths):
+    """Свежий процесс (импорты уже сделаны): время joblib.load и прирост RSS (KiB)."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", _RSS_PROBE, *paths], cwd=root,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), int(out[1])
+
+def _evaluate(p_path, a_path, rows):
+    P, A = joblib.load(p_path), joblib.load(a_path)
+    texts = [r["text"] for r in rows]
+    F = SharedFeaturizer({"word": P.get("vect_word"), "char": P.get("vect_char"),
+                          "aspect": A["vect"]}).transform(texts)
+    X = hstack_features([F.get("word"), F.get("char")])
+    y, ya = [r["priority"] for r in rows], [r["aspect"] for r in rows]
+    yp, yap = P["clf"].predict(X), A["clf"].predict(F["aspect"])
+    return {
+        "priority_acc": accuracy_score(y, yp), "priority_f1": f1_score(y, yp, average="macro"),
+        "aspect_acc": accuracy_score(ya, yap), "aspect_f1": f1_score(ya, yap, average="macro"),
+    }
+
+def _measure(name, p_path, a_path, rows):
+    load_s, rss_kib = _load_probe([p_path, a_path])
+    return {
+        "variant": name,
+        "format": joblib.load(p_path).get("format", "vocab"),
+        "disk_mb": (os.path.getsize(p_path) + os.path.getsize(a_path)) / 2 ** 20,
+        "load_ms": load_s * 1000.0,
+        "rss_mb": rss_kib / 1024.0,
+        **_evaluate(p_path, a_path, rows),
+    }
+
+def _paths(d):
+    return os.path.join(d, "models", "priority.joblib"), os.path.join(d, "models", "aspect_lr.joblib")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vocab_dir", default=None, help="каталог с models/ словарного варианта")
+    ap.add_argument("--hashing_dir", default=None, help="каталог с models/ hashing-варианта")
+    ap.add_argument("--n_train", type=int, default=3000)
+    ap.add_argument("--n_test", type=int, default=1000)
+    ap.add_argument("--word_bits", type=int, default=18)
+    ap.add_argument("--char_bits", type=int, default=19)
+    ap.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    args = ap.parse_args()
+
+    vocab = _paths(args.vocab_dir) if args.vocab_dir else train_tiny_bundles(n=args.n_train)
+    hashed = _paths(args.hashing_dir) if args.hashing_dir else train_tiny_bundles(
+        n=args.n_train, hashing=True, word_bits=args.word_bits, char_bits=args.char_bits)
+    rows = synthetic_corpus(args.n_test, seed=7)  # другой seed — тексты, которых не было в train
+
+    res = [_measure("vocab", *vocab, rows), _measure("hashing", *hashed, rows)]
+    print(f"{'variant':>8} {'disk, MB':>9} {'load, ms':>9} {'RSS, MB':>8} "
+          f"{'prio acc':>9} {'prio F1':>8} {'asp acc':>8} {'asp F1':>7}")
+    for r in res:
+        print(f"{r['variant']:>8} {r['disk_mb']:>9.2f} {r['load_ms']:>9.1f} {r['rss_mb']:>8.1f} "
+              f"{r['priority_acc']:>9.3f} {r['priority_f1']:>8.3f} {r['aspect_acc']:>8.3f} {r['aspect_f1']:>7.3f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"results": res}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Качество и скорость fuzzy-матчинга остановок: триграммный шорт-лист (STOP_FUZZY_SHORTLIST)
+против полного перебора rapidfuzz по всем вариантам.
+
+Тексты — фразы корпуса с упоминанием случайной остановки словаря, в которое внесена опечатка
+(пропуск / перестановка / замена буквы, қ→к и т.п.), так что прямого совпадения нет и
+работает именно fuzzy. Для каждого размера словаря печатается:
+- acc_full / acc_short — доля текстов, где найдена загаданная остановка
+- agree — доля текстов, где шорт-лист вернул то же, что полный перебор (имя и score)
+- ms_full / ms_short — среднее время StopIndex.match
+
+    python -m bench.fuzzy_quality
+    python -m bench.fuzzy_quality --sizes 1000,50000 --k 16,32,64 --n 300
+"""
+import argparse, json, random, time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ._fixtures import PHRASES, STOP_FMT, TIME_FMT, synthetic_stop_dict
+
+from src import place_dict
+
+_SWAP = {"қ": "к", "ұ": "у", "і": "и", "ә": "а", "ө": "о", "ү": "у", "ң": "н", "ғ": "г"}
+
+def _typo(name: str, rnd: random.Random) -> str:
+    """Одна-две опечатки в названии (регистр и пробелы не трогаем)."""
+    s = list(name)
+    for _ in range(rnd.randint(1, 2)):
+        i = rnd.randrange(len(s))
+        op = rnd.random()
+        if s[i] in _SWAP and op < 0.3:
+            s[i] = _SWAP[s[i]]
+        elif op < 0.55 and len(s) > 4:
+            del s[i]
+        elif op < 0.8 and i + 1 < len(s):
+            s[i], s[i + 1] = s[i + 1], s[i]
+        else:
+            s[i] = rnd.choice("аоеиыуәқ")
+    return "".join(s)
+
+def noisy_mentions(stop_dict: Dict[str, List[dict]], n: int, seed: int) -> List[Tuple[str, str]]:
+    """[(текст, загаданное имя)] — только тексты без прямого совпадения."""
+    rnd = random.Random(seed)
+    names = [r["name"] for stops in stop_dict.values() for r in stops]
+    phrases = [p for rows in PHRASES.values() for p, _ in rows]
+    idx = place_dict.get_stop_index()
+    out: List[Tuple[str, str]] = []
+    while len(out) < n:
+        name = rnd.choice(names)
+        if len(name) < 5:
+            continue
+        text = " ".join(p for p in (rnd.choice(phrases), rnd.choice(STOP_FMT).format(s=_typo(name, rnd)),
+                                     rnd.choice(TIME_FMT).format(h=rnd.randint(5, 23), m=rnd.randint(0, 59))) if p)
+        if not idx.find_stops(text):
+            out.append((text, name))
+    return out
+
+def _run(idx: "place_dict.StopIndex", cases: List[Tuple[str, str]], k: int,
+         threshold: int) -> Tuple[List[Tuple[Optional[str], int]], float]:
+    t0 = time.perf_counter()
+    res = [idx.match(text, threshold=threshold, shortlist=k) for text, _ in cases]
+    return res, (time.perf_counter() - t0) / max(1, len(cases)) * 1e3
+
+def evaluate(size: int, ks: List[int], n: int, seed: int, threshold: int) -> List[Dict[str, Any]]:
+    place_dict.STOP_DICT = synthetic_stop_dict(size, seed=seed)
+    idx = place_dict.get_stop_index()
+    cases = noisy_mentions(place_dict.STOP_DICT, n, seed)
+    full, ms_full = _run(idx, cases, 0, threshold)
+    acc_full = sum(r[0] == name for r, (_, name) in zip(full, cases)) / len(cases)
+    rows = []
+    for k in ks:
+        short, ms_short = _run(idx, cases, k, threshold)
+        rows.append({
+            "stops": size, "k": k, "n": len(cases),
+            "acc_full": round(acc_full, 3),
+            "acc_short": round(sum(r[0] == name for r, (_, name) in zip(short, cases)) / len(cases), 3),
+            "agree": round(sum(a == b for a, b in zip(full, short)) / len(cases), 3),
+            "ms_full": round(ms_full, 3), "ms_short": round(ms_short, 3),
+        })
+        r = rows[-1]
+        print(f"stops={size:<6} k={k:<4} acc_full={r['acc_full']:.3f} acc_short={r['acc_short']:.3f} "
+              f"agree={r['agree']:.3f}  ms_full={r['ms_full']:>8.3f}  ms_short={r['ms_short']:>7.3f}", flush=True)
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="шорт-лист vs полный перебор в fuzzy_stop_match")
+    ap.add_argument("--sizes", default="1000,10000,50000", help="размеры словаря остановок")
+    ap.add_argument("--k", default=str(place_dict.FUZZY_SHORTLIST), help="размеры шорт-листа через запятую")
+    ap.add_argument("--n", type=int, default=200, help="текстов на размер словаря")
+    ap.add_argument("--threshold", type=int, default=70)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    args = ap.parse_args()
+    ks = [int(x) for x in args.k.split(",")]
+    rows = [r for size in (int(x) for x in args.sizes.split(",")) for r in evaluate(size, ks, args.n, args.seed, args.threshold)]
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
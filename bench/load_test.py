@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный прогон API: пропускная способность и p50/p95/p99 при разной конкурентности.
+
+Цели:
+- asgi (по умолчанию) — приложение src.api в этом же процессе, запросы идут прямо
+  в ASGI-интерфейс (без сети): видно стоимость пайплайна, event loop и пула
+- --spawn uvicorn|serve — поднимает настоящий сервер на свободном порту
+- --url http://host:port — уже запущенный сервер
+
+Корпус — synthetic_corpus (ru/kk + augment_text), модели — tiny-бандлы на лету,
+так что всё работает офлайн. Нагрузка закрытая: C клиентов шлют запросы подряд.
+
+    python -m bench.load_test                                     # asgi, 1/4/16/64
+    python -m bench.load_test --spawn serve --workers 4 --concurrency 8,32,128
+    python -m bench.load_test --endpoint batch --batch 32 --out reports/load.json
+    python -m bench.load_test --out new.json --baseline reports/load.json   # сравнение с прошлым коммитом
+"""
+import argparse, asyncio, json, os, platform, random, signal, socket, subprocess, sys, time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ._fixtures import synthetic_corpus, train_tiny_bundles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    i = min(len(sorted_vals) - 1, max(0, int(round(q / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[i]
+
+# -----------------------------------------------------------------------------
+# Транспорты: (path, body) → (status, body)
+# -----------------------------------------------------------------------------
+class AsgiClient:
+    """Минимальный ASGI-клиент + lifespan (startup/shutdown-хуки приложения)."""
+    def __init__(self, app):
+        self.app = app
+        self._lifespan_q: "asyncio.Queue[dict]" = asyncio.Queue()
+        self._lifespan_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        done = asyncio.Event()
+
+        async def receive():
+            return await self._lifespan_q.get()
+
+        async def send(msg):
+            if msg["type"].startswith("lifespan.startup") or msg["type"].startswith("lifespan.shutdown"):
+                done.set()
+
+        await self._lifespan_q.put({"type": "lifespan.startup"})
+        self._lifespan_task = asyncio.create_task(
+            self.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, receive, send))
+        await done.wait()
+        self._done = done
+
+    async def stop(self):
+        self._done.clear()
+        await self._lifespan_q.put({"type": "lifespan.shutdown"})
+        await asyncio.wait_for(self._done.wait(), 30)
+        await self._lifespan_task
+
+    async def request(self, path: str, body: bytes, client_id: int) -> Tuple[int, bytes]:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            # у каждого клиента свой IP — как у разных пользователей перед rate limit
+            "client": (f"10.0.{client_id // 256}.{client_id % 256}", 40000), "server": ("bench", 80),
+        }
+        sent = False
+        status, chunks = 0, []
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # клиент не отключается
+
+        async def send(msg):
+            nonlocal status
+            if msg["type"] == "http.response.start":
+                status = msg["status"]
+            elif msg["type"] == "http.response.body":
+                chunks.append(msg.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+class HttpClient:
+    """HTTP/1.1 keep-alive поверх asyncio streams: одно соединение на клиента."""
+    def __init__(self, url: str):
+        u = urlsplit(url)
+        self.host, self.port = u.hostname or "127.0.0.1", u.port or 80
+        self._conns: Dict[int, Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        for _, w in self._conns.values():
+            w.close()
+        self._conns.clear()
+
+    async def request(self, path: str, body: bytes, client_id: int) -> Tuple[int, bytes]:
+        conn = self._conns.get(client_id)
+        if conn is None:
+            conn = self._conns[client_id] = await asyncio.open_connection(self.host, self.port)
+        reader, writer = conn
+        writer.write((f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+        try:
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self._conns.pop(client_id, None)
+            writer.close()
+            return 0, b""
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+        data = await reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("connection", "").lower() == "close":
+            self._conns.pop(client_id, None)
+            writer.close()
+        return status, data
+
+# -----------------------------------------------------------------------------
+# Прогон одного уровня конкурентности
+# -----------------------------------------------------------------------------
+def _payloads(endpoint: str, texts: List[str], batch: int) -> Tuple[str, List[bytes]]:
+    if endpoint == "batch":
+        bodies = [json.dumps({"items": [{"text": t} for t in texts[i:i + batch]]}, ensure_ascii=False).encode()
+                  for i in range(0, len(texts) - batch + 1, batch)]
+        return "/analyze/batch", bodies
+    return "/analyze", [json.dumps({"text": t}, ensure_ascii=False).encode() for t in texts]
+
+async def _run_level(client, path: str, bodies: List[bytes], concurrency: int,
+                     requests: int, warmup: int) -> Dict[str, Any]:
+    counter = {"next": 0}
+    lat: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def worker(cid: int, n_limit: int, record: bool):
+        while counter["next"] < n_limit:
+            i = counter["next"]
+            counter["next"] += 1
+            t0 = time.perf_counter()
+            status, _ = await client.request(path, bodies[i % len(bodies)], cid)
+            dt = time.perf_counter() - t0
+            if record:
+                lat.append(dt)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    if warmup:
+        await asyncio.gather(*(worker(c, warmup, False) for c in range(concurrency)))
+    counter["next"] = 0
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(c, requests, True) for c in range(concurrency)))
+    wall = time.perf_counter() - t0
+
+    lat.sort()
+    ms = lambda v: round(v * 1000.0, 3)
+    ok = statuses.get("200", 0)
+    return {
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "ok": ok,
+        "errors": len(lat) - ok,
+        "statuses": statuses,
+        "wall_sec": round(wall, 3),
+        "rps": round(len(lat) / wall, 2) if wall > 0 else None,
+        "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+        "p50_ms": ms(_percentile(lat, 50)),
+        "p95_ms": ms(_percentile(lat, 95)),
+        "p99_ms": ms(_percentile(lat, 99)),
+        "max_ms": ms(lat[-1]) if lat else None,
+    }
+
+# -----------------------------------------------------------------------------
+# Цели
+# -----------------------------------------------------------------------------
+def _bench_env(models_dir: str) -> Dict[str, str]:
+    return {
+        "MODELS_DIR": os.path.join(models_dir, "models"),
+        "MODEL_ARTIFACTS": os.path.join(models_dir, "models", "artifacts"),
+        "RATE_LIMIT": "0",   # лимит не мерим
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _spawn(kind: str, workers: int, models_dir: str) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    if kind == "serve":
+        cmd = [sys.executable, "-m", "src.serve", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "src.api:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    env = {**os.environ, **_bench_env(models_dir),
+           "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    t0 = time.time()
+    while time.time() - t0 < 120:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            time.sleep(0.5 + 0.2 * workers)  # uvicorn --workers поднимает воркеров по одному
+            return proc, url
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{kind} exited with code {proc.returncode}")
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError(f"{kind} on :{port} did not become ready")
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def _compare(rows: List[Dict[str, Any]], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        base = {r["concurrency"]: r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for r in rows:
+        b = base.get(r["concurrency"])
+        if not b:
+            continue
+        d = lambda k: (r[k] / b[k] - 1.0) * 100.0 if b.get(k) else float("nan")
+        print(f"  c={r['concurrency']:<4} rps {d('rps'):+6.1f}%  p50 {d('p50_ms'):+6.1f}%  "
+              f"p95 {d('p95_ms'):+6.1f}%  p99 {d('p99_ms'):+6.1f}%")
+
+async def _run_all(client, path, bodies, levels, args) -> List[Dict[str, Any]]:
+    await client.start()
+    rows = []
+    try:
+        for c in levels:
+            r = await _run_level(client, path, bodies, c, args.requests, args.warmup)
+            rows.append(r)
+            print(f"c={r['concurrency']:<4} n={r['requests']:<6} err={r['errors']:<4} rps={r['rps']:>9.1f}  "
+                  f"p50={r['p50_ms']:8.2f}  p95={r['p95_ms']:8.2f}  p99={r['p99_ms']:8.2f}  max={r['max_ms']:8.2f} ms")
+    finally:
+        await client.stop()
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="нагрузочный прогон /analyze: rps и p50/p95/p99")
+    ap.add_argument("--url", default=None, help="уже запущенный сервер (http://host:port)")
+    ap.add_argument("--spawn", choices=["uvicorn", "serve"], default=None, help="поднять сервер на свободном порту")
+    ap.add_argument("--workers", type=int, default=1, help="воркеров для --spawn")
+    ap.add_argument("--models_dir", default=None, help="каталог с models/ (по умолчанию — tiny-бандлы)")
+    ap.add_argument("--endpoint", choices=["analyze", "batch"], default="analyze")
+    ap.add_argument("--batch", type=int, default=16, help="текстов в запросе для --endpoint batch")
+    ap.add_argument("--concurrency", default="1,4,16,64")
+    ap.add_argument("--requests", type=int, default=2000, help="запросов на уровень")
+    ap.add_argument("--warmup", type=int, default=100)
+    ap.add_argument("--corpus", type=int, default=5000, help="размер синтетического корпуса")
+    ap.add_argument("--noise", type=float, default=0.5, help="доля текстов через augment_text")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    ap.add_argument("--baseline", default=None, help="JSON прошлого прогона: напечатать разницу")
+    args = ap.parse_args()
+
+    texts = [r["text"] for r in synthetic_corpus(args.corpus, seed=args.seed, noise=args.noise)]
+    random.Random(args.seed).shuffle(texts)
+    path, bodies = _payloads(args.endpoint, texts, args.batch)
+    levels = [int(x) for x in args.concurrency.split(",")]
+
+    models_dir = None
+    if not args.url:
+        models_dir = os.path.abspath(args.models_dir or
+                                     os.path.dirname(os.path.dirname(train_tiny_bundles(n=3000)[0])))
+
+    proc = None
+    if args.url:
+        target, client = args.url, HttpClient(args.url)
+    elif args.spawn:
+        proc, url = _spawn(args.spawn, args.workers, models_dir)
+        target, client = f"{args.spawn} x{args.workers}", HttpClient(url)
+    else:
+        os.environ.update(_bench_env(models_dir))
+        from src import api  # после env: модели и лимиты читаются при импорте
+        target, client = "asgi", AsgiClient(api.app)
+
+    try:
+        rows = asyncio.run(_run_all(client, path, bodies, levels, args))
+    finally:
+        if proc is not None:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    if args.baseline:
+        _compare(rows, args.baseline)
+    if args.out:
+        meta = {"target": target, "endpoint": args.endpoint, "batch": args.batch if args.endpoint == "batch" else 1,
+                "git": _git_rev(), "python": platform.python_version(), "cpus": os.cpu_count(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "models_dir": models_dir,
+                "env": {k: os.environ[k] for k in sorted(os.environ)
+                        if k.startswith(("INFERENCE_", "MICROBATCH_", "RESULT_CACHE_", "PRIORITY_", "LOG_"))},
+                "args": vars(args)}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": rows}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
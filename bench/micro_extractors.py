@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарки горячих путей экстракторов: время вызова по длине текста
+(до 5000 символов — лимит API) и по размеру словаря остановок (3 … 50k).
+
+Функции без словаря (route, time, aspects, participant) меряются только по длине;
+place / place_struct / fuzzy_stop_match / geocode_stop — по длине × размеру словаря.
+Словари генерируются локально (synthetic_stop_dict) и подставляются в модули.
+
+    python -m bench.micro_extractors                                    # полная сетка
+    python -m bench.micro_extractors --sizes 3,1000 --lengths 100,5000 --only place,fuzzy
+    python -m bench.micro_extractors --out new.json --baseline reports/micro.json --fail_ratio 3
+"""
+import argparse, json, os, platform, sys, time
+from typing import Any, Callable, Dict, List, Optional
+
+from ._fixtures import long_text, synthetic_corpus, synthetic_stop_dict
+
+from src import extractors, geocode, place_dict, participant_extract
+
+def _install_stops(stop_dict: Dict[str, List[dict]]):
+    """Подменяет словарь остановок во всех модулях, которые читают его при импорте.
+    Сборка StopIndex в замер не входит — так же, как в API (строится один раз)."""
+    place_dict.publish_stops(stop_dict, geocode=place_dict.StopIndex(
+        {"": [r for stops in stop_dict.values() for r in stops if r.get("lat") is not None]}))
+
+# имя → (функция, зависит ли от словаря)
+FUNCS: Dict[str, Any] = {
+    "route": (extractors.extract_route, False),
+    "time": (extractors.extract_time, False),
+    "aspects": (extractors.detect_aspects, False),
+    "participant": (participant_extract.extract_participant, False),
+    "place": (extractors.extract_place, True),
+    "place_struct": (extractors.extract_place_struct, True),
+    "fuzzy": (place_dict.fuzzy_stop_match, True),
+    "geocode": (geocode.geocode_stop, True),
+}
+
+def _texts(length: int, n: int, seed: int) -> List[str]:
+    # короткие — тексты корпуса как есть, длинные — склейка нескольких жалоб
+    rows = [r["text"] for r in synthetic_corpus(n * 8, seed=seed, noise=0.5)]
+    out = []
+    for i in range(n):
+        base = " ".join(rows[i * 8:(i + 1) * 8])
+        out.append(long_text(base, length))
+    return out
+
+def _time_cell(fn: Callable, texts: List[str], budget: float, min_calls: int) -> Dict[str, float]:
+    """Гоняет fn по текстам по кругу, пока не выйдет budget секунд (и не меньше min_calls)."""
+    fn(texts[0])  # ленивые импорты/компиляция регулярок — не в замер
+    calls, best = 0, float("inf")
+    t_start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        fn(texts[calls % len(texts)])
+        dt = time.perf_counter() - t0
+        best = min(best, dt)
+        calls += 1
+        total = time.perf_counter() - t_start
+        if calls >= min_calls and total >= budget:
+            break
+    return {"calls": calls, "us_per_call": round(total / calls * 1e6, 2), "best_us": round(best * 1e6, 2),
+            "calls_per_sec": round(calls / total, 1)}
+
+def _run(names: List[str], lengths: List[int], sizes: List[int], budget: float, min_calls: int,
+         seed: int) -> List[Dict[str, Any]]:
+    rows = []
+    texts = {L: _texts(L, 16, seed) for L in lengths}
+    static = [n for n in names if not FUNCS[n][1]]
+    dynamic = [n for n in names if FUNCS[n][1]]
+    for name in static:
+        for L in lengths:
+            r = {"func": name, "length": L, "stops": None, **_time_cell(FUNCS[name][0], texts[L], budget, min_calls)}
+            rows.append(r)
+            _print(r)
+    for size in sizes:
+        _install_stops(synthetic_stop_dict(size, seed=seed))
+        for name in dynamic:
+            for L in lengths:
+                r = {"func": name, "length": L, "stops": size,
+                     **_time_cell(FUNCS[name][0], texts[L], budget, min_calls)}
+                rows.append(r)
+                _print(r)
+    return rows
+
+def _print(r: Dict[str, Any]):
+    stops = "-" if r["stops"] is None else r["stops"]
+    print(f"{r['func']:<13} len={r['length']:<5} stops={stops!s:<6} "
+          f"{r['us_per_call']:>12.1f} us/call  {r['calls_per_sec']:>10.1f}/s  (n={r['calls']})", flush=True)
+
+def _cell_key(r: Dict[str, Any]):
+    return (r["func"], r["length"], r["stops"])
+
+def _compare(rows: List[Dict[str, Any]], baseline_path: str, fail_ratio: Optional[float]) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        base = {_cell_key(r): r for r in json.load(f)["results"]}
+    worst, regressions = 1.0, []
+    for r in rows:
+        b = base.get(_cell_key(r))
+        if not b or not b.get("us_per_call"):
+            continue
+        ratio = r["us_per_call"] / b["us_per_call"]
+        worst = max(worst, ratio)
+        if fail_ratio and ratio >= fail_ratio:
+            regressions.append((r, ratio))
+    print(f"\nvs {baseline_path}: worst slowdown x{worst:.2f}")
+    for r, ratio in regressions:
+        print(f"  REGRESSION x{ratio:.1f}: {r['func']} len={r['length']} stops={r['stops']}")
+    return 1 if regressions else 0
+
+def main():
+    ap = argparse.ArgumentParser(description="микробенчмарки экстракторов и матчинга остановок")
+    ap.add_argument("--only", default=",".join(FUNCS), help="функции через запятую: " + ",".join(FUNCS))
+    ap.add_argument("--lengths", default="50,200,1000,5000", help="длины текстов, символов")
+    ap.add_argument("--sizes", default="3,100,1000,10000,50000", help="размеры словаря остановок")
+    ap.add_argument("--budget", type=float, default=0.3, help="секунд на ячейку")
+    ap.add_argument("--min_calls", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    ap.add_argument("--baseline", default=None, help="JSON прошлого прогона: сравнить по ячейкам")
+    ap.add_argument("--fail_ratio", type=float, default=None,
+                    help="код выхода 1, если хоть одна ячейка медленнее baseline в столько раз")
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()]
+    unknown = [n for n in names if n not in FUNCS]
+    if unknown:
+        raise SystemExit(f"unknown functions: {unknown}; choose from {list(FUNCS)}")
+    lengths = [int(x) for x in args.lengths.split(",")]
+    sizes = [int(x) for x in args.sizes.split(",")]
+
+    rows = _run(names, lengths, sizes, args.budget, args.min_calls, args.seed)
+    code = _compare(rows, args.baseline, args.fail_ratio) if args.baseline else 0
+    if args.out:
+        meta = {"python": platform.python_version(), "cpus": os.cpu_count(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": rows}, f, ensure_ascii=False, indent=2)
+    sys.exit(code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Память сервиса при 1 и N воркерах: pre-fork (python -m src.serve) против
+обычного `uvicorn --workers N` (каждый воркер импортирует api и грузит модели сам).
+
+Считается по всему дереву процессов из /proc/<pid>/smaps_rollup:
+RSS (с двойным счётом общих страниц), PSS (общие страницы делятся между
+процессами) и USS (private — то, что освободится, если убить процесс).
+
+    python -m bench.prefork_memory                              # tiny-бандл, 1 и 8 воркеров
+    python -m bench.prefork_memory --models_dir . --workers 1,8 --out reports/prefork_memory.json
+"""
+import argparse, json, os, signal, socket, subprocess, sys, time, urllib.request
+from typing import Dict, List
+
+from ._fixtures import synthetic_corpus, train_tiny_bundles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _tree(pid: int) -> List[int]:
+    out, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        out.append(p)
+        try:
+            for t in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{t}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return out
+
+def _rollup(pid: int) -> Dict[str, int]:
+    vals: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    vals[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        pass
+    return vals
+
+def _measure(pid: int) -> Dict[str, float]:
+    pids = _tree(pid)
+    tot = {"rss": 0, "pss": 0, "uss": 0}
+    for p in pids:
+        r = _rollup(p)
+        tot["rss"] += r.get("Rss", 0)
+        tot["pss"] += r.get("Pss", 0)
+        tot["uss"] += r.get("Private_Clean", 0) + r.get("Private_Dirty", 0)
+    return {"processes": len(pids), **{f"{k}_mb": v / 1024.0 for k, v in tot.items()}}
+
+def _wait_ready(port: int, timeout: float = 120.0):
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=2).read()
+            return
+        except Exception:
+            time.sleep(0.3)
+    raise RuntimeError(f"server on :{port} did not become ready")
+
+def _traffic(port: int, n: int):
+    # прогоняем запросы, чтобы воркеры «потрогали» модели, как под нагрузкой
+    texts = [r["text"] for r in synthetic_corpus(n, seed=11)]
+    for t in texts:
+        req = urllib.request.Request(f"http://127.0.0.1:{port}/analyze",
+                                     data=json.dumps({"text": t}).encode(),
+                                     headers={"content-type": "application/json"})
+        urllib.request.urlopen(req, timeout=30).read()
+
+def _run(mode: str, workers: int, models_dir: str, requests: int) -> Dict[str, float]:
+    port = _free_port()
+    if mode == "prefork":
+        cmd = [sys.executable, "-m", "src.serve", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "src.api:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+           "RATE_LIMIT_PER_MIN": "1000000"}
+    proc = subprocess.Popen(cmd, cwd=models_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+        time.sleep(1.0 + 0.2 * workers)  # uvicorn --workers поднимает воркеров по одному
+        _traffic(port, requests)
+        return {"mode": mode, "workers": workers, **_measure(proc.pid)}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models_dir", default=None, help="рабочий каталог с models/ (по умолчанию — tiny-бандл)")
+    ap.add_argument("--workers", default="1,8")
+    ap.add_argument("--modes", default="prefork,uvicorn")
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    args = ap.parse_args()
+
+    models_dir = args.models_dir or os.path.dirname(os.path.dirname(train_tiny_bundles(n=3000)[0]))
+    rows = []
+    for mode in args.modes.split(","):
+        for w in (int(x) for x in args.workers.split(",")):
+            rows.append(_run(mode, w, os.path.abspath(models_dir), args.requests))
+            r = rows[-1]
+            print(f"{r['mode']:>8} x{r['workers']:<3} procs={r['processes']:<3} "
+                  f"RSS={r['rss_mb']:8.1f} MB  PSS={r['pss_mb']:8.1f} MB  USS={r['uss_mb']:8.1f} MB")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"models_dir": models_dir, "results": rows}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,33 @@
 # -*- coding: utf-8 -*-
-import os, time, joblib
-from typing import Dict, Optional
-from collections import defaultdict, deque
+import os, time, math, asyncio
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, Header, HTTPException, Request, Depends
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Depends
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from pydantic import BaseModel, Field
-from sklearn.feature_extraction.text import TfidfVectorizer
-from scipy.sparse import hstack
+from pydantic import BaseModel, ConfigDict, Field
 
 # логирование: если есть logging_conf — используем, иначе noop
 try:
-    from .logging_conf import setup_logging
+    from .logging_conf import log_stats, setup_logging
 except Exception:
     def setup_logging(): pass
+    def log_stats(): return None
 
-from .extractors import extract_place_struct, extract_participant
+from .extractors import extract_place_struct, scan_rules
+from .place_dict import reload_stops, stops_changed, stops_stats
+from .spatial import ComplaintStore, get_stop_tree
+from .batching import MicroBatcher
+from .inference_pool import InferencePool, PoolSaturated, DeadlineExceeded
+from .result_cache import ResultCache
+from .ratelimit import CostExceedsLimit, RateLimitExceeded, limiter_from_env
+from .metrics import CONTENT_TYPE, MetricsMiddleware, Registry
+from .profiling import SORT_KEYS, profile_call
+from .utils import exact_text_hash, norm_spaces
+from .model_registry import ModelRegistry, ModelSet
 
 import structlog
 logger = structlog.get_logger(__name__)
@@ -38,6 +46,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -----------------------------------------------------------------------------
+# Метрики (Prometheus, GET /metrics): латентность HTTP и стадий пайплайна,
+# отказы, размеры батчей; METRICS_ENABLED=0 — выключить
+# -----------------------------------------------------------------------------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+_metrics = Registry()
+PIPELINE_STAGES = ("featurize", "priority", "aspect", "explain", "rules", "place")
+_M_STAGE = _metrics.histogram("haka_stage_duration_seconds",
+                              "Pipeline stage latency (model stages per batch, extractors per text)", ("stage",))
+_M_STAGE_CHILD = {s: _M_STAGE.labels(s) for s in PIPELINE_STAGES}
+_M_PIPELINE = _metrics.histogram("haka_pipeline_duration_seconds", "Pipeline call latency incl. pool queueing")
+_M_BATCH = _metrics.histogram("haka_pipeline_batch_size", "Texts per pipeline call",
+                              buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+_M_TEXTS = _metrics.counter("haka_texts_analyzed", "Texts run through the pipeline")
+_M_REJECTED = _metrics.counter("haka_requests_rejected", "Requests rejected before analysis", ("reason",))
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=_metrics)
+
+def _observe_pipeline(n: int, seconds: float, timings: Dict[str, List[float]]):
+    if not METRICS_ENABLED:
+        return
+    _M_PIPELINE.observe(seconds)
+    _M_BATCH.observe(n)
+    _M_TEXTS.inc(n)
+    for stage, vals in timings.items():
+        h = _M_STAGE_CHILD.get(stage)
+        if h is not None:
+            for v in vals:
+                h.observe(v)
+
 # Статика с графиками (если каталога нет — не падаем)
 try:
     app.mount("/reports", StaticFiles(directory="reports"), name="reports")
@@ -62,6 +100,15 @@ def _check_api_key(x_api_key: Optional[str]):
     if API_KEY and x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
+# админские ручки (reload моделей и т.п.) — только с ADMIN_KEY; без него выключены
+ADMIN_KEY = os.getenv("ADMIN_KEY", "")
+
+def _check_admin_key(x_admin_key: Optional[str]):
+    if not ADMIN_KEY:
+        raise HTTPException(status_code=403, detail="Admin API disabled")
+    if x_admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
 def _check_basic(creds: Optional[HTTPBasicCredentials]):
     if (BASIC_USER or BASIC_PASS) and (
         creds is None or creds.username != BASIC_USER or creds.password != BASIC_PASS
@@ -69,86 +116,66 @@ def _check_basic(creds: Optional[HTTPBasicCredentials]):
         raise HTTPException(status_code=401, detail="Invalid basic auth")
 
 # -----------------------------------------------------------------------------
-# Простенький rate limit per IP
+# Rate limit: sliding window counter per IP (или per API-ключ с отдельной политикой)
+# RATE_LIMIT_BACKEND=shm — один счётчик на все воркеры (см. ratelimit.py)
 # -----------------------------------------------------------------------------
-_hits: dict[str, deque] = defaultdict(deque)
-_MAX_REQ_PER_MIN = int(os.getenv("RATE_LIMIT_PER_MIN", "120"))
-def _rate_limit(ip: str):
-    now = time.time()
-    dq = _hits[ip]; dq.append(now)
-    while dq and now - dq[0] > 60:
-        dq.popleft()
-    if len(dq) > _MAX_REQ_PER_MIN:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+_limiter = limiter_from_env()
+
+def _rate_limit(ip: str, api_key: Optional[str] = None, cost: int = 1):
+    try:
+        _limiter.check(ip, api_key, cost=cost)
+    except RateLimitExceeded as e:
+        _M_REJECTED.labels("rate_limit").inc()
+        raise HTTPException(status_code=429, detail="Rate limit exceeded",
+                            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    except CostExceedsLimit as e:
+        # не 429: Retry-After тут соврал бы — такой батч не пройдёт никогда
+        _M_REJECTED.labels("batch_over_limit").inc()
+        raise HTTPException(status_code=413, detail=f"Batch of {e.cost} texts exceeds the rate limit of "
+                                                    f"{e.policy.limit} per {e.policy.window:g}s; split it")
 
 # -----------------------------------------------------------------------------
-# PRIORITY model bundle (новый формат: word + char)
+# Модели: priority (word + char, calibrated LinearSVC) + aspect (single-label)
 # -----------------------------------------------------------------------------
-PRIORITY = joblib.load("models/priority.joblib")
-_vect_word: TfidfVectorizer = PRIORITY.get("vect_word") or PRIORITY.get("vect")
-_base_word = PRIORITY.get("base_word")  # базовый LinearSVC для explain (может быть None)
-_vect_char: TfidfVectorizer = PRIORITY.get("vect_char")
-_clf  = PRIORITY["clf"]
-_classes = list(PRIORITY["classes"])
+# Всё, что зависит от версии моделей, живёт в ModelSet; _registry.current подменяется
+# целиком при горячей перезагрузке (см. model_registry). MODELS_DIR — корень
+# (versions/<v>/ + CURRENT или старая раскладка), MODEL_ARTIFACTS — mmap-артефакты
+# (python -m src.artifacts export), PRIORITY_COMPILED=0 — sklearn вместо NumPy-инференса.
+_registry = ModelRegistry(
+    root=os.getenv("MODELS_DIR", "models"),
+    artifacts=os.getenv("MODEL_ARTIFACTS", "models/artifacts"),
+    compiled=os.getenv("PRIORITY_COMPILED", "1") != "0",
+)
+_registry.reload()
+
+def _models() -> ModelSet:
+    return _registry.current
+
+def _featurize_batch(texts: List[str]):
+    return _models().featurize_batch(texts)
+
+def _to_features_batch(texts: List[str]):
+    return _featurize_batch(texts)[1]
 
 def _to_features(text: str):
-    Xw = _vect_word.transform([text]) if _vect_word else None
-    Xc = _vect_char.transform([text]) if _vect_char else None
-    if Xw is not None and Xc is not None:
-        return hstack([Xw, Xc], format="csr")
-    return Xw or Xc
-
-def _top_features_for_text(text: str, k: int = 8):
-    # fallback по TF-IDF из самого текста (word-векторизатор)
-    def _fallback():
-        Xw = _vect_word.transform([text]) if _vect_word else None
-        if Xw is None: return []
-        feats = _vect_word.get_feature_names_out()
-        idx = Xw.nonzero()[1]
-        if idx.size == 0: return []
-        weights = Xw.data
-        order = weights.argsort()[-k:][::-1]
-        return [feats[idx[i]] for i in order]
+    return _to_features_batch([text])
 
-    try:
-        if not (_base_word and hasattr(_base_word, "coef_") and _vect_word):
-            return _fallback()
-        feats = _vect_word.get_feature_names_out()
-        pred = _clf.predict(_to_features(text))[0]
-        cls_idx = list(getattr(_base_word, "classes_")).index(pred)
-        import numpy as np
-        top_idx = np.argsort(_base_word.coef_[cls_idx])[-k:][::-1]
-        return [feats[i] for i in top_idx]
-    except Exception:
-        return _fallback()
+def _top_features_for_text(text: str, k: int = 8, pred: Optional[str] = None):
+    if pred is None:
+        pred = _predict_with_probs(text)[0]
+    return _models().explainer.top_tokens(text, pred, k=k)
+
+def _predict_with_probs_batch(texts: List[str], X=None) -> List[Tuple[str, Dict[str, float]]]:
+    return _models().predict_with_probs_batch(texts, X=X)
 
 def _predict_with_probs(text: str):
-    X = _to_features(text)
-    pred = _clf.predict(X)[0]
-    proba = getattr(_clf, "predict_proba", None)
-    probs = dict(zip(_classes, (proba(X)[0].tolist() if proba else [])))
-    return str(pred), probs
+    return _predict_with_probs_batch([text])[0]
 
-# -----------------------------------------------------------------------------
-# ASPECT model (single-label)
-# -----------------------------------------------------------------------------
-_ASPECT = None
-try:
-    _ASPECT = joblib.load("models/aspect_lr.joblib")
-    _aspect_vect: TfidfVectorizer = _ASPECT["vect"]
-    _aspect_clf = _ASPECT["clf"]
-    _aspect_labels = list(_ASPECT["classes"])
-except Exception:
-    _ASPECT = None
-    _aspect_vect = None
-    _aspect_clf = None
-    _aspect_labels = []
+def _predict_aspect_batch(texts: List[str], X=None) -> List[Optional[str]]:
+    return _models().predict_aspect_batch(texts, X=X)
 
 def _predict_aspect(text: str) -> Optional[str]:
-    if not (_ASPECT and _aspect_vect and _aspect_clf):
-        return None
-    X = _aspect_vect.transform([text])
-    return str(_aspect_clf.predict(X)[0])
+    return _predict_aspect_batch([text])[0]
 
 # -----------------------------------------------------------------------------
 # Простая рекомендация на казахском
@@ -177,6 +204,7 @@ class AnalyzeRequest(BaseModel):
     city_hint: Optional[str] = Field(None, description="Astana/Almaty")
 
 class AnalyzeResponse(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())  # поле model_version
     priority: str
     probs: Dict[str, float] | None = None
     participant: Dict | None = None
@@ -184,51 +212,462 @@ class AnalyzeResponse(BaseModel):
     explain: Dict | None = None
     aspect: str | None = None
     recommendation_kz: str | None = None
+    model_version: str | None = None
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "256"))
+
+class AnalyzeBatchRequest(BaseModel):
+    items: List[AnalyzeRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class AnalyzeBatchResponse(BaseModel):
+    results: List[AnalyzeResponse]
+
+# -----------------------------------------------------------------------------
+# Пайплайн: экстракторы по каждому тексту, модели — одной матрицей на весь батч
+# -----------------------------------------------------------------------------
+def _clean_input(text: Optional[str]) -> str:
+    # пробелы схлопываем до пайплайна: ответ (и ключ кэша) не зависит от их разметки
+    text = norm_spaces(text)
+    if not text:
+        raise HTTPException(status_code=400, detail="Empty text")
+    if len(text) > 5000:
+        raise HTTPException(status_code=413, detail="Text too long")
+    return text
+
+def _analyze_many_timed(texts: List[str]) -> Tuple[List[AnalyzeResponse], Dict[str, List[float]]]:
+    """Пайплайн + длительности стадий (сек). Тайминги возвращаются, а не пишутся в метрики
+    прямо тут: в process-режиме пул работает в другом процессе, метрики — в родителе."""
+    clock = time.perf_counter
+    timings: Dict[str, List[float]] = {s: [] for s in PIPELINE_STAGES}
+    m = _models()  # весь батч — на одном наборе моделей, даже если посреди запроса случится reload
+    t0 = clock()
+    Xw, X, Xa = m.featurize_batch(texts)
+    t1 = clock()
+    preds = m.predict_with_probs_batch(texts, X=X)
+    t2 = clock()
+    aspects = m.predict_aspect_batch(texts, X=Xa)
+    t3 = clock()
+    contribs = m.explainer.explain_batch(Xw, [pr for pr, _ in preds], k=8, texts=texts)
+    t4 = clock()
+    timings["featurize"].append(t1 - t0)
+    timings["priority"].append(t2 - t1)
+    timings["aspect"].append(t3 - t2)
+    timings["explain"].append(t4 - t3)
+    out: List[AnalyzeResponse] = []
+    for text, (pr, probs), asp, contrib in zip(texts, preds, aspects, contribs):
+        t0 = clock()
+        # один проход правил на текст: participant + city/route для места — стадия «rules»
+        rules = scan_rules(text, ("participant", "city", "route"))
+        participant = rules["participant"]
+        t1 = clock()
+        place_geo = extract_place_struct(text, rules=rules)
+        timings["rules"].append(t1 - t0)
+        timings["place"].append(clock() - t1)
+        out.append(AnalyzeResponse(
+            priority=pr,
+            probs=probs,
+            participant=participant,
+            place=place_geo,
+            aspect=asp,
+            recommendation_kz=recommend_kz(asp, pr),
+            explain={
+                "model_top_tokens": [t for t, _ in contrib],
+                "token_contrib": {t: round(w, 4) for t, w in contrib},
+                "rules": [],
+            },
+            model_version=m.version,
+        ))
+    return out, timings
+
+def _analyze_many(texts: List[str]) -> List[AnalyzeResponse]:
+    return _analyze_many_timed(texts)[0]
+
+def _analyze_many_profiled(texts: List[str], sort: str = "cumulative") -> Tuple[List[AnalyzeResponse], Dict[str, List[float]]]:
+    """Тот же пайплайн под cProfile; тайминги стадий и профиль — в explain["profile"]."""
+    (out, timings), prof = profile_call(_analyze_many_timed, texts, sort=sort)
+    prof["stages_ms"] = {s: round(sum(v) * 1000.0, 3) for s, v in timings.items()}
+    for r in out:
+        r.explain = {**(r.explain or {}), "profile": prof}
+    return out, timings
+
+# -----------------------------------------------------------------------------
+# Пул для CPU-bound части: event loop не блокируется тяжёлыми запросами
+# -----------------------------------------------------------------------------
+_pool = InferencePool(
+    mode=os.getenv("INFERENCE_MODE", "thread"),          # inline | thread | process
+    workers=int(os.getenv("INFERENCE_WORKERS", "0")) or None,
+    max_queue=int(os.getenv("INFERENCE_QUEUE", "64")),
+    deadline_ms=float(os.getenv("INFERENCE_DEADLINE_MS", "0")),
+)
+
+async def _run_pipeline(texts: List[str], profile: Optional[str] = None) -> List[AnalyzeResponse]:
+    t0 = time.perf_counter()
+    try:
+        if profile:
+            out, timings = await _pool.run(_analyze_many_profiled, texts, profile)
+        else:
+            out, timings = await _pool.run(_analyze_many_timed, texts)
+    except PoolSaturated:
+        _M_REJECTED.labels("saturated").inc()
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+    except DeadlineExceeded:
+        _M_REJECTED.labels("deadline").inc()
+        raise HTTPException(status_code=504, detail="Analysis deadline exceeded")
+    _observe_pipeline(len(texts), time.perf_counter() - t0, timings)
+    return out
+
+# -----------------------------------------------------------------------------
+# Micro-batching (опционально): MICROBATCH_WINDOW_MS>0 склеивает конкурентные /analyze
+# -----------------------------------------------------------------------------
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX = int(os.getenv("MICROBATCH_MAX", "32"))
+_batcher: Optional[MicroBatcher] = (
+    # 503/504 из пула получает весь батч сразу, без повторов по одному тексту
+    MicroBatcher(_run_pipeline, window_ms=MICROBATCH_WINDOW_MS, max_batch=MICROBATCH_MAX,
+                 fail_fast=(HTTPException, PoolSaturated, DeadlineExceeded))
+    if MICROBATCH_WINDOW_MS > 0 else None
+)
+
+# -----------------------------------------------------------------------------
+# Кэш результатов (опционально): RESULT_CACHE_SIZE>0 включает LRU + TTL
+# -----------------------------------------------------------------------------
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "0"))
+_cache: Optional[ResultCache] = (
+    ResultCache(max_items=RESULT_CACHE_SIZE, ttl_sec=float(os.getenv("RESULT_CACHE_TTL_SEC", "300")))
+    if RESULT_CACHE_SIZE > 0 else None
+)
+
+def _cache_key(text: str, city_hint: Optional[str]) -> str:
+    # не дедуп-нормализация (unidecode, lower, без пунктуации): «08:30» и «08 30», кириллица
+    # и транслит дают разные ответы экстракторов — ключ от точного текста (пробелы уже
+    # схлопнуты в _clean_input)
+    return f"{exact_text_hash(text)}|{(city_hint or '').strip().lower()}|{_models().version}"
+
+async def _compute_one(text: str) -> AnalyzeResponse:
+    if _batcher:
+        return await _batcher.submit(text)
+    return (await _run_pipeline([text]))[0]
+
+async def _analyze_one(text: str, city_hint: Optional[str] = None) -> AnalyzeResponse:
+    if _cache is None:
+        return await _compute_one(text)
+    res = await _cache.get_or_compute(_cache_key(text, city_hint), lambda: _compute_one(text))
+    return res.model_copy()
+
+async def _analyze_batch(texts: List[str], hints: List[Optional[str]]) -> List[AnalyzeResponse]:
+    if _cache is None:
+        return await _run_pipeline(texts)
+    keys = [_cache_key(t, h) for t, h in zip(texts, hints)]
+    out: List[Optional[AnalyzeResponse]] = [None] * len(texts)
+    miss_idx: List[int] = []
+    for i, k in enumerate(keys):
+        hit, val = _cache.lookup(k)
+        if hit:
+            out[i] = val.model_copy()
+        else:
+            miss_idx.append(i)
+    if miss_idx:
+        computed = await _run_pipeline([texts[i] for i in miss_idx])
+        for i, res in zip(miss_idx, computed):
+            _cache.put(keys[i], res)
+            out[i] = res.model_copy()
+    return out
+
+# -----------------------------------------------------------------------------
+# Жалобы с координатами места — в память процесса для /complaints/hotspots
+# (COMPLAINT_STORE_SIZE=0 — не хранить)
+# -----------------------------------------------------------------------------
+COMPLAINT_STORE_SIZE = int(os.getenv("COMPLAINT_STORE_SIZE", "200000"))
+_complaints: Optional[ComplaintStore] = ComplaintStore(COMPLAINT_STORE_SIZE) if COMPLAINT_STORE_SIZE > 0 else None
+
+def _record_complaints(results: List[AnalyzeResponse]):
+    if _complaints is None:
+        return
+    for r in results:
+        place = r.place or {}
+        if place.get("lat") is not None and place.get("lon") is not None:
+            _complaints.add(place["lat"], place["lon"], r.priority, r.aspect)
 
 # -----------------------------------------------------------------------------
 # /analyze
 # -----------------------------------------------------------------------------
+def _profile_mode(x_profile: Optional[str], x_admin_key: Optional[str]) -> Optional[str]:
+    """X-Profile: 1 | cumulative | tottime | ncalls → ключ сортировки; только с X-Admin-Key."""
+    v = (x_profile or "").strip().lower()
+    if v in ("", "0", "false", "no"):
+        return None
+    _check_admin_key(x_admin_key)
+    return v if v in SORT_KEYS else "cumulative"
+
 @app.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(
     req: AnalyzeRequest,
     request: Request,
     x_api_key: Optional[str] = Header(default=None),
+    x_profile: Optional[str] = Header(default=None),
+    x_admin_key: Optional[str] = Header(default=None),
     creds: Optional[HTTPBasicCredentials] = Depends(security)
 ):
     _check_api_key(x_api_key)
     _check_basic(creds)
-    _rate_limit(request.client.host if request.client else "unknown")
+    _rate_limit(request.client.host if request.client else "unknown", x_api_key)
 
-    text = (req.text or "").strip()
-    if not text:
-        raise HTTPException(status_code=400, detail="Empty text")
-    if len(text) > 5000:
-        raise HTTPException(status_code=413, detail="Text too long")
-
-    participant = extract_participant(text)
-    place_geo = extract_place_struct(text)
-    pr, probs = _predict_with_probs(text)
-    asp = _predict_aspect(text)
-    top_feats = _top_features_for_text(text, k=8)
-    rec = recommend_kz(asp, pr)
+    text = _clean_input(req.text)
+    profile = _profile_mode(x_profile, x_admin_key)
+    if profile:
+        # мимо кэша и micro-batching: профилируем работу именно этого текста
+        res = (await _run_pipeline([text], profile=profile))[0]
+    else:
+        res = await _analyze_one(text, req.city_hint)
+    _record_complaints([res])
 
     logger.info(
         "analyze",
         ip=str(request.client.host),
-        pr=pr,
-        place=(place_geo or {}).get("name"),
-        participant=(participant or {}).get("role"),
+        pr=res.priority,
+        place=(res.place or {}).get("name"),
+        participant=(res.participant or {}).get("role"),
     )
+    return res
+
+# -----------------------------------------------------------------------------
+# /analyze/batch — N текстов за один проход моделей, порядок ответов = порядок входа
+# -----------------------------------------------------------------------------
+@app.post("/analyze/batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(
+    req: AnalyzeBatchRequest,
+    request: Request,
+    x_api_key: Optional[str] = Header(default=None),
+    creds: Optional[HTTPBasicCredentials] = Depends(security)
+):
+    _check_api_key(x_api_key)
+    _check_basic(creds)
+    # каждый текст батча — отдельный запрос для лимита, иначе батч обходит его в N раз
+    _rate_limit(request.client.host if request.client else "unknown", x_api_key, cost=len(req.items))
 
-    return AnalyzeResponse(
-        priority=pr,
-        probs=probs,
-        participant=participant,
-        place=place_geo,
-        aspect=asp,
-        recommendation_kz=rec,
-        explain={"model_top_tokens": top_feats, "rules": []},
+    texts: List[str] = []
+    hints: List[Optional[str]] = []
+    for i, it in enumerate(req.items):
+        try:
+            texts.append(_clean_input(it.text))
+            hints.append(it.city_hint)
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{e.detail} (item {i})")
+
+    results = await _analyze_batch(texts, hints)
+    _record_complaints(results)
+
+    logger.info(
+        "analyze_batch",
+        ip=str(request.client.host) if request.client else "unknown",
+        n=len(results),
     )
+    return AnalyzeBatchResponse(results=results)
+
+# -----------------------------------------------------------------------------
+# Карта: ближайшие остановки (KD-дерево) и горячие точки жалоб (сетка за окно времени)
+# -----------------------------------------------------------------------------
+@app.get("/stops/nearest")
+def stops_nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+    radius_m: Optional[float] = Query(None, gt=0, description="не дальше, метров"),
+    city: Optional[str] = Query(None, description="только остановки этого города"),
+    x_api_key: Optional[str] = Header(default=None),
+):
+    _check_api_key(x_api_key)
+    tree = get_stop_tree()
+    return {"stops": tree.nearest(lat, lon, k=k, radius_m=radius_m, city=city), "indexed": len(tree)}
+
+@app.get("/complaints/hotspots")
+def complaints_hotspots(
+    window_min: float = Query(60, gt=0, le=60 * 24 * 30, description="окно времени, минут"),
+    cell_m: float = Query(500, ge=50, le=50000, description="размер ячейки сетки, метров"),
+    top: int = Query(50, ge=1, le=1000),
+    priority: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None),
+):
+    _check_api_key(x_api_key)
+    if _complaints is None:
+        raise HTTPException(status_code=404, detail="Complaint store disabled (COMPLAINT_STORE_SIZE=0)")
+    return {**_complaints.hotspots(window_min * 60.0, cell_m, top, priority), "stored": _complaints.stats()["size"]}
+
+# -----------------------------------------------------------------------------
+# Горячая перезагрузка моделей: POST /admin/models/reload или file-watch
+# -----------------------------------------------------------------------------
+MODEL_WATCH_SEC = float(os.getenv("MODEL_WATCH_SEC", "0"))
+_reload_lock = asyncio.Lock()
+
+async def _reload_models(version: Optional[str] = None, persist: bool = False) -> ModelSet:
+    # загрузка и прогрев — в потоке, event loop продолжает обслуживать запросы на старой версии
+    async with _reload_lock:
+        old = _models().version
+        ms = await asyncio.get_running_loop().run_in_executor(None, _registry.reload, version, persist)
+        if ms.version != old:
+            if _pool.mode == "process":
+                _pool.recycle()  # форкнутые воркеры держат копию старых моделей
+            if _cache is not None:
+                _cache.clear()  # ключи и так версионные — просто не держим мёртвые записи
+        logger.info("models_reloaded", old=old, new=ms.version, ms=_registry.last_reload_ms)
+        return ms
+
+async def _watch_models():
+    while True:
+        await asyncio.sleep(MODEL_WATCH_SEC)
+        try:
+            if _registry.changed():
+                await _reload_models()
+        except Exception as e:
+            logger.warning("models_reload_failed", error=str(e))
+
+class ReloadRequest(BaseModel):
+    version: Optional[str] = Field(None, description="имя каталога в versions/; пусто — перечитать CURRENT")
+
+@app.post("/admin/models/reload")
+async def admin_reload_models(req: ReloadRequest | None = None,
+                              x_admin_key: Optional[str] = Header(default=None)):
+    _check_admin_key(x_admin_key)
+    version = req.version if req else None
+    try:
+        # CURRENT пишется только после загрузки и прогрева: сломанная версия не станет активной
+        ms = await _reload_models(version, persist=True)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving {_models().version}: {e}")
+    return {"model_version": ms.version, "reload_ms": _registry.last_reload_ms, "models": _registry.stats()}
+
+@app.get("/admin/models")
+def admin_models(x_admin_key: Optional[str] = Header(default=None)):
+    _check_admin_key(x_admin_key)
+    return _registry.stats()
+
+# -----------------------------------------------------------------------------
+# Горячая перезагрузка словаря остановок: POST /admin/stops/reload или file-watch
+# (YAML/JSON/CSV/GTFS → словарь, StopIndex, geocode, ALL_STOPS; подмена атомарная)
+# -----------------------------------------------------------------------------
+STOPS_WATCH_SEC = float(os.getenv("STOPS_WATCH_SEC", "0"))
+_stops_lock = asyncio.Lock()
+
+async def _reload_stops() -> Dict:
+    # сборка — в потоке: event loop и пул продолжают обслуживать запросы на старом индексе
+    async with _stops_lock:
+        st = await asyncio.get_running_loop().run_in_executor(None, reload_stops)
+        if _pool.mode == "process":
+            _pool.recycle()  # форкнутые воркеры держат копию старого словаря
+        if _cache is not None:
+            _cache.clear()  # в закэшированных ответах — место по старому словарю
+        logger.info("stops_reloaded", ms=st["last_reload_ms"], stops=st["stops"], variants=st["variants"])
+        return st
+
+async def _watch_stops():
+    while True:
+        await asyncio.sleep(STOPS_WATCH_SEC)
+        try:
+            if stops_changed():
+                await _reload_stops()
+        except Exception as e:
+            logger.warning("stops_reload_failed", error=str(e))
+
+@app.post("/admin/stops/reload")
+async def admin_reload_stops(x_admin_key: Optional[str] = Header(default=None)):
+    _check_admin_key(x_admin_key)
+    try:
+        return await _reload_stops()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous stop index: {e}")
+
+@app.get("/admin/stops")
+def admin_stops(x_admin_key: Optional[str] = Header(default=None)):
+    _check_admin_key(x_admin_key)
+    return {**stops_stats(), "changed_on_disk": stops_changed()}
+
+@app.on_event("startup")
+async def _start_model_watch():
+    if MODEL_WATCH_SEC > 0:
+        app.state.model_watch = asyncio.get_running_loop().create_task(_watch_models())
+    if STOPS_WATCH_SEC > 0:
+        app.state.stops_watch = asyncio.get_running_loop().create_task(_watch_stops())
+
+@app.on_event("shutdown")
+def _shutdown_pool():
+    for name in ("model_watch", "stops_watch"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    _pool.shutdown()
+    _limiter.close()  # shm-таблицу удаляет только её владелец (родитель src.serve)
+
+# -----------------------------------------------------------------------------
+# /stats — внутренние счётчики подсистем (JSON)
+# -----------------------------------------------------------------------------
+@app.get("/stats")
+def stats(x_api_key: Optional[str] = Header(default=None)):
+    _check_api_key(x_api_key)
+    return {
+        "pool": _pool.stats(),
+        "batching": _batcher.stats() if _batcher else None,
+        "cache": _cache.stats() if _cache else None,
+        "rate_limit": _limiter.stats(),
+        "model_version": _models().version,
+        "models": _registry.stats(),
+        "stops": stops_stats(),
+        "complaints": _complaints.stats() if _complaints else None,
+        "logging": log_stats(),
+    }
+
+# -----------------------------------------------------------------------------
+# /metrics — Prometheus text format (с API_KEY — тот же X-API-Key, что и у /stats)
+# -----------------------------------------------------------------------------
+def _collect_runtime():
+    m = _models()
+    yield ("haka_model_info", "gauge", "Active model set", [
+        ("haka_model_info", {"version": m.version, "format": m.format}, 1)])
+    yield ("haka_model_reloads", "counter", "Model hot reloads", [
+        ("haka_model_reloads_total", {"result": "ok"}, _registry.reloads),
+        ("haka_model_reloads_total", {"result": "failed"}, _registry.failures)])
+    ss = stops_stats()
+    yield ("haka_stop_index_size", "gauge", "Stop dictionary size", [
+        ("haka_stop_index_size", {"kind": "stops"}, ss["stops"]),
+        ("haka_stop_index_size", {"kind": "variants"}, ss["variants"])])
+    yield ("haka_stop_reloads", "counter", "Stop dictionary hot reloads", [
+        ("haka_stop_reloads_total", {"result": "ok"}, ss["reloads"]),
+        ("haka_stop_reloads_total", {"result": "failed"}, ss["reload_failures"])])
+    ps = _pool.stats()
+    yield ("haka_pool_inflight", "gauge", "Pipeline jobs running or queued in the pool", [
+        ("haka_pool_inflight", {"mode": ps["mode"]}, ps["inflight"])])
+    if _cache is not None:
+        cs = _cache.stats()
+        yield ("haka_cache_requests", "counter", "Result cache lookups", [
+            ("haka_cache_requests_total", {"result": "hit"}, cs["hits"]),
+            ("haka_cache_requests_total", {"result": "miss"}, cs["misses"]),
+            ("haka_cache_requests_total", {"result": "coalesced"}, cs["coalesced"])])
+        yield ("haka_cache_hit_ratio", "gauge", "Result cache hit rate", [
+            ("haka_cache_hit_ratio", {}, cs["hit_rate"])])
+        yield ("haka_cache_items", "gauge", "Result cache size", [("haka_cache_items", {}, cs["size"])])
+    if _batcher is not None:
+        bs = _batcher.stats()
+        yield ("haka_microbatch_batches", "counter", "Micro-batches flushed", [
+            ("haka_microbatch_batches_total", {}, bs["batches"])])
+        yield ("haka_microbatch_pending", "gauge", "Requests waiting for the current micro-batch", [
+            ("haka_microbatch_pending", {}, bs["pending"])])
+    ls = log_stats()
+    if ls:
+        yield ("haka_log_records", "counter", "structlog records by outcome", [
+            ("haka_log_records_total", {"result": "written"}, ls.get("written", 0)),
+            ("haka_log_records_total", {"result": "dropped"}, ls.get("dropped", 0)),
+            ("haka_log_records_total", {"result": "sampled_out"}, ls["sampled_out"])])
+    rs = _limiter.stats()
+    yield ("haka_rate_limit_keys", "gauge", "Keys tracked by the rate limiter", [
+        ("haka_rate_limit_keys", {"backend": rs["backend"]}, rs["keys"])])
+
+_metrics.add_collector(_collect_runtime)
+
+@app.get("/metrics")
+def metrics(x_api_key: Optional[str] = Header(default=None)):
+    _check_api_key(x_api_key)
+    return Response(_metrics.render(), media_type=CONTENT_TYPE)
 
 # -----------------------------------------------------------------------------
 # Простой демо-UI
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Компактный формат моделей: каталог с manifest.json и сырыми .npy.
+
+- словарь TF-IDF — отсортированный массив utf-8 байтов (S-dtype): порядок байтов
+  utf-8 совпадает с порядком кодпоинтов, т.е. позиция в массиве = индекс признака
+  sklearn; поиск — np.searchsorted по всем n-граммам батча сразу
+- idf, веса priority (W/b/A/B compiled-модели), base_word и aspect — отдельные .npy
+- загрузка — np.load(mmap_mode="r"): N воркеров делят одни физические страницы,
+  старт — миллисекунды (ничего не распаковывается)
+
+    python -m src.artifacts export --priority models/priority.joblib --aspect models/aspect_lr.joblib --out models/artifacts
+    python -m src.artifacts info models/artifacts
+"""
+import argparse, hashlib, json, os, time
+from typing import Any, Dict, List, Optional
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .compiled_model import CompiledCalibratedLinear, CompiledLinear
+from .featurize import HashingTfidf, is_hashing
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+# параметры анализатора/TF-IDF, которые нужны для transform (всё JSON-сериализуемое)
+_TFIDF_KEYS = ("input", "encoding", "decode_error", "strip_accents", "lowercase", "analyzer",
+               "token_pattern", "stop_words", "ngram_range", "binary", "norm", "use_idf",
+               "smooth_idf", "sublinear_tf")
+_HASHING_KEYS = ("input", "encoding", "decode_error", "strip_accents", "lowercase", "analyzer",
+                 "token_pattern", "stop_words", "ngram_range", "binary", "n_features")
+
+class MappedTfidf:
+    """TF-IDF с замороженным словарём в memmap-массиве вместо dict vocabulary_.
+
+    Анализатор (предобработка, n-граммы) — от необученного TfidfVectorizer с теми же
+    параметрами, поэтому SharedFeaturizer группирует его как обычный векторизатор.
+    """
+    def __init__(self, params: Dict[str, Any], terms: np.ndarray, idf: Optional[np.ndarray],
+                 index: Optional[np.ndarray] = None):
+        self.params = dict(params)
+        self.base = TfidfVectorizer(**self.params)
+        self.terms = terms           # S-массив, отсортирован
+        self.index = index           # позиция в terms → индекс признака (если порядок не совпал)
+        self.idf_ = idf
+        self._pos: Optional[np.ndarray] = None  # индекс признака → позиция в terms (обратная к index)
+
+    def __getattr__(self, name):
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    @property
+    def n_features(self) -> int:
+        return int(self.terms.shape[0])
+
+    def feature_name(self, i: int) -> str:
+        # обычно порядок совпадает (sklearn нумерует словарь по сортировке) — читаем прямо по i;
+        # иначе обратная перестановка строится один раз, а не поиск по index на каждый вызов
+        pos = i
+        if self.index is not None:
+            if self._pos is None:
+                inv = np.empty(self.index.shape[0], dtype=np.int64)
+                inv[self.index] = np.arange(self.index.shape[0])
+                self._pos = inv
+            pos = int(self._pos[i])
+        return self.terms[pos].decode("utf-8")
+
+    def lookup(self, grams: List[str]) -> np.ndarray:
+        """Индексы признаков для списка n-грамм; -1 — нет в словаре."""
+        if not grams or self.terms.shape[0] == 0:
+            return np.full(len(grams), -1, dtype=np.int64)
+        keys = np.array([g.encode("utf-8") for g in grams])
+        pos = np.searchsorted(self.terms, keys)
+        np.minimum(pos, self.terms.shape[0] - 1, out=pos)
+        hit = self.terms[pos] == keys
+        idx = pos if self.index is None else self.index[pos].astype(np.int64)
+        return np.where(hit, idx, -1)
+
+    def counts_from_grams(self, docs: List[List[str]]) -> sp.csr_matrix:
+        n, F = len(docs), self.n_features
+        lens = np.fromiter((len(d) for d in docs), dtype=np.int64, count=n)
+        idx = self.lookup([g for d in docs for g in d])
+        rows = np.repeat(np.arange(n, dtype=np.int64), lens)
+        keep = idx >= 0
+        # (row, col) → один ключ; unique сразу даёт отсортированные индексы и счётчики
+        key, cnt = np.unique(rows[keep] * F + idx[keep], return_counts=True)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(key // F, minlength=n), out=indptr[1:])
+        data = np.ones_like(cnt, dtype=np.float64) if self.base.binary else cnt.astype(np.float64)
+        return sp.csr_matrix((data, key % F, indptr), shape=(n, F))
+
+    def transform(self, texts) -> sp.csr_matrix:
+        from .featurize import SharedFeaturizer
+        return SharedFeaturizer({"v": self}).transform(texts)["v"]
+
+# -----------------------------------------------------------------------------
+# export
+# -----------------------------------------------------------------------------
+def _save(out_dir: str, name: str, arr: np.ndarray) -> str:
+    fname = f"{name}.npy"
+    np.save(os.path.join(out_dir, fname), np.ascontiguousarray(arr))
+    return fname
+
+def _params(obj, keys) -> Dict[str, Any]:
+    p = obj.get_params()
+    out = {k: p[k] for k in keys if k in p}
+    if isinstance(out.get("ngram_range"), tuple):
+        out["ngram_range"] = list(out["ngram_range"])
+    if isinstance(out.get("stop_words"), (set, frozenset, tuple)):
+        out["stop_words"] = sorted(out["stop_words"])
+    return out
+
+def _export_vectorizer(v, out_dir: str, name: str) -> Dict[str, Any]:
+    if is_hashing(v):
+        return {
+            "type": "hashing",
+            "params": _params(v.hasher, _HASHING_KEYS),
+            "tfidf": {"min_df": v.min_df, "max_df": v.max_df, "sublinear_tf": v.sublinear_tf, "norm": v.norm},
+            "idf": _save(out_dir, f"{name}.idf", np.asarray(v.idf_, dtype=np.float64)),
+        }
+    if not isinstance(v, TfidfVectorizer) or not isinstance(v.analyzer, str):
+        raise ValueError(f"{name}: only TfidfVectorizer with a built-in analyzer can be exported")
+    names = v.get_feature_names_out()
+    enc = np.array([t.encode("utf-8") for t in names])
+    meta: Dict[str, Any] = {"type": "vocab", "params": _params(v, _TFIDF_KEYS)}
+    order = np.argsort(enc, kind="stable")
+    if not np.array_equal(order, np.arange(len(enc))):
+        meta["index"] = _save(out_dir, f"{name}.index", order.astype(np.int32))
+        enc = enc[order]
+    meta["terms"] = _save(out_dir, f"{name}.terms", enc)
+    if getattr(v, "use_idf", False):
+        meta["idf"] = _save(out_dir, f"{name}.idf", np.asarray(v.idf_, dtype=np.float64))
+    return meta
+
+def _export_linear(est, out_dir: str, name: str) -> Dict[str, Any]:
+    lin = est if isinstance(est, CompiledLinear) else CompiledLinear.from_sklearn(est)
+    if lin is None:
+        raise ValueError(f"{name}: not a linear model")
+    return {
+        "type": "linear",
+        "classes": [str(c) for c in lin.classes_],
+        "multinomial": lin.multinomial,
+        "coef": _save(out_dir, f"{name}.coef", np.asarray(lin.coef_, dtype=np.float64)),
+        "intercept": _save(out_dir, f"{name}.intercept", np.asarray(lin.intercept_, dtype=np.float64)),
+    }
+
+def _export_calibrated(clf, out_dir: str, name: str) -> Dict[str, Any]:
+    comp = clf if isinstance(clf, CompiledCalibratedLinear) else CompiledCalibratedLinear.from_sklearn(clf)
+    if comp is None:
+        raise ValueError(f"{name}: only sigmoid-calibrated linear models can be exported")
+    return {
+        "type": "calibrated_linear",
+        "classes": [str(c) for c in comp.classes_],
+        "members": [[s.start, s.stop, [int(i) for i in idx]] for s, idx in comp.members],
+        **{k: _save(out_dir, f"{name}.{k}", getattr(comp, k)) for k in ("W", "b", "A", "B")},
+    }
+
+def _fingerprint(paths: List[str]) -> str:
+    h = hashlib.md5()
+    for p in paths:
+        st = os.stat(p)
+        h.update(f"{os.path.basename(p)}:{st.st_size}:{int(st.st_mtime)}".encode())
+    return h.hexdigest()[:12]
+
+def export_bundles(priority_path: str, aspect_path: Optional[str], out_dir: str) -> Dict[str, Any]:
+    """joblib-бандлы → каталог артефактов. Возвращает manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    P = joblib.load(priority_path)
+    pr: Dict[str, Any] = {"classes": [str(c) for c in P["classes"]], "format": P.get("format", "vocab")}
+    vw = P.get("vect_word") or P.get("vect")
+    if vw is not None:
+        pr["vect_word"] = _export_vectorizer(vw, out_dir, "priority.word")
+    if P.get("vect_char") is not None:
+        pr["vect_char"] = _export_vectorizer(P["vect_char"], out_dir, "priority.char")
+    if P.get("base_word") is not None:
+        pr["base_word"] = _export_linear(P["base_word"], out_dir, "priority.base_word")
+    pr["clf"] = _export_calibrated(P["clf"], out_dir, "priority.clf")
+
+    sources = [priority_path]
+    manifest: Dict[str, Any] = {"format_version": FORMAT_VERSION, "priority": pr}
+    if aspect_path and os.path.exists(aspect_path):
+        A = joblib.load(aspect_path)
+        manifest["aspect"] = {
+            "classes": [str(c) for c in A["classes"]],
+            "vect": _export_vectorizer(A["vect"], out_dir, "aspect.vect"),
+            "clf": _export_linear(A["clf"], out_dir, "aspect.clf"),
+        }
+        sources.append(aspect_path)
+    manifest["version"] = str(P.get("version") or _fingerprint(sources))
+    manifest["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))  # manifest последним: каталог валиден целиком
+    return manifest
+
+# -----------------------------------------------------------------------------
+# load (mmap)
+# -----------------------------------------------------------------------------
+def is_artifact_dir(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        m = json.load(f)
+    if m.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported artifact format_version: {m.get('format_version')!r}")
+    return m
+
+def _load_npy(path: str, fname: Optional[str], mmap: bool):
+    if not fname:
+        return None
+    return np.load(os.path.join(path, fname), mmap_mode="r" if mmap else None, allow_pickle=False)
+
+def _fix_params(p: Dict[str, Any]) -> Dict[str, Any]:
+    p = dict(p)
+    if isinstance(p.get("ngram_range"), list):
+        p["ngram_range"] = tuple(p["ngram_range"])
+    return p
+
+def _load_vectorizer(path: str, meta: Dict[str, Any], mmap: bool):
+    params = _fix_params(meta["params"])
+    if meta["type"] == "hashing":
+        v = HashingTfidf(**params, **meta["tfidf"])
+        v.idf_ = _load_npy(path, meta["idf"], mmap)
+        return v
+    return MappedTfidf(params, _load_npy(path, meta["terms"], mmap),
+                       _load_npy(path, meta.get("idf"), mmap), _load_npy(path, meta.get("index"), mmap))
+
+def _load_linear(path: str, meta: Dict[str, Any], mmap: bool) -> CompiledLinear:
+    return CompiledLinear(np.array(meta["classes"]), _load_npy(path, meta["coef"], mmap),
+                          _load_npy(path, meta["intercept"], mmap), meta.get("multinomial", False))
+
+def _load_calibrated(path: str, meta: Dict[str, Any], mmap: bool) -> CompiledCalibratedLinear:
+    members = [(slice(a, b), np.asarray(idx, dtype=np.intp)) for a, b, idx in meta["members"]]
+    arrs = {k: _load_npy(path, meta[k], mmap) for k in ("W", "b", "A", "B")}
+    return CompiledCalibratedLinear(np.array(meta["classes"]), members=members, **arrs)
+
+def load_artifacts(path: str, mmap: bool = True) -> Dict[str, Any]:
+    """Каталог артефактов → те же словари, что дают joblib-бандлы:
+    {"priority": {...}, "aspect": {...} | None, "version": str}."""
+    m = read_manifest(path)
+    pm = m["priority"]
+    priority = {
+        "vect_word": _load_vectorizer(path, pm["vect_word"], mmap) if "vect_word" in pm else None,
+        "vect_char": _load_vectorizer(path, pm["vect_char"], mmap) if "vect_char" in pm else None,
+        "base_word": _load_linear(path, pm["base_word"], mmap) if "base_word" in pm else None,
+        "clf": _load_calibrated(path, pm["clf"], mmap),
+        "classes": np.array(pm["classes"]),
+        "format": pm.get("format", "vocab"),
+        "version": m["version"],
+    }
+    aspect = None
+    if "aspect" in m:
+        am = m["aspect"]
+        aspect = {"vect": _load_vectorizer(path, am["vect"], mmap),
+                  "clf": _load_linear(path, am["clf"], mmap),
+                  "classes": np.array(am["classes"])}
+    return {"priority": priority, "aspect": aspect, "version": m["version"]}
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+def main():
+    ap = argparse.ArgumentParser(description="joblib-бандлы ↔ mmap-артефакты")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="сконвертировать joblib-бандлы в каталог артефактов")
+    ex.add_argument("--priority", default="models/priority.joblib")
+    ex.add_argument("--aspect", default="models/aspect_lr.joblib")
+    ex.add_argument("--out", default="models/artifacts")
+    info = sub.add_parser("info", help="показать manifest и время загрузки")
+    info.add_argument("path", nargs="?", default="models/artifacts")
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        m = export_bundles(args.priority, args.aspect, args.out)
+        print(f"[export] {args.out}: version={m['version']} size={_dir_size(args.out) / 2 ** 20:.2f} MB")
+    else:
+        t0 = time.perf_counter()
+        load_artifacts(args.path)
+        dt = (time.perf_counter() - t0) * 1000.0
+        m = read_manifest(args.path)
+        print(json.dumps({"version": m["version"], "created_at": m.get("created_at"),
+                          "priority_format": m["priority"].get("format"), "aspect": "aspect" in m,
+                          "size_mb": round(_dir_size(args.path) / 2 ** 20, 2), "load_ms": round(dt, 2)},
+                         ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching: склеиваем одновременные запросы в один батч.
+
+Запросы, пришедшие в пределах окна (window_ms) или до max_batch штук,
+уходят в run_batch одним списком; каждый вызывающий получает свою строку.
+
+Если батч упал, элементы перезапускаются по одному (битый элемент не валит соседей) —
+кроме ошибок из fail_fast (перегрузка, дедлайн, HTTP-ошибки): их получают все сразу,
+повторы под перегрузкой только умножили бы нагрузку.
+"""
+import asyncio, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type, Union
+
+RunBatch = Callable[[List[Any]], Union[List[Any], Awaitable[List[Any]]]]
+
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, float("inf"))
+
+class MicroBatcher:
+    def __init__(self, run_batch: RunBatch, window_ms: float = 3.0, max_batch: int = 32,
+                 fail_fast: Tuple[Type[BaseException], ...] = ()):
+        self.run_batch = run_batch
+        self.fail_fast = tuple(fail_fast)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._pending: List[tuple] = []  # (item, future, t_enqueue)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()  # ссылки на задачи батчей: без них задачу может собрать GC
+        # метрики
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.max_seen = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.run_sum = 0.0
+        self.size_hist: Dict[int, int] = {b: 0 for b in _SIZE_BUCKETS}
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((item, fut, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, items: List[Any]) -> List[Any]:
+        res = self.run_batch(items)
+        if asyncio.iscoroutine(res) or isinstance(res, asyncio.Future):
+            res = await res
+        return res
+
+    async def _run(self, batch: List[tuple]):
+        t0 = time.perf_counter()
+        items = [it for it, _, _ in batch]
+        self._observe(batch, t0)
+        try:
+            results = await self._call(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(items)} items")
+            for (_, fut, _), r in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(r)
+        except Exception as e:
+            self.errors += 1
+            if isinstance(e, self.fail_fast):
+                self._fail(batch, e)
+                return
+            # один битый элемент не должен валить соседей: добиваем по одному
+            for it, fut, _ in batch:
+                if fut.done():
+                    continue
+                try:
+                    fut.set_result((await self._call([it]))[0])
+                except Exception as ie:
+                    if isinstance(ie, self.fail_fast):
+                        self._fail(batch, ie)
+                        return
+                    fut.set_exception(ie)
+        finally:
+            self.run_sum += time.perf_counter() - t0
+
+    @staticmethod
+    def _fail(batch: List[tuple], e: BaseException):
+        for _, fut, _ in batch:
+            if not fut.done():
+                fut.set_exception(e)
+
+    def _observe(self, batch: List[tuple], t_flush: float):
+        n = len(batch)
+        self.batches += 1
+        self.items += n
+        self.max_seen = max(self.max_seen, n)
+        for b in _SIZE_BUCKETS:
+            if n <= b:
+                self.size_hist[b] += 1
+                break
+        waits = [t_flush - t for _, _, t in batch]
+        self.wait_sum += sum(waits)
+        self.wait_max = max(self.wait_max, max(waits))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "pending": len(self._pending),
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "max_batch_size": self.max_seen,
+            "batch_size_hist": {f"le_{b}": c for b, c in self.size_hist.items()},
+            "avg_wait_ms": (1000.0 * self.wait_sum / self.items) if self.items else 0.0,
+            "max_wait_ms": 1000.0 * self.wait_max,
+            "avg_run_ms": (1000.0 * self.run_sum / self.batches) if self.batches else 0.0,
+        }
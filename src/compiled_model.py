@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled-инференс для priority-модели:
+CalibratedClassifierCV(LinearSVC, method="sigmoid") → плоские NumPy-массивы.
+
+- W (n_features × Σклассов) — coef_.T всех калиброванных эстиматоров, C-contiguous
+- b — intercept_, A/B — параметры сигмоид (a_, b_) по тем же колонкам
+- proba = один sparse×dense matmul + expit + нормировка; predict = argmax(proba)
+
+Арифметика повторяет sklearn поэлементно (тот же порядок сложений в csr matmul,
+та же нормировка и усреднение по ансамблю), поэтому на sparse-входе результат
+побитово совпадает с clf.predict_proba / clf.predict.
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from scipy.special import expit
+
+class CompiledCalibratedLinear:
+    def __init__(self, classes: np.ndarray, W: np.ndarray, b: np.ndarray,
+                 A: np.ndarray, B: np.ndarray, members: List[Tuple[slice, np.ndarray]]):
+        self.classes_ = np.asarray(classes)
+        self.W = np.ascontiguousarray(W, dtype=np.float64)
+        self.b = np.ascontiguousarray(b, dtype=np.float64)
+        self.A = np.ascontiguousarray(A, dtype=np.float64)
+        self.B = np.ascontiguousarray(B, dtype=np.float64)
+        # members: (срез колонок W, индексы классов в proba) для каждого калиброванного эстиматора
+        self.members = members
+
+    @property
+    def n_features(self) -> int:
+        return self.W.shape[0]
+
+    @classmethod
+    def from_sklearn(cls, clf) -> Optional["CompiledCalibratedLinear"]:
+        """None, если модель не sigmoid-калиброванный линейный классификатор."""
+        ccs = getattr(clf, "calibrated_classifiers_", None)
+        if not ccs or getattr(clf, "method", None) != "sigmoid":
+            return None
+        classes = np.asarray(clf.classes_)
+        n_classes = len(classes)
+        pos = {c: i for i, c in enumerate(classes)}
+        Ws, bs, As, Bs, members = [], [], [], [], []
+        col = 0
+        for cc in ccs:
+            est = cc.estimator
+            coef = getattr(est, "coef_", None)
+            if coef is None or not hasattr(est, "decision_function"):
+                return None
+            if hasattr(coef, "toarray"):
+                coef = coef.toarray()
+            coef = np.asarray(coef, dtype=np.float64)
+            cal_a = [getattr(c, "a_", None) for c in cc.calibrators]
+            cal_b = [getattr(c, "b_", None) for c in cc.calibrators]
+            if any(v is None for v in cal_a + cal_b) or len(cal_a) != coef.shape[0]:
+                return None
+            if n_classes == 2:
+                cls_idx = np.array([1])  # бинарный случай: сигмоида по positive-классу
+            else:
+                cls_idx = np.array([pos[c] for c in est.classes_])
+            k = coef.shape[0]
+            Ws.append(coef.T)
+            bs.append(np.broadcast_to(np.asarray(est.intercept_, dtype=np.float64), (k,)))
+            As.append(np.asarray(cal_a, dtype=np.float64))
+            Bs.append(np.asarray(cal_b, dtype=np.float64))
+            members.append((slice(col, col + k), cls_idx))
+            col += k
+        return cls(classes, np.hstack(Ws), np.concatenate(bs),
+                   np.concatenate(As), np.concatenate(Bs), members)
+
+    def decision_function(self, X) -> np.ndarray:
+        D = X @ self.W
+        if hasattr(D, "toarray"):
+            D = D.toarray()
+        return np.asarray(D) + self.b
+
+    def predict_proba(self, X) -> np.ndarray:
+        D = self.decision_function(X)
+        S = expit(-(self.A * D + self.B))
+        n, n_classes = D.shape[0], len(self.classes_)
+        mean_proba = np.zeros((n, n_classes))
+        for cols, cls_idx in self.members:
+            proba = np.zeros((n, n_classes))
+            proba[:, cls_idx] = S[:, cols]
+            if n_classes == 2:
+                proba[:, 0] = 1.0 - proba[:, 1]
+            else:
+                denominator = np.sum(proba, axis=1)[:, np.newaxis]
+                uniform_proba = np.full_like(proba, 1 / n_classes)
+                proba = np.divide(proba, denominator, out=uniform_proba, where=denominator != 0)
+            proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+            mean_proba += proba
+        mean_proba /= len(self.members)
+        return mean_proba
+
+    def predict_with_proba(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        P = self.predict_proba(X)
+        return self.classes_[np.argmax(P, axis=1)], P
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+class CompiledLinear:
+    """Линейный классификатор (LogisticRegression / LinearSVC) на голых массивах.
+
+    Держит те же атрибуты, что sklearn (coef_, intercept_, classes_), поэтому
+    подходит и для ExplainEngine; массивы могут быть memmap (см. artifacts).
+    """
+    def __init__(self, classes: np.ndarray, coef: np.ndarray, intercept: np.ndarray,
+                 multinomial: bool = False):
+        self.classes_ = np.asarray(classes)
+        self.coef_ = np.asarray(coef)
+        self.intercept_ = np.asarray(intercept)
+        self.multinomial = multinomial
+
+    @classmethod
+    def from_sklearn(cls, est) -> Optional["CompiledLinear"]:
+        coef = getattr(est, "coef_", None)
+        if coef is None:
+            return None
+        if hasattr(coef, "toarray"):
+            coef = coef.toarray()
+        multinomial = False
+        if hasattr(est, "multi_class"):  # LogisticRegression: та же логика выбора, что в predict_proba
+            multinomial = not (est.multi_class in ("ovr", "warn") or (
+                est.multi_class == "auto"
+                and (len(est.classes_) <= 2 or est.solver in ("liblinear", "newton-cholesky"))
+            ))
+        return cls(est.classes_, coef, np.broadcast_to(est.intercept_, (coef.shape[0],)), multinomial)
+
+    @property
+    def n_features(self) -> int:
+        return self.coef_.shape[1]
+
+    def decision_function(self, X) -> np.ndarray:
+        D = X @ self.coef_.T
+        if hasattr(D, "toarray"):
+            D = D.toarray()
+        D = np.asarray(D) + self.intercept_
+        return D.ravel() if D.shape[1] == 1 else D
+
+    def predict(self, X) -> np.ndarray:
+        D = self.decision_function(X)
+        idx = (D > 0).astype(int) if D.ndim == 1 else np.argmax(D, axis=1)
+        return self.classes_[idx]
+
+    def predict_proba(self, X) -> np.ndarray:
+        D = self.decision_function(X)
+        if self.multinomial:
+            D = np.c_[-D, D] if D.ndim == 1 else D
+            E = np.exp(D - D.max(axis=1, keepdims=True))
+            return E / E.sum(axis=1, keepdims=True)
+        P = expit(D)
+        if P.ndim == 1:
+            return np.vstack([1 - P, P]).T
+        return P / P.sum(axis=1, keepdims=True)
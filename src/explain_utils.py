@@ -1,30 +1,115 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, List, Tuple
+"""
+Explain для priority-модели.
+
+Всё тяжёлое (массив имён признаков, таблица весов base_word по классам)
+считается один раз при загрузке бандла. На запрос — только sparse-строка
+word TF-IDF × coef_ предсказанного класса: реальный вклад токенов текста.
+
+Для hashing-бандлов словаря нет: имена признаков восстанавливаются по самому
+тексту (n-грамма → бакет), поэтому explain_batch тогда нужен ещё и texts.
+"""
+from typing import Dict, List, Optional, Tuple
 import joblib
+import numpy as np
+from scipy.sparse import issparse
 from sklearn.feature_extraction.text import TfidfVectorizer
+from .featurize import is_hashing
+
+class ExplainEngine:
+    def __init__(self, vect_word: Optional[TfidfVectorizer], base_word=None):
+        self.vect = vect_word
+        self.hashed = is_hashing(vect_word)
+        # mmap-словарь (artifacts.MappedTfidf): имена берём по индексу, без копии в object-массив
+        self.mapped = hasattr(vect_word, "feature_name")
+        self.n_features = (
+            vect_word.n_features if self.hashed or self.mapped
+            else len(vect_word.vocabulary_) if vect_word is not None else 0
+        )
+        self.feature_names: np.ndarray = (
+            np.asarray(vect_word.get_feature_names_out(), dtype=object)
+            if vect_word is not None and not (self.hashed or self.mapped) else np.empty(0, dtype=object)
+        )
+        self.weights: Optional[np.ndarray] = None  # (n_classes, n_features)
+        self.class_index: Dict[str, int] = {}
+        if base_word is not None and hasattr(base_word, "coef_"):
+            coef = base_word.coef_
+            coef = coef.toarray() if issparse(coef) else np.asarray(coef)
+            classes = [str(c) for c in base_word.classes_]
+            if coef.shape[0] == 1 and len(classes) == 2:
+                # бинарный LinearSVC хранит одну строку — для класса 0 это -coef
+                coef = np.vstack([-coef[0], coef[0]])
+            self.weights = np.ascontiguousarray(coef, dtype=np.float64)
+            self.class_index = {c: i for i, c in enumerate(classes)}
+
+    @property
+    def has_weights(self) -> bool:
+        return self.weights is not None and self.weights.shape[1] == self.n_features
+
+    def contributions(self, row, pred: Optional[str], k: int = 8,
+                      text: Optional[str] = None) -> List[Tuple[str, float]]:
+        """row — 1×V строка word TF-IDF (csr). Топ-k токенов текста с вкладом в класс pred."""
+        idx, vals = row.indices, row.data
+        if idx.size == 0:
+            return []
+        cls = self.class_index.get(str(pred)) if pred is not None else None
+        if self.has_weights and cls is not None:
+            scores = vals * self.weights[cls, idx]
+            keep = scores > 0
+            idx, scores = idx[keep], scores[keep]
+        else:
+            # без base_word — просто самые «тяжёлые» по TF-IDF токены текста
+            scores = vals
+        if idx.size == 0:
+            return []
+        order = np.argsort(scores)[::-1][:k]
+        if self.hashed:
+            names = self.vect.token_index(text) if text is not None else {}
+            return [(names.get(int(idx[i]), f"#{int(idx[i])}"), float(scores[i])) for i in order]
+        if self.mapped:
+            return [(self.vect.feature_name(int(idx[i])), float(scores[i])) for i in order]
+        return [(str(self.feature_names[idx[i]]), float(scores[i])) for i in order]
+
+    def explain_batch(self, Xw, preds: List[Optional[str]], k: int = 8,
+                      texts: Optional[List[str]] = None) -> List[List[Tuple[str, float]]]:
+        if Xw is None:
+            return [[] for _ in preds]
+        Xw = Xw.tocsr()
+        return [self.contributions(Xw[i], p, k=k, text=texts[i] if texts is not None else None)
+                for i, p in enumerate(preds)]
 
+    def top_tokens(self, text: str, pred: Optional[str], k: int = 8) -> List[str]:
+        if self.vect is None:
+            return []
+        return [t for t, _ in self.contributions(self.vect.transform([text]), pred, k=k, text=text)]
+
+# -----------------------------------------------------------------------------
+# Утилиты поверх бандла (для ноутбуков/скриптов; API держит свой ExplainEngine)
+# -----------------------------------------------------------------------------
 def load_priority_bundle(path: str = "models/priority.joblib"):
-    bundle = joblib.load(path)
-    return bundle  # {"vect","base","clf","classes"}
-
-def top_features_for_text(text: str, bundle, k: int = 5) -> List[str]:
-    vect: TfidfVectorizer = bundle["vect"]
-    base = bundle["base"]
-    clf  = bundle["clf"]
-    X = vect.transform([text])
-    pred = clf.predict(X)[0]
-    cls_idx = list(base.classes_).index(pred)
-    coefs = base.coef_[cls_idx]
-    feats = vect.get_feature_names_out()
-    top_idx = coefs.toarray().ravel().argsort()[-k:][::-1]
-    return [feats[i] for i in top_idx]
+    return joblib.load(path)  # {"vect_word","vect_char","base_word","clf","classes"}
+
+def engine_for_bundle(bundle) -> ExplainEngine:
+    return ExplainEngine(bundle.get("vect_word") or bundle.get("vect"),
+                         bundle.get("base_word") or bundle.get("base"))
+
+def _features(text: str, bundle):
+    from scipy.sparse import hstack
+    vw = bundle.get("vect_word") or bundle.get("vect")
+    vc = bundle.get("vect_char")
+    parts = [v.transform([text]) for v in (vw, vc) if v is not None]
+    return hstack(parts, format="csr") if len(parts) > 1 else parts[0]
 
 def predict_with_probs(text: str, bundle) -> Tuple[str, Dict[str, float]]:
-    vect: TfidfVectorizer = bundle["vect"]
-    clf  = bundle["clf"]
+    clf = bundle["clf"]
     classes = list(bundle["classes"])
-    X = vect.transform([text])
+    X = _features(text, bundle)
     pred = clf.predict(X)[0]
     proba = getattr(clf, "predict_proba", None)
     probs = dict(zip(classes, (proba(X)[0].tolist() if proba else [])))
     return str(pred), probs
+
+def top_features_for_text(text: str, bundle, k: int = 5, pred: Optional[str] = None) -> List[str]:
+    if pred is None:
+        pred, _ = predict_with_probs(text, bundle)
+    return engine_for_bundle(bundle).top_tokens(text, pred, k=k)
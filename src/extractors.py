@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import re, pandas as pd
-from typing import Optional, List, Dict, Iterable
+from functools import lru_cache
+from typing import Any, Optional, List, Dict, Iterable, Tuple
 
 from .constants import ASPECT_PATTERNS, STOP_HINTS
-from .place_dict import STOP_DICT, load_stop_dict, fuzzy_stop_match
+from .place_dict import StopIndex, derive, load_stop_dict, fuzzy_stop_match, get_stop_index, stop_snapshot
+from .rules import RuleSet
 
 # geocode_stop — опционально: если модуля нет, просто пропускаем геокодинг
 try:
@@ -25,7 +27,17 @@ def _iter_stop_strings(stop_dict: Dict[str, List[dict]]) -> Iterable[str]:
                     s = str(a).strip()
                     if s: yield s
 
-ALL_STOPS: List[str] = sorted(set(_iter_stop_strings(STOP_DICT)))
+@derive("all_stops")  # живёт в снимке place_dict и подменяется вместе со словарём
+def _all_stops(stop_dict: Dict[str, List[dict]]) -> List[str]:
+    return sorted(set(_iter_stop_strings(stop_dict)))
+
+def __getattr__(name: str):
+    # ALL_STOPS / STOP_DICT — из текущего снимка (раньше — глобалы модуля)
+    if name == "ALL_STOPS":
+        return stop_snapshot()["all_stops"]
+    if name == "STOP_DICT":
+        return stop_snapshot().stop_dict
+    raise AttributeError(name)
 
 # === регулярки ===
 ROUTE_PATTERNS = [
@@ -51,8 +63,86 @@ PARTICIPANT_PATTERNS = [
 
 NEGATE_SAFETY = re.compile(r"\bучени\w+|\bтренировочн\w+|\bпланов\w+|\bжоспарл\w+", re.I)
 
+TIME_WORDS = [
+    ("morning", r"\bтаңертең\b|\bутром\b"),
+    ("noon",    r"\bтүс\b|\bднем\b|\bтүскі\b"),
+    ("evening", r"\bкеш\b|\bвечером\b|\bкешке\b"),
+]
+
+_CITY_PATTERNS = {
+    "Astana": [r"\bастана\b", r"\bнур[-\s]?султан\b", r"\bнурсултан\b", r"\bastana\b", r"\bns\b"],
+    "Almaty": [r"\bалматы\b", r"\bалмата\b", r"\bалма[-\s]?ата\b", r"\balmaty\b"],
+}
+
+# === все правила — один проход по тексту (src/rules.py) ===
+# имя правила — «вид:вариант»; вид — ключ в ответе scan_rules
+RULE_KINDS = ("route", "time", "city", "aspects", "participant", "negated_safety")
+RULE_SPECS = (
+    [(f"route:{i}", p.pattern) for i, p in enumerate(ROUTE_PATTERNS)]
+    + [("time", TIME_PAT.pattern)]
+    + [(f"time:{label}", p) for label, p in TIME_WORDS]
+    + [(f"city:{city}", "|".join(pats)) for city, pats in _CITY_PATTERNS.items()]
+    + [(f"aspects:{asp}", "|".join(f"(?:{p})" for p in pats)) for asp, pats in ASPECT_PATTERNS.items()]
+    + [(f"participant:{i}", p.pattern) for i, (p, _) in enumerate(PARTICIPANT_PATTERNS)]
+    + [("negated_safety", NEGATE_SAFETY.pattern)]
+)
+RULES = RuleSet(RULE_SPECS)
+
+@lru_cache(maxsize=None)
+def _rule_set(kinds: Tuple[str, ...]) -> Tuple[RuleSet, frozenset, frozenset]:
+    """Правила этих видов + после каких находок ответ уже известен (первое по приоритету
+    правило вида; для аспектов — все), чтобы не дочитывать длинный текст зря."""
+    unknown = set(kinds) - set(RULE_KINDS)
+    if unknown:
+        raise ValueError(f"unknown rule kinds: {sorted(unknown)}")
+    specs = [(name, p) for name, p in RULE_SPECS if name.split(":")[0] in kinds]
+    stop = set()
+    for kind in set(kinds):
+        names = [name for name, _ in specs if name.split(":")[0] == kind]
+        stop.update(names if kind == "aspects" else names[:1])
+    rules = RULES if len(specs) == len(RULE_SPECS) else RuleSet(specs)
+    return rules, frozenset(stop), frozenset(kinds)
+
+def scan_rules(text: str, kinds: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Маршрут, время, город, аспекты, участник и отрицание safety за один проход правил
+    (kinds — только эти ключи из RULE_KINDS). Приоритеты — как у отдельных функций ниже:
+    первый шаблон из списка, который есть в тексте, и его самое левое совпадение.
+    """
+    rules, stop, kinds = _rule_set(RULE_KINDS if kinds is None else tuple(kinds))
+    t = text or ""
+    hits = rules.scan(t, stop_after=stop)
+    out: Dict[str, Any] = {}
+    if "route" in kinds:
+        out["route"] = None
+        for i, pat in enumerate(ROUTE_PATTERNS):
+            pos = hits.get(f"route:{i}")
+            if pos is not None:
+                out["route"] = next((g for g in pat.match(t, pos).groups() if g), None)
+                if out["route"]:
+                    break
+    if "time" in kinds:
+        if "time" in hits:
+            out["time"] = TIME_PAT.match(t, hits["time"]).group(0)
+        else:
+            out["time"] = next((label for label, _ in TIME_WORDS if f"time:{label}" in hits), None)
+    if "city" in kinds:
+        out["city"] = next((city for city in _CITY_PATTERNS if f"city:{city}" in hits), None)
+    if "aspects" in kinds:
+        out["aspects"] = sorted(asp for asp in ASPECT_PATTERNS if f"aspects:{asp}" in hits) or ["other"]
+    if "participant" in kinds:
+        out["participant"] = None
+        for i, (pat, label) in enumerate(PARTICIPANT_PATTERNS):
+            pos = hits.get(f"participant:{i}")
+            if pos is not None:
+                out["participant"] = {"role": label, "match": pat.match(t, pos).group(0)}
+                break
+    if "negated_safety" in kinds:
+        out["negated_safety"] = "negated_safety" in hits
+    return out
+
 def is_negated_safety(text: str) -> bool:
-    return bool(NEGATE_SAFETY.search(text or ""))
+    return scan_rules(text, ("negated_safety",))["negated_safety"]
 
 def _clean_place(p: str) -> str:
     p = re.sub(r"\s+(?:в\s+)?([01]?\d|2[0-3])(:[0-5]\d)?\b.*$", "", p)
@@ -61,56 +151,27 @@ def _clean_place(p: str) -> str:
 
 # === аспекты по правилам ===
 def detect_aspects(text: str) -> List[str]:
-    text = text or ""
-    found = set()
-    for asp, pats in ASPECT_PATTERNS.items():
-        for p in pats:
-            if re.search(p, text, flags=re.I):
-                found.add(asp); break
-    return sorted(found) if found else ["other"]
+    return scan_rules(text, ("aspects",))["aspects"]
 
 # === маршрут/время ===
 def extract_route(text: str) -> Optional[str]:
-    t = text or ""
-    for pat in ROUTE_PATTERNS:
-        m = pat.search(t)
-        if m:
-            for g in m.groups():
-                if g: return g
-    return None
+    return scan_rules(text, ("route",))["route"]
 
 def extract_time(text: str) -> Optional[str]:
-    if not text: return None
-    m = TIME_PAT.search(text)
-    if m: return m.group(0)
-    if re.search(r"\bтаңертең\b|\bутром\b", text, flags=re.I): return "morning"
-    if re.search(r"\bтүс\b|\bднем\b|\bтүскі\b", text, flags=re.I): return "noon"
-    if re.search(r"\bкеш\b|\bвечером\b|\bкешке\b", text, flags=re.I): return "evening"
-    return None
+    return scan_rules(text, ("time",))["time"]
 
 # === city hint ===
-_CITY_PATTERNS = {
-    "Astana": [r"\bастана\b", r"\bнур[-\s]?султан\b", r"\bнурсултан\b", r"\bastana\b", r"\bns\b"],
-    "Almaty": [r"\bалматы\b", r"\bалмата\b", r"\bалма[-\s]?ата\b", r"\balmaty\b"],
-}
 def detect_city_hint(text: str) -> Optional[str]:
-    t = (text or "").lower()
-    for city, pats in _CITY_PATTERNS.items():
-        for p in pats:
-            if re.search(p, t, flags=re.I): return city
-    return None
+    return scan_rules(text, ("city",))["city"]
 
 # === поиск города/координат по базе ===
-def _find_city_latlon_for_base(base: str) -> Dict[str, Optional[float]]:
-    for city, stops in (STOP_DICT or {}).items():
-        for rec in (stops or []):
-            if isinstance(rec, dict) and (rec.get("name") or "").strip() == base:
-                return {
-                    "city": city,
-                    "lat": rec.get("lat"),
-                    "lon": rec.get("lon"),
-                }
-    return {"city": None, "lat": None, "lon": None}
+def _find_city_latlon_for_base(base: str, idx: Optional[StopIndex] = None) -> Dict[str, Optional[float]]:
+    idx = idx if idx is not None else get_stop_index()
+    i = idx.lookup(base)
+    if i is None:
+        return {"city": None, "lat": None, "lon": None}
+    rec = idx.record(i)
+    return {"city": rec["city"], "lat": rec["lat"], "lon": rec["lon"]}
 
 # === старый интерфейс (строка) ===
 def extract_place(text: str) -> Optional[str]:
@@ -130,19 +191,22 @@ def extract_place(text: str) -> Optional[str]:
             if m:
                 return _clean_place(m.group(1))
     # 3) fuzzy по словарю
-    hint = detect_city_hint(t)
-    best, score = fuzzy_stop_match(t, city_hint=hint, threshold=87)
+    r = scan_rules(t, ("city", "route"))
+    best, score = fuzzy_stop_match(t, city_hint=r["city"], threshold=87, route=r["route"])
     if best:
         return best
     return None
 
 # === структурный вывод (city/lat/lon/score) ===
-def extract_place_struct(text: str) -> Optional[Dict]:
-    hint = detect_city_hint(text)
+def extract_place_struct(text: str, rules: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+    """rules — готовый scan_rules(text) (нужны city и route), если вызывающий его уже посчитал."""
+    r = rules if rules is not None else scan_rules(text, ("city", "route"))
+    hint = r["city"]
+    snap = stop_snapshot()  # один снимок на весь вызов: geocode и словарь — из одной версии
     # 1) geocode (если доступен)
     if geocode_stop is not None:
         try:
-            geo = geocode_stop(text, city_hint=hint)
+            geo = geocode_stop(text, city_hint=hint, snap=snap)
         except Exception:
             geo = None
         if geo and geo.get("name"):
@@ -155,10 +219,10 @@ def extract_place_struct(text: str) -> Optional[Dict]:
                 "score": geo.get("score", 0),
                 "method": "geocode+fuzzy",
             }
-    # 2) fuzzy по словарю
-    best, score = fuzzy_stop_match(text, city_hint=hint, threshold=70)
+    # 2) fuzzy по словарю (сначала — по остановкам названного маршрута, если он есть в GTFS)
+    best, score = snap.index.match(text, city_hint=hint, threshold=70, route=r["route"])
     if best:
-        meta = _find_city_latlon_for_base(best)
+        meta = _find_city_latlon_for_base(best, snap.index)
         return {
             "city_hint": hint,
             "name": best,
@@ -179,18 +243,15 @@ def extract_place_struct(text: str) -> Optional[Dict]:
 
 # === участники ===
 def extract_participant(text: str) -> Optional[Dict]:
-    t = text or ""
-    for pat, label in PARTICIPANT_PATTERNS:
-        m = pat.search(t)
-        if m: return {"role": label, "match": m.group(0)}
-    return None
+    return scan_rules(text, ("participant",))["participant"]
 
 # === пакетная обработка ===
 def batch_apply(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
-    df["route_extracted"] = df["text"].apply(extract_route)
-    df["time_extracted"]  = df["text"].apply(extract_time)
+    rules = df["text"].apply(scan_rules)  # один проход правил на текст
+    df["route_extracted"] = rules.apply(lambda r: r["route"])
+    df["time_extracted"]  = rules.apply(lambda r: r["time"])
     df["place_extracted"] = df["text"].apply(extract_place)
-    df["participant"]     = df["text"].apply(lambda t: (extract_participant(t) or {}).get("role"))
-    df["aspects_rule"]    = df["text"].apply(detect_aspects)
+    df["participant"]     = rules.apply(lambda r: (r["participant"] or {}).get("role"))
+    df["aspects_rule"]    = rules.apply(lambda r: r["aspects"])
     return df
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Общий проход featurization для priority (word + char) и aspect (char_wb).
+
+Текст предобрабатывается (lowercase и т.п.) один раз, n-граммы строятся один раз
+на каждую уникальную конфигурацию анализатора, а затем раздаются по словарям
+всех векторизаторов этой группы. TF-IDF (sublinear, idf, норма) применяется
+по заранее снятым idf-массивам, без валидации sklearn на каждый вызов.
+Результат совпадает с vect.transform(texts) с точностью до округления
+(индексы в строке отсортированы, норма суммируется в этом порядке).
+
+priority-char и aspect попадают в одну группу, только если обе модели обучены
+с одинаковыми CHAR_PARAMS (char_wb 3–5): train_priority --char_analyzer char_wb;
+по умолчанию priority остаётся на char, и группы разные.
+
+HashingTfidf — вариант без словаря: feature hashing + сохранённый idf.
+Ни vocabulary_ в пикле, ни dict-а в RSS воркера; группируется так же.
+"""
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.preprocessing import normalize
+
+WORD_PARAMS = dict(ngram_range=(1, 2), min_df=3, max_df=0.9, sublinear_tf=True)
+CHAR_PARAMS = dict(analyzer="char_wb", ngram_range=(3, 5), min_df=3, sublinear_tf=True)
+
+class HashingTfidf:
+    """TF-IDF поверх HashingVectorizer: индекс признака = hash(n-грамма) mod 2**bits.
+
+    idf считается на fit и хранится массивом; бакеты с df < min_df (или > max_df)
+    получают idf=0 — аналог обрезки словаря у TfidfVectorizer.
+    """
+    def __init__(self, analyzer="word", ngram_range=(1, 1), n_features: int = 2 ** 20,
+                 min_df=1, max_df=1.0, sublinear_tf: bool = False, norm: Optional[str] = "l2",
+                 lowercase: bool = True, **hasher_kw):
+        self.hasher = HashingVectorizer(
+            analyzer=analyzer, ngram_range=ngram_range, n_features=n_features,
+            alternate_sign=False, norm=None, lowercase=lowercase, **hasher_kw
+        )
+        self.min_df = min_df
+        self.max_df = max_df
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.idf_: Optional[np.ndarray] = None
+
+    # совместимость с кодом, который смотрит на параметры анализатора
+    def __getattr__(self, name):
+        if name == "hasher":
+            raise AttributeError(name)
+        return getattr(self.hasher, name)
+
+    @property
+    def n_features(self) -> int:
+        return self.hasher.n_features
+
+    def counts_from_grams(self, docs: List[List[str]]) -> sp.csr_matrix:
+        X = self.hasher._get_hasher().transform(docs)
+        if self.hasher.binary:
+            X.data.fill(1)
+        return X
+
+    def counts(self, texts: Sequence[str]) -> sp.csr_matrix:
+        analyze = self.hasher.build_analyzer()
+        return self.counts_from_grams([analyze(t) for t in texts])
+
+    def _fit_counts(self, X: sp.csr_matrix):
+        n = X.shape[0]
+        df = np.bincount(X.indices, minlength=self.n_features)
+        idf = np.log((1 + n) / (1 + df)) + 1.0  # smooth_idf, как в TfidfTransformer
+        min_df = self.min_df if isinstance(self.min_df, int) else int(np.ceil(self.min_df * n))
+        max_df = self.max_df if isinstance(self.max_df, int) else int(np.floor(self.max_df * n))
+        idf[(df < min_df) | (df > max_df)] = 0.0
+        self.idf_ = idf
+
+    def _tfidf(self, X: sp.csr_matrix) -> sp.csr_matrix:
+        X = X.astype(np.float64, copy=False)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        X.data *= self.idf_[X.indices]
+        X.eliminate_zeros()
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+    def fit_from_grams(self, docs: List[List[str]]) -> sp.csr_matrix:
+        X = self.counts_from_grams(docs)
+        self._fit_counts(X)
+        return self._tfidf(X)
+
+    def fit(self, texts: Sequence[str]):
+        self._fit_counts(self.counts(texts))
+        return self
+
+    def fit_transform(self, texts: Sequence[str]) -> sp.csr_matrix:
+        X = self.counts(texts)
+        self._fit_counts(X)
+        return self._tfidf(X)
+
+    def transform(self, texts: Sequence[str]) -> sp.csr_matrix:
+        return self._tfidf(self.counts(texts))
+
+    def token_index(self, text: str) -> Dict[int, str]:
+        """{индекс бакета: n-грамма} для конкретного текста — имена признаков для explain."""
+        grams = self.hasher.build_analyzer()(text)
+        idx = self.counts_from_grams([[g] for g in grams]).indices
+        out: Dict[int, str] = {}
+        for i, g in zip(idx, grams):
+            out.setdefault(int(i), g)
+        return out
+
+def make_word_vectorizer(hashing: bool = False, n_features: int = 2 ** 18, **overrides):
+    params = {**WORD_PARAMS, **overrides}
+    return HashingTfidf(n_features=n_features, **params) if hashing else TfidfVectorizer(**params)
+
+def make_char_vectorizer(hashing: bool = False, n_features: int = 2 ** 19, **overrides):
+    params = {**CHAR_PARAMS, **overrides}
+    return HashingTfidf(n_features=n_features, **params) if hashing else TfidfVectorizer(**params)
+
+def is_hashing(v) -> bool:
+    return isinstance(v, HashingTfidf)
+
+def _native_counts(v) -> bool:
+    # HashingTfidf и artifacts.MappedTfidf сами считают счётчики по n-граммам и держат idf_ массивом
+    return hasattr(v, "counts_from_grams")
+
+class _PreAnalyzed:
+    """analyzer-заглушка для fit: документы уже разобраны на n-граммы."""
+    def __call__(self, doc):
+        return doc
+
+def _shareable(v) -> bool:
+    return (
+        (isinstance(v, TfidfVectorizer) or _native_counts(v))
+        and isinstance(v.analyzer, str)
+        and v.preprocessor is None
+        and v.tokenizer is None
+        and v.input == "content"
+    )
+
+def _prep_key(v) -> Hashable:
+    return (v.lowercase, v.strip_accents)
+
+def _ngram_key(v) -> Hashable:
+    stop = v.stop_words if not isinstance(v.stop_words, list) else tuple(v.stop_words)
+    return _prep_key(v) + (v.analyzer, tuple(v.ngram_range), v.token_pattern, stop)
+
+class SharedFeaturizer:
+    def __init__(self, vectorizers: Dict[str, Optional[TfidfVectorizer]]):
+        self.vectorizers: Dict[str, TfidfVectorizer] = {k: v for k, v in vectorizers.items() if v is not None}
+        self.groups: Dict[Hashable, List[str]] = {}
+        self.solo: List[str] = []
+        for name, v in self.vectorizers.items():
+            if _shareable(v):
+                self.groups.setdefault(_ngram_key(v), []).append(name)
+            else:
+                self.solo.append(name)
+        # препроцессор и генератор n-грамм — один раз на конфигурацию, а не на вызов
+        self._prep: Dict[Hashable, Callable] = {}
+        self._ngrams: Dict[Hashable, Callable] = {}
+        for key, names in self.groups.items():
+            v = self.vectorizers[names[0]]
+            self._prep.setdefault(_prep_key(v), v.build_preprocessor())
+            self._ngrams[key] = self._ngrams_fn(v)
+        self._idf: Dict[str, np.ndarray] = {}
+        self.refresh()
+
+    def refresh(self):
+        """Снять idf с (пере)обученных векторизаторов."""
+        self._idf = {}
+        for name, v in self.vectorizers.items():
+            if _native_counts(v):
+                if v.idf_ is not None:
+                    self._idf[name] = v.idf_
+            elif getattr(v, "use_idf", False) and hasattr(v, "vocabulary_"):
+                self._idf[name] = np.asarray(v.idf_, dtype=np.float64)
+
+    # ---------- анализ ----------
+    @staticmethod
+    def _ngrams_fn(v) -> Callable[[str], List[str]]:
+        if v.analyzer == "char":
+            return v._char_ngrams
+        if v.analyzer == "char_wb":
+            return v._char_wb_ngrams
+        stop_words = v.get_stop_words()
+        tokenize = v.build_tokenizer()
+        return lambda doc: v._word_ngrams(tokenize(doc), stop_words)
+
+    def analyze(self, texts: Sequence[str]) -> Dict[Hashable, List[List[str]]]:
+        """{ключ группы: n-граммы по каждому тексту}; предобработка — раз на конфигурацию."""
+        prepped: Dict[Hashable, List[str]] = {}
+        out: Dict[Hashable, List[List[str]]] = {}
+        for key, names in self.groups.items():
+            v = self.vectorizers[names[0]]
+            pk = _prep_key(v)
+            if pk not in prepped:
+                pre = self._prep[pk]
+                prepped[pk] = [pre(v.decode(t)) for t in texts]
+            ngrams = self._ngrams[key]
+            out[key] = [ngrams(doc) for doc in prepped[pk]]
+        return out
+
+    # ---------- inference ----------
+    @staticmethod
+    def _counts(v, docs: List[List[str]]):
+        if _native_counts(v):
+            return v.counts_from_grams(docs)
+        # то же, что CountVectorizer._count_vocab(fixed_vocab=True), но по готовым n-граммам
+        vocab = v.vocabulary_
+        j_indices: List[int] = []
+        values: List[int] = []
+        indptr = [0]
+        for grams in docs:
+            counter: Dict[int, int] = {}
+            for g in grams:
+                idx = vocab.get(g)
+                if idx is not None:
+                    counter[idx] = counter.get(idx, 0) + 1
+            j_indices.extend(counter.keys())
+            values.extend(counter.values())
+            indptr.append(len(j_indices))
+        X = sp.csr_matrix(
+            (np.asarray(values, dtype=np.intc),
+             np.asarray(j_indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int32)),
+            shape=(len(docs), len(vocab)),
+            dtype=v.dtype,
+        )
+        X.sort_indices()
+        if v.binary:
+            X.data.fill(1)
+        return X
+
+    def _tfidf(self, name: str, X):
+        v = self.vectorizers[name]
+        X = X.astype(np.float64, copy=False)
+        if v.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        idf = self._idf.get(name)
+        if idf is not None:
+            X.data *= idf[X.indices]
+            if is_hashing(v):
+                X.eliminate_zeros()  # бакеты, обрезанные по min_df/max_df
+        if v.norm is not None:
+            X = normalize(X, norm=v.norm, copy=False)
+        return X
+
+    def transform(self, texts: Sequence[str]) -> Dict[str, sp.csr_matrix]:
+        texts = list(texts)
+        out: Dict[str, sp.csr_matrix] = {}
+        for key, docs in self.analyze(texts).items():
+            for name in self.groups[key]:
+                out[name] = self._tfidf(name, self._counts(self.vectorizers[name], docs))
+        for name in self.solo:
+            out[name] = self.vectorizers[name].transform(texts)
+        return out
+
+    # ---------- training ----------
+    def fit_transform(self, texts: Sequence[str]) -> Dict[str, sp.csr_matrix]:
+        """Обучает все векторизаторы за один анализ текста на группу.
+        После fit параметры анализатора возвращаются — бандл пиклится как обычный TfidfVectorizer."""
+        texts = list(texts)
+        out: Dict[str, sp.csr_matrix] = {}
+        for key, docs in self.analyze(texts).items():
+            for name in self.groups[key]:
+                v = self.vectorizers[name]
+                if is_hashing(v):
+                    out[name] = v.fit_from_grams(docs)
+                    continue
+                saved = {"analyzer": v.analyzer, "ngram_range": v.ngram_range}
+                v.set_params(analyzer=_PreAnalyzed(), ngram_range=(1, 1))
+                try:
+                    out[name] = v.fit_transform(docs)
+                finally:
+                    v.set_params(**saved)
+        for name in self.solo:
+            out[name] = self.vectorizers[name].fit_transform(texts)
+        self.refresh()
+        return out
+
+    def describe(self) -> Dict[str, List[List[str]]]:
+        return {"shared_groups": [list(n) for n in self.groups.values()], "solo": list(self.solo)}
+
+def hstack_features(parts: Sequence[Optional[sp.spmatrix]]):
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    return sp.hstack(parts, format="csr") if len(parts) > 1 else parts[0]
@@ -2,26 +2,44 @@
 import os, csv
 from rapidfuzz import process, fuzz
 
+from .place_dict import FUZZY_SHORTLIST, StopIndex, StopSnapshot, _norm_text, compiled, derive, stop_snapshot
+
 # ждём data/stops_kz.csv с колонками: name,lat,lon
-_DB = []
-if os.path.exists("data/stops_kz.csv"):
-    with open("data/stops_kz.csv", "r", encoding="utf-8") as f:
-        for row in csv.DictReader(f):
-            try:
-                _DB.append({"name": row["name"], "lat": float(row["lat"]), "lon": float(row["lon"])})
-            except Exception:
-                pass
+def _load_db(path: str = "data/stops_kz.csv"):
+    out = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    out.append({"name": row["name"].strip(), "lat": float(row["lat"]), "lon": float(row["lon"])})
+                except Exception:
+                    pass
+    return out
+
+# имена — готовым списком для rapidfuzz, координаты — в массивах индекса; живёт в снимке
+# place_dict (derived["geocode"]): place_dict.reload_stops() перечитывает CSV вместе со словарём
+@derive("geocode")
+def _build_index(stop_dict) -> StopIndex:
+    return compiled("geocode", lambda: StopIndex({"": _load_db()}))
 
-def geocode_stop(text: str, city_hint: str | None = None):
+def geocode_stop(text: str, city_hint: str | None = None, snap: StopSnapshot | None = None):
     """
     Ищем ближайшее имя в офлайн-таблице, возвращаем {name,lat,lon,score} или None.
-    city_hint пока не фильтруем (можно расширить).
+    city_hint пока не фильтруем (можно расширить). snap — снимок, уже взятый запросом.
     """
-    if not _DB or not text:
+    idx = (snap or stop_snapshot())["geocode"]
+    if not len(idx) or not text:
         return None
-    names = [r["name"] for r in _DB]
+    k = FUZZY_SHORTLIST
+    if k and len(idx) > 4 * k:
+        # большой справочник: rapidfuzz только по триграммному шорт-листу (номера по порядку)
+        ids = idx.candidates(_norm_text(text), k=k)
+        names = [idx.names[i] for i in ids]
+    else:
+        ids, names = None, idx.names
     m = process.extractOne(text, names, scorer=fuzz.WRatio, score_cutoff=85)
     if not m:
         return None
-    hit = next(r for r in _DB if r["name"] == m[0])
-    return {"name": hit["name"], "lat": hit["lat"], "lon": hit["lon"], "score": m[1]}
+    # extractOne отдаёт первый из равных по score — ту же запись, что и прежний поиск по имени
+    rec = idx.record(m[2] if ids is None else int(ids[m[2]]))
+    return {"name": rec["name"], "lat": rec["lat"], "lon": rec["lon"], "score": m[1]}
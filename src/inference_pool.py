@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Выносим CPU-bound пайплайн (регулярки, rapidfuzz, sparse transform, predict)
+с event loop в пул потоков или процессов.
+
+- mode: inline | thread | process (process — fork, модели наследуются от родителя)
+- bounded queue: больше workers + max_queue задач одновременно не берём → PoolSaturated
+- deadline: задача, не успевшая за deadline_ms, отменяется (если ещё в очереди) → DeadlineExceeded
+"""
+import asyncio, multiprocessing, os, threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+class PoolSaturated(Exception):
+    """Очередь пула заполнена — клиенту отдаём 503."""
+
+class DeadlineExceeded(Exception):
+    """Задача не уложилась в дедлайн — клиенту отдаём 504."""
+
+class InferencePool:
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None,
+                 max_queue: int = 64, deadline_ms: float = 0):
+        mode = (mode or "thread").lower()
+        if mode not in self.MODES:
+            raise ValueError(f"unknown inference mode: {mode!r} (expected one of {self.MODES})")
+        self.mode = mode
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.max_queue = max(0, int(max_queue))
+        self.deadline = (deadline_ms / 1000.0) if deadline_ms and deadline_ms > 0 else None
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> Executor:
+        # создаём лениво: для process важно, чтобы fork случился после загрузки моделей
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("fork")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="inference"
+                    )
+            return self._executor
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    async def run(self, fn: Callable, *args, deadline_ms: Optional[float] = None) -> Any:
+        if self.mode == "inline":
+            res = fn(*args)
+            self.completed += 1
+            return res
+        if self.inflight >= self.capacity:
+            self.rejected += 1
+            raise PoolSaturated(f"inference queue is full ({self.inflight}/{self.capacity})")
+
+        timeout = (deadline_ms / 1000.0) if deadline_ms else self.deadline
+        cfut = self._get_executor().submit(fn, *args)
+        with self._lock:
+            self.inflight += 1
+        # слот освобождается, когда задача реально закончилась (а не когда клиент перестал ждать)
+        cfut.add_done_callback(self._release)
+        try:
+            res = await asyncio.wait_for(asyncio.wrap_future(cfut), timeout)
+            self.completed += 1
+            return res
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            cfut.cancel()  # снимет задачу, если она ещё не стартовала
+            raise DeadlineExceeded(f"inference deadline of {timeout * 1000:.0f} ms exceeded")
+
+    def _release(self, _fut):
+        with self._lock:
+            self.inflight -= 1
+
+    def recycle(self):
+        """Новые задачи — в свежий executor (для process: заново fork от текущего состояния,
+        например после подмены моделей); задачи старого executor'а дорабатывают."""
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=False)
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            ex, self._executor = self._executor, None
+        # ждём вне лока: done-callback'и задач сами берут self._lock
+        if ex is not None:
+            ex.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "deadline_ms": (self.deadline * 1000.0) if self.deadline else None,
+            "inflight": self.inflight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
@@ -1,5 +1,150 @@
 # -*- coding: utf-8 -*-
-import logging, structlog, sys, os
+import atexit, logging, os, queue, random, structlog, sys, threading, weakref
+from typing import Any, Dict, List, Optional, TextIO
+
+class QueueSink:
+    """
+    Неблокирующий приёмник логов: вызывающий поток только кладёт event_dict в очередь,
+    рендер (JSON) и запись в stdout — в фоновом потоке пачками.
+    - очередь ограничена: при переполнении запись отбрасывается и считается в dropped,
+      запрос никогда не ждёт медленный пайп
+    - после fork (src.serve) очередь и поток пересоздаются в дочернем процессе
+      (один at-fork хук на модуль — см. _after_fork_in_child)
+    """
+    def __init__(self, renderer, stream: Optional[TextIO] = None, maxsize: int = 10000, batch: int = 256):
+        self.renderer = renderer
+        self.stream = stream or sys.stdout
+        self.maxsize = max(1, int(maxsize))
+        self.batch = max(1, int(batch))
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._closed = False
+        self._start()
+        _live_sinks.add(self)
+
+    def _start(self):
+        if self._closed:
+            return
+        self._lock = threading.Lock()  # dropped пишут все потоки, которые логируют
+        self._q: "queue.Queue[Optional[dict]]" = queue.Queue(self.maxsize)
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def put(self, event_dict: dict):
+        try:
+            self._q.put_nowait(event_dict)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        q = self._q
+        while True:
+            items: List[Optional[dict]] = [q.get()]
+            while len(items) < self.batch:
+                try:
+                    items.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for ev in items:
+                if ev is None:
+                    continue
+                try:
+                    lines.append(self.renderer(None, ev.get("level", "info"), ev))
+                except Exception:
+                    self.errors += 1
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                    self.written += len(lines)
+                except Exception:
+                    self.errors += len(lines)
+            if items[-1] is None:  # close(): всё, что было до маркера, уже записано
+                return
+
+    def close(self, timeout: float = 2.0):
+        """Дописывает очередь (не дольше timeout) и останавливает поток."""
+        self._closed = True
+        if not self._thread.is_alive():
+            return
+        try:
+            self._q.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": "async", "queued": self._q.qsize(), "max_queue": self.maxsize,
+                "written": self.written, "dropped": self.dropped, "errors": self.errors}
+
+class QueueLogger:
+    """structlog-логгер: получает уже обработанный event_dict и отдаёт его в QueueSink."""
+    def __init__(self, sink: QueueSink):
+        self._sink = sink
+
+    def msg(self, event_dict: dict):
+        self._sink.put(event_dict)
+
+    log = debug = info = warn = warning = error = err = critical = fatal = exception = msg
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """"analyze=0.1,analyze_batch=0.5" → {event: доля сохраняемых записей}."""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, sep, rate = part.strip().partition("=")
+        if sep and name:
+            out[name] = min(1.0, max(0.0, float(rate)))
+    return out
+
+class EventSampler:
+    """Процессор structlog: оставляет долю rate записей события (только ниже warning)."""
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = rates
+        self.sampled_out = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        rate = self.rates.get(event_dict.get("event"))
+        if rate is None or rate >= 1.0 or method_name in ("warning", "error", "critical", "exception"):
+            return event_dict
+        if random.random() >= rate:
+            with self._lock:
+                self.sampled_out += 1
+            raise structlog.DropEvent
+        event_dict["sample_rate"] = rate  # для пересчёта при агрегации
+        return event_dict
+
+_sink: Optional[QueueSink] = None
+_sampler: Optional[EventSampler] = None
+_live_sinks: "weakref.WeakSet[QueueSink]" = weakref.WeakSet()
+
+def _after_fork_in_child():
+    # в дочернем процессе нет фонового потока родителя, а локи могли остаться захваченными
+    for sink in list(_live_sinks):
+        sink._start()
+    if _sampler is not None:
+        _sampler._lock = threading.Lock()
+
+def _close_sink():
+    if _sink is not None:
+        _sink.close()
+
+# хуки регистрируются один раз при импорте, а не на каждый setup_logging()/QueueSink
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_close_sink)
+
+def get_sink() -> Optional[QueueSink]:
+    """Активный QueueSink (LOG_ASYNC=1) или None."""
+    return _sink
+
+def log_stats() -> Dict[str, Any]:
+    out = _sink.stats() if _sink is not None else {"mode": "sync"}
+    out["sampled_out"] = _sampler.sampled_out if _sampler is not None else 0
+    return out
 
 def setup_logging():
     """
@@ -7,7 +152,11 @@ def setup_logging():
     - JSON Renderer + iso timestamp
     - совместим с uvicorn/fastapi
     - можно переключить формат через LOG_FORMAT=plain (для локалки)
+    - LOG_ASYNC=1: structlog-записи через очередь и фоновый поток (QueueSink),
+      размеры — LOG_QUEUE_SIZE, LOG_BATCH
+    - LOG_SAMPLE="analyze=0.1,...": сэмплирование частых событий (в обоих режимах)
     """
+    global _sink, _sampler
     level = os.getenv("LOG_LEVEL", "INFO").upper()
     fmt = os.getenv("LOG_FORMAT", "json").lower()  # json | plain
 
@@ -24,18 +173,35 @@ def setup_logging():
             logging.getLogger(name).propagate = False
 
     timestamper = structlog.processors.TimeStamper(fmt="iso")
+    rates = parse_sample_rates(os.getenv("LOG_SAMPLE", ""))
+    _sampler = EventSampler(rates) if rates else None
     processors = [
+        *([_sampler] if _sampler else []),  # первым: отброшенное событие не рендерим вовсе
         structlog.contextvars.merge_contextvars,
         timestamper,
         structlog.processors.add_log_level,
     ]
     if fmt == "json":
-        processors.append(structlog.processors.JSONRenderer())
+        renderer = structlog.processors.JSONRenderer()
+    else:
+        renderer = structlog.processors.KeyValueRenderer(key_order=["event","level","timestamp"])
+
+    if _sink is not None:
+        _sink.close()
+        _sink = None
+    if os.getenv("LOG_ASYNC", "0") == "1":
+        sink = _sink = QueueSink(renderer, stream=sys.stdout,
+                                 maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+                                 batch=int(os.getenv("LOG_BATCH", "256")))
+        # рендер — в фоновом потоке: логгер получает event_dict как есть
+        processors.append(lambda _logger, _name, ev: ((ev,), {}))
+        logger_factory = lambda *args: QueueLogger(sink)
     else:
-        processors.append(structlog.processors.KeyValueRenderer(key_order=["event","level","timestamp"]))
+        processors.append(renderer)
+        logger_factory = structlog.PrintLoggerFactory(file=sys.stdout)
 
     structlog.configure(
         processors=processors,
         wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, level, logging.INFO)),
-        logger_factory=structlog.PrintLoggerFactory(file=sys.stdout),
+        logger_factory=logger_factory,
     )
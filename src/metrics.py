@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Минимальные метрики в формате Prometheus (text exposition 0.0.4), без внешних зависимостей.
+
+- Counter / Gauge / Histogram с метками; .labels(...) кешируется — на горячем пути
+  observe() = bisect по границам бакетов + пара сложений под локом
+- collector-колбэки: значения, которые дешевле снять в момент scrape (кэш, пул, версия)
+- MetricsMiddleware — чистый ASGI: латентность и in-flight по шаблону маршрута
+
+Метрики живут в процессе: при нескольких воркерах каждый отдаёт свои (метка pid не
+добавляется, сводить — на стороне Prometheus через instance/pod).
+"""
+import bisect, threading, time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# секунды: от 0.1 мс (отдельные стадии) до 10 с (большие батчи)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+def _fmt_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+def _fmt_value(v: float) -> str:
+    if v != v:
+        return "NaN"
+    if v in (float("inf"), float("-inf")):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self):
+        if not self.labelnames:
+            return [((), self)]
+        return list(self._children.items())
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        for key, child in self._items():
+            out.extend(child._samples(dict(zip(self.labelnames, key))))
+        return out
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, v: float):
+        self.value = float(v)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._v = _Value()
+
+    def _new_child(self):
+        return Counter(self.name, self.help)
+
+    def inc(self, amount: float = 1.0):
+        self._v.inc(amount)
+
+    @property
+    def value(self) -> float:
+        return self._v.value
+
+    def _samples(self, labels):
+        return [(self.name + "_total", labels, self._v.value)]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def _new_child(self):
+        return Gauge(self.name, self.help)
+
+    def dec(self, amount: float = 1.0):
+        self._v.inc(-amount)
+
+    def set(self, v: float):
+        self._v.set(v)
+
+    def _samples(self, labels):
+        return [(self.name, labels, self._v.value)]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # последний — +Inf
+        self._sum = 0.0
+
+    def _new_child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, v: float):
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += v
+
+    def time(self):
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def _samples(self, labels):
+        out, acc = [], 0
+        for b, c in zip(self.buckets + (float("inf"),), self._counts):
+            acc += c
+            out.append((self.name + "_bucket", {**labels, "le": _fmt_value(b)}, acc))
+        out.append((self.name + "_sum", labels, self._sum))
+        out.append((self.name + "_count", labels, acc))
+        return out
+
+class _Timer:
+    __slots__ = ("h", "t0")
+
+    def __init__(self, h: Histogram):
+        self.h = h
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.h.observe(time.perf_counter() - self.t0)
+
+# collector: () → [(name, type, help, [(sample_name, labels, value), ...]), ...]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def register(self, m: _Metric) -> _Metric:
+        # повторная регистрация того же имени/типа возвращает уже существующую метрику
+        # (Starlette может пересобрать стек middleware)
+        old = self._metrics.get(m.name)
+        if old is not None:
+            if old.kind != m.kind or old.labelnames != m.labelnames:
+                raise ValueError(f"metric already registered with a different type/labels: {m.name}")
+            return old
+        self._metrics[m.name] = m
+        return m
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn: Collector):
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        families = [(m.name, m.kind, m.help, m.samples()) for m in self._metrics.values()]
+        for fn in self._collectors:
+            try:
+                families.extend(fn())
+            except Exception:
+                continue  # сломанный коллектор не должен ронять весь scrape
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sname, labels, value in samples:
+                lines.append(f"{sname}{_fmt_labels(labels)} {_fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsMiddleware:
+    """ASGI-обёртка: http_requests / латентность / in-flight по шаблону маршрута."""
+    def __init__(self, app, registry: Registry, prefix: str = "haka", skip: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip = set(skip)
+        self.latency = registry.histogram(f"{prefix}_http_request_duration_seconds",
+                                          "HTTP request latency", ("method", "route", "status"))
+        self.inflight = registry.gauge(f"{prefix}_http_requests_in_flight", "HTTP requests being served")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip:
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+
+        async def _send(msg):
+            if msg["type"] == "http.response.start":
+                status["code"] = msg["status"]
+            await send(msg)
+
+        self.inflight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            self.inflight.dec()
+            route = scope.get("route")
+            # шаблон маршрута, а не сырой путь — иначе кардинальность меток не ограничена
+            path = getattr(route, "path", None) or "unmatched"
+            self.latency.labels(scope.get("method", ""), path, str(status["code"])).observe(
+                time.perf_counter() - t0)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Версионированные модели и горячая перезагрузка без даунтайма.
+
+Раскладка каталога MODELS_DIR (по умолчанию models/):
+
+    models/versions/<version>/   — priority.joblib + aspect_lr.joblib или mmap-артефакты (manifest.json)
+    models/CURRENT               — имя активной версии (одна строка)
+
+Без CURRENT работает старая раскладка: models/artifacts/ (если есть manifest) или
+models/priority.joblib + models/aspect_lr.joblib.
+
+ModelSet — всё для инференса одной версии (векторизаторы, compiled-модели, explain),
+после сборки не меняется. ModelRegistry.reload() собирает и прогревает новый набор
+в фоне, затем подменяет ссылку current одним присваиванием: запросы, уже взявшие
+старый набор, дорабатывают на нём.
+
+    python -m src.model_registry publish --version 2026-10-16      # models/*.joblib → versions/, CURRENT
+    python -m src.model_registry activate 2026-10-15               # откат
+    python -m src.model_registry list
+"""
+import argparse, hashlib, os, shutil, threading, time
+from typing import Any, Dict, List, Optional, Tuple
+import joblib
+
+from .artifacts import is_artifact_dir, load_artifacts, read_manifest
+from .compiled_model import CompiledCalibratedLinear
+from .explain_utils import ExplainEngine
+from .featurize import SharedFeaturizer, hstack_features
+
+PRIORITY_FILE = "priority.joblib"
+ASPECT_FILE = "aspect_lr.joblib"
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+# короткие ru/kk тексты для прогрева: первый вызов каждой ветки (char/word n-граммы,
+# matmul, explain) и подкачка mmap-страниц случаются до подмены, а не на живом запросе
+WARMUP_TEXTS = [
+    "маршрут 12 опоздал на 40 минут, остановка Сайран",
+    "водитель грубил пассажирам, автобус переполнен",
+    "валидатор не работает, onay не проходит",
+    "автобуста өрт шықты, жүргізуші дөрекі",
+]
+
+def _fingerprint(paths: List[str]) -> str:
+    # размер + mtime файлов бандлов
+    h = hashlib.md5()
+    for p in paths:
+        try:
+            st = os.stat(p)
+            h.update(f"{os.path.basename(p)}:{st.st_size}:{int(st.st_mtime)}".encode())
+        except OSError:
+            pass
+    return h.hexdigest()[:12]
+
+class ModelSet:
+    def __init__(self, priority: Dict[str, Any], aspect: Optional[Dict[str, Any]],
+                 version: str, source: str, compiled: bool = True):
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        self.vect_word = priority.get("vect_word") or priority.get("vect")
+        self.base_word = priority.get("base_word")
+        self.vect_char = priority.get("vect_char")
+        self.clf = priority["clf"]
+        self.classes = list(priority["classes"])
+        self.format = priority.get("format", "vocab")
+        # compiled-инференс (из артефактов clf уже compiled; PRIORITY_COMPILED=0 — sklearn)
+        self.compiled = (
+            self.clf if isinstance(self.clf, CompiledCalibratedLinear)
+            else CompiledCalibratedLinear.from_sklearn(self.clf) if compiled else None
+        )
+        self.explainer = ExplainEngine(self.vect_word, self.base_word)
+        self.aspect_vect = aspect["vect"] if aspect else None
+        self.aspect_clf = aspect["clf"] if aspect else None
+        self.aspect_labels = list(aspect["classes"]) if aspect else []
+        # общий featurizer: priority-char и aspect с одинаковым анализатором делят n-граммы
+        self.featurizer = SharedFeaturizer({"word": self.vect_word, "char": self.vect_char,
+                                            "aspect": self.aspect_vect})
+
+    def featurize_batch(self, texts: List[str]):
+        # Xw — word-часть (нужна explain), X — вход priority, Xa — вход aspect
+        F = self.featurizer.transform(texts)
+        Xw = F.get("word")
+        return Xw, hstack_features([Xw, F.get("char")]), F.get("aspect")
+
+    def predict_with_probs_batch(self, texts: List[str], X=None) -> List[Tuple[str, Dict[str, float]]]:
+        if X is None:
+            X = self.featurize_batch(texts)[1]
+        if self.compiled is not None:
+            preds, P = self.compiled.predict_with_proba(X)
+        else:
+            preds = self.clf.predict(X)
+            proba = getattr(self.clf, "predict_proba", None)
+            P = proba(X) if proba else None
+        return [
+            (str(pr), dict(zip(self.classes, P[i].tolist())) if P is not None else {})
+            for i, pr in enumerate(preds)
+        ]
+
+    def predict_aspect_batch(self, texts: List[str], X=None) -> List[Optional[str]]:
+        if self.aspect_vect is None or self.aspect_clf is None:
+            return [None] * len(texts)
+        if X is None:
+            X = self.featurize_batch(texts)[2]
+        return [str(a) for a in self.aspect_clf.predict(X)]
+
+    def warmup(self, texts: Optional[List[str]] = None) -> float:
+        texts = texts or WARMUP_TEXTS
+        t0 = time.perf_counter()
+        Xw, X, Xa = self.featurize_batch(texts)
+        preds = self.predict_with_probs_batch(texts, X=X)
+        self.predict_aspect_batch(texts, X=Xa)
+        self.explainer.explain_batch(Xw, [p for p, _ in preds], k=8, texts=texts)
+        return time.perf_counter() - t0
+
+    def describe(self) -> Dict[str, Any]:
+        return {"version": self.version, "source": self.source, "format": self.format,
+                "loaded_at": self.loaded_at, "aspect": self.aspect_clf is not None,
+                "compiled": self.compiled is not None}
+
+def load_model_set(path: str, version: Optional[str] = None, compiled: bool = True) -> ModelSet:
+    """Каталог с mmap-артефактами или с joblib-бандлами → ModelSet."""
+    if is_artifact_dir(path):
+        art = load_artifacts(path)
+        return ModelSet(art["priority"], art["aspect"], version or art["version"], path, compiled)
+    p_path, a_path = os.path.join(path, PRIORITY_FILE), os.path.join(path, ASPECT_FILE)
+    priority = joblib.load(p_path)
+    try:
+        aspect = joblib.load(a_path)
+    except Exception:
+        aspect = None
+    version = str(version or priority.get("version") or _fingerprint([p_path, a_path]))
+    return ModelSet(priority, aspect, version, path, compiled)
+
+class ModelRegistry:
+    def __init__(self, root: str = "models", artifacts: Optional[str] = None, compiled: bool = True):
+        self.root = root
+        self.artifacts = artifacts
+        self.compiled = compiled
+        self._lock = threading.Lock()  # одна перезагрузка за раз
+        self.current: Optional[ModelSet] = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_reload_ms: Optional[float] = None
+        self.watched: Optional[str] = None  # fingerprint загруженного (для file-watch)
+
+    # ---------- раскладка ----------
+    def versions_dir(self) -> str:
+        return os.path.join(self.root, VERSIONS_DIR)
+
+    def active_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def list_versions(self) -> List[str]:
+        return list_versions(self.root)
+
+    def resolve(self, version: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """(каталог, имя версии) для загрузки: явная версия → CURRENT → старая раскладка."""
+        version = version or self.active_version()
+        if version:
+            return _version_dir(self.root, version), version
+        if self.artifacts and is_artifact_dir(self.artifacts):
+            return self.artifacts, None
+        return self.root, None
+
+    def fingerprint(self) -> str:
+        """Меняется, когда меняется то, что надо загрузить (CURRENT или файлы бандла)."""
+        path, version = self.resolve()
+        files = [os.path.join(path, "manifest.json")] if is_artifact_dir(path) else [
+            os.path.join(path, PRIORITY_FILE), os.path.join(path, ASPECT_FILE)]
+        return f"{version or ''}:{_fingerprint(files)}"
+
+    # ---------- загрузка/подмена ----------
+    def load(self, version: Optional[str] = None) -> ModelSet:
+        path, name = self.resolve(version)
+        ms = load_model_set(path, version=name, compiled=self.compiled)
+        ms.warmup()
+        return ms
+
+    def reload(self, version: Optional[str] = None, persist: bool = False) -> ModelSet:
+        """Загрузить и прогреть новый набор, затем атомарно сделать его текущим.
+        persist — после успешной загрузки записать version в CURRENT (другие воркеры
+        подхватят через watch). При ошибке текущий набор и CURRENT остаются, исключение
+        пробрасывается."""
+        with self._lock:
+            t0 = time.perf_counter()
+            try:
+                ms = self.load(version)
+                if persist and version:
+                    activate(self.root, version)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            self.current = ms  # одно присваивание: запросы в полёте держат ссылку на старый набор
+            self.reloads += 1
+            self.last_error = None
+            self.last_reload_ms = (time.perf_counter() - t0) * 1000.0
+            self.watched = self._safe_fingerprint()
+            return ms
+
+    def _safe_fingerprint(self) -> Optional[str]:
+        try:
+            return self.fingerprint()
+        except Exception:
+            return None
+
+    def changed(self) -> bool:
+        """Для file-watch: отличается ли то, что лежит на диске, от загруженного."""
+        fp = self._safe_fingerprint()
+        return fp is not None and fp != self.watched
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "current": self.current.describe() if self.current else None,
+            "active_version": self.active_version(),
+            "versions": self.list_versions(),
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_reload_ms": self.last_reload_ms,
+        }
+
+# -----------------------------------------------------------------------------
+# публикация версий (CLI)
+# -----------------------------------------------------------------------------
+def list_versions(root: str) -> List[str]:
+    vdir = os.path.join(root, VERSIONS_DIR)
+    try:
+        return sorted(d for d in os.listdir(vdir)
+                      if not d.endswith(".tmp") and os.path.isdir(os.path.join(vdir, d)))
+    except OSError:
+        return []
+
+def _version_dir(root: str, version: str) -> str:
+    # только имена из versions/: «../x» и прочие пути сюда не пройдут
+    if version not in list_versions(root):
+        raise FileNotFoundError(f"model version not found: {version}")
+    return os.path.join(root, VERSIONS_DIR, version)
+
+def activate(root: str, version: str):
+    _version_dir(root, version)
+    tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))  # атомарно: watcher не увидит пустой файл
+
+def publish(root: str, version: str, src: Optional[str] = None, make_active: bool = True) -> str:
+    """Скопировать бандлы (или каталог артефактов) в versions/<version>/."""
+    src = src or root
+    dst = os.path.join(root, VERSIONS_DIR, version)
+    if os.path.exists(dst):
+        raise FileExistsError(f"version already exists: {dst}")
+    tmp = dst + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    if is_artifact_dir(src):
+        shutil.copytree(src, tmp)
+    else:
+        os.makedirs(tmp)
+        for name in (PRIORITY_FILE, ASPECT_FILE):
+            if os.path.exists(os.path.join(src, name)):
+                shutil.copy2(os.path.join(src, name), os.path.join(tmp, name))
+    os.replace(tmp, dst)  # каталог версии появляется целиком
+    if make_active:
+        activate(root, version)
+    return dst
+
+def main():
+    ap = argparse.ArgumentParser(description="версии моделей: publish / activate / list")
+    ap.add_argument("--root", default=os.getenv("MODELS_DIR", "models"))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("publish", help="скопировать текущие бандлы в versions/<version>")
+    p.add_argument("--version", default=time.strftime("%Y%m%d-%H%M%S"))
+    p.add_argument("--src", default=None, help="откуда брать (по умолчанию --root; можно каталог артефактов)")
+    p.add_argument("--no-activate", action="store_true")
+    a = sub.add_parser("activate", help="сделать версию активной (записать CURRENT)")
+    a.add_argument("version")
+    sub.add_parser("list")
+    args = ap.parse_args()
+
+    try:
+        _run(args)
+    except (FileNotFoundError, FileExistsError) as e:
+        raise SystemExit(str(e))
+
+def _run(args):
+    if args.cmd == "publish":
+        dst = publish(args.root, args.version, args.src, make_active=not args.no_activate)
+        print(f"[publish] {dst}" + ("" if args.no_activate else " (active)"))
+    elif args.cmd == "activate":
+        activate(args.root, args.version)
+        print(f"[activate] {args.version}")
+    else:
+        reg = ModelRegistry(args.root)
+        cur = reg.active_version()
+        for v in reg.list_versions():
+            extra = ""
+            path = os.path.join(reg.versions_dir(), v)
+            if is_artifact_dir(path):
+                extra = f" artifacts:{read_manifest(path)['version']}"
+            print(("* " if v == cur else "  ") + v + extra)
+
+if __name__ == "__main__":
+    main()
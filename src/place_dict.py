@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
-import os, glob, re, logging
-from typing import Dict, List, Tuple, Optional
+import os, glob, re, logging, threading, time
+from types import MappingProxyType
+from typing import Callable, Dict, List, Tuple, Optional
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +29,23 @@ def _to_alias_list(val) -> List[str]:
     logger.warning("place_dict: unexpected aliases type=%s value=%r -> []", type(val).__name__, val)
     return []
 
-# ---------- загрузка YAML/JSON/CSV ----------
+def _norm_route(r) -> str:
+    """«19», « 019 », «19А» → ключ маршрута ("19", "19", "19a")."""
+    s = _norm_text(str(r or "")).replace(" ", "")
+    return s.lstrip("0") or s
+
+# ---------- загрузка YAML/JSON/CSV/GTFS ----------
+def _yaml_patterns() -> List[str]:
+    patterns = os.getenv("STOPS_GLOB")
+    if patterns:
+        return [p.strip() for p in patterns.split(",") if p.strip()]
+    return [
+        "data/*.yaml",
+        "data/stops/*.yaml",
+        "stops/*.yaml",
+        "*.yaml",
+    ]
+
 def _load_yaml_files() -> Dict[str, List[dict]]:
     """
     Ищем YAML вида:
@@ -35,16 +54,7 @@ def _load_yaml_files() -> Dict[str, List[dict]]:
     При желании можно указать шаблоны через env STOPS_GLOB (через запятую).
     """
     import yaml
-    patterns = os.getenv("STOPS_GLOB")
-    if patterns:
-        patterns = [p.strip() for p in patterns.split(",") if p.strip()]
-    else:
-        patterns = [
-            "data/*.yaml",
-            "data/stops/*.yaml",
-            "stops/*.yaml",
-            "*.yaml",
-        ]
+    patterns = _yaml_patterns()
 
     result: Dict[str, List[dict]] = {}
     seen = set()
@@ -91,6 +101,8 @@ def _load_yaml_files() -> Dict[str, List[dict]]:
                     except Exception:
                         lat = lon = None
                     norm_stops.append({"name": base, "aliases": aliases, "lat": lat, "lon": lon})
+                    if it.get("routes"):
+                        norm_stops[-1]["routes"] = _to_alias_list(it.get("routes"))
                 # иные типы пропускаем
 
             if norm_stops:
@@ -128,8 +140,120 @@ def _read_csv_stops(path: str) -> List[dict]:
         pass
     return out
 
+# ---------- GTFS ----------
+def _gtfs_rows(path: str, name: str):
+    p = os.path.join(path, name)
+    if not os.path.exists(p):
+        return
+    import csv
+    with open(p, "r", encoding="utf-8-sig", newline="") as f:  # в фидах часто BOM
+        yield from csv.DictReader(f)
+
+def _read_gtfs(path: str) -> List[dict]:
+    """
+    Локальный GTFS-фид (stops.txt, routes.txt, trips.txt, stop_times.txt) → записи остановок
+    {name, aliases, lat, lon, routes}. routes — короткие номера маршрутов (route_short_name),
+    которые останавливаются на остановке. Платформы/направления с одним stop_name сливаются
+    в одну запись (координаты — первой), входы/узлы (location_type 2..4) пропускаются.
+    """
+    route_name: Dict[str, str] = {}
+    for r in _gtfs_rows(path, "routes.txt"):
+        route_name[r.get("route_id", "")] = (r.get("route_short_name") or r.get("route_long_name") or "").strip()
+    trip_route: Dict[str, str] = {}
+    for r in _gtfs_rows(path, "trips.txt"):
+        rn = route_name.get(r.get("route_id", ""))
+        if rn:
+            trip_route[r.get("trip_id", "")] = rn
+    stop_routes: Dict[str, set] = {}
+    for r in _gtfs_rows(path, "stop_times.txt"):
+        rn = trip_route.get(r.get("trip_id", ""))
+        if rn:
+            stop_routes.setdefault(r.get("stop_id", ""), set()).add(rn)
+
+    by_name: Dict[str, dict] = {}
+    parent: Dict[str, str] = {}
+    for r in _gtfs_rows(path, "stops.txt"):
+        if (r.get("location_type") or "0").strip() not in ("", "0", "1"):
+            continue
+        name = (r.get("stop_name") or "").strip()
+        if not name:
+            continue
+        sid = r.get("stop_id", "")
+        if r.get("parent_station"):
+            parent[sid] = r["parent_station"]
+        rec = by_name.get(name)
+        if rec is None:
+            try:
+                lat, lon = float(r.get("stop_lat")), float(r.get("stop_lon"))
+            except Exception:
+                lat = lon = None
+            rec = by_name[name] = {"name": name, "aliases": [], "lat": lat, "lon": lon, "routes": set(), "_ids": []}
+        rec["_ids"].append(sid)
+    id_rec = {sid: rec for rec in by_name.values() for sid in rec["_ids"]}
+    for sid, routes in stop_routes.items():
+        rec = id_rec.get(sid) or id_rec.get(parent.get(sid, ""))
+        if rec is not None:
+            rec["routes"] |= routes
+    # маршруты платформ — и станции-родителю (если у неё другое имя)
+    for sid, pid in parent.items():
+        if pid in id_rec and sid in id_rec:
+            id_rec[pid]["routes"] |= id_rec[sid]["routes"]
+    out = []
+    for rec in by_name.values():
+        rec.pop("_ids")
+        rec["routes"] = sorted(rec["routes"])
+        out.append(rec)
+    return out
+
+GTFS_FILES = ("stops.txt", "routes.txt", "trips.txt", "stop_times.txt")
+
+def _gtfs_dirs() -> List[str]:
+    dirs = os.getenv("GTFS_DIRS")
+    if dirs:
+        return [p.strip() for p in dirs.split(",") if p.strip()]
+    return ["data/gtfs"] + sorted(glob.glob("data/gtfs/*/"))
+
+def _load_gtfs_feeds() -> Dict[str, List[dict]]:
+    """
+    Каталоги GTFS: env GTFS_DIRS (через запятую) или data/gtfs, data/gtfs/*.
+    Город — имя каталога (data/gtfs/Almaty → Almaty), для одиночного фида — env GTFS_CITY.
+    """
+    out: Dict[str, List[dict]] = {}
+    for path in _gtfs_dirs():
+        if not os.path.exists(os.path.join(path, "stops.txt")):
+            continue
+        city = os.getenv("GTFS_CITY") or os.path.basename(os.path.normpath(path))
+        try:
+            stops = _read_gtfs(path)
+        except Exception as e:
+            logger.warning("place_dict: skip GTFS %s (%s)", path, e)
+            continue
+        out.setdefault(city, []).extend(stops)
+    return out
+
+def _merge_gtfs(base: Dict[str, List[dict]], feeds: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+    """Остановки GTFS дописываются в словарь города; совпавшим по имени добавляются routes
+    (и координаты, если своих нет)."""
+    for city, stops in feeds.items():
+        dst = base.setdefault(city, [])
+        known = {(r.get("name") or "").strip(): r for r in dst if isinstance(r, dict)}
+        for rec in stops:
+            old = known.get(rec["name"])
+            if old is None:
+                dst.append(rec)
+                known[rec["name"]] = rec
+                continue
+            old["routes"] = sorted(set(old.get("routes") or []) | set(rec["routes"]))
+            if old.get("lat") is None and old.get("lon") is None:
+                old["lat"], old["lon"] = rec["lat"], rec["lon"]
+    return base
+
 # ---------- публичная загрузка ----------
 def load_stop_dict() -> Dict[str, List[dict]]:
+    """YAML | JSON | fallback+CSV, плюс остановки и маршруты из локальных GTFS-фидов."""
+    return _merge_gtfs(_load_base_stop_dict(), _load_gtfs_feeds())
+
+def _load_base_stop_dict() -> Dict[str, List[dict]]:
     # 1) YAML (могут быть несколько файлов)
     out = _load_yaml_files()
     if out:
@@ -179,70 +303,578 @@ def _normalize_raw_places(raw: dict) -> Dict[str, List[dict]]:
                 except Exception:
                     lat = lon = None
                 res.append({"name": base, "aliases": aliases, "lat": lat, "lon": lon})
+                if it.get("routes"):
+                    res[-1]["routes"] = _to_alias_list(it.get("routes"))
         out[city] = res
     return out
 
-# Держим прогруженный словать в модуле (используется во многих местах)
-STOP_DICT: Dict[str, List[dict]] = load_stop_dict()
-
-# ---------- генерация вариантов ----------
-def _all_variants_for_city(stops: List[dict]) -> List[Tuple[str, str]]:
-    out: List[Tuple[str, str]] = []
-    for rec in stops:
-        base = (rec.get("name") or "").strip()
-        if base:
-            out.append((_norm_text(base), base))
-        for a in _to_alias_list(rec.get("aliases")):
-            out.append((_norm_text(a), base))
-    return out
+# ---------- индекс остановок ----------
+class _Variants:
+    """Нормализованные варианты (имена + алиасы) одного раздела индекса.
+    norms — кандидаты для rapidfuzz в исходном порядке, rec[i] — номер записи для norms[i],
+    rev — norm → номер записи (при дублях побеждает последний, как в прежнем rev_map)."""
+    __slots__ = ("norms", "rec", "rev")
 
-def _all_variants_global(stop_dict: Dict[str, List[dict]]) -> List[Tuple[str, str]]:
-    out: List[Tuple[str, str]] = []
-    for _, stops in (stop_dict or {}).items():
-        out.extend(_all_variants_for_city(stops))
-    return out
+    def __init__(self, norms: List[str], rec: List[int]):
+        self.norms = norms
+        self.rec = np.asarray(rec, dtype=np.int32)
+        self.rev: Dict[str, int] = dict(zip(norms, rec))
 
-# ---------- fuzzy-поиск ----------
-def fuzzy_stop_match(text: str, city_hint: Optional[str] = None, threshold: int = 70) -> Tuple[Optional[str], int]:
+    def __len__(self) -> int:
+        return len(self.norms)
+
+# окончания (ru/kk падежи: -да, -ға, -ынан, -ого ...) после последнего слова названия
+MAX_SUFFIX = int(os.getenv("STOP_MATCH_MAX_SUFFIX", "5"))
+_MIN_STEM = 3
+
+class StopMatcher:
     """
-    (best_base_name, score 0..100). Сначала прямое вхождение, затем RapidFuzz, затем difflib.
+    Поиск всех вхождений названий остановок за один проход по тексту.
+
+    Вместо посимвольного Aho-Corasick — trie по словам нормализованных вариантов:
+    совпадения привязаны к границам слов, так что на каждом начале слова достаточно
+    пройти вглубь (обычно обрыв на первом же dict-lookup). Итого O(символов текста),
+    независимо от размера словаря, и без автомата на сотни тысяч узлов в памяти.
+    Последнее слово варианта может стоять с окончанием (≤ MAX_SUFFIX символов):
+    «sairanda» → «sairan»; первое — быть приклеенным к предыдущему слову (опечатка
+    без пробела). Такие совпадения ранжируются ниже целых слов.
     """
-    q = _norm_text(text)
-    if not q:
-        return (None, 0)
+    __slots__ = ("root", "heads")
+    _END = ""  # ключ терминала: пустых слов в нормализованном тексте не бывает
+
+    def __init__(self, variants: "_Variants"):
+        self.root: Dict[str, dict] = {}
+        for vi, v in enumerate(variants.norms):
+            if not v:
+                continue
+            node = self.root
+            for tok in v.split(" "):
+                node = node.setdefault(tok, {})
+            node.setdefault(self._END, []).append(vi)  # номера вариантов в порядке словаря
+        # первые _MIN_STEM символов первых слов: быстрый отсев слов текста, с которых
+        # не начинается ни одно название (даже с окончанием) — а таких подавляющее большинство
+        self.heads = {t[:_MIN_STEM] for t in self.root if len(t) >= _MIN_STEM}
+
+    def find_all(self, q: str, regular: bool = True, glued: bool = True) -> List[Tuple[int, int, int, List[int]]]:
+        """[(start, end, tier, [variant ids])] для нормализованного q (слова через пробел).
+        tier: 2 — целые слова, 1 — последнее слово с окончанием, 0 — название приклеено
+        к предыдущему слову (пропущенный пробел: «ostanovkesaryarka»); поиск приклеенных
+        вдвое дороже, поэтому его можно запросить отдельно (regular/glued)."""
+        words = q.split(" ")
+        starts, pos = [], 0
+        for w in words:
+            starts.append(pos)
+            pos += len(w) + 1
+        out: List[Tuple[int, int, int, List[int]]] = []
+        root, heads = self.root, self.heads
+        if regular:
+            for i, w in enumerate(words):
+                if w in root or w[:_MIN_STEM] in heads:
+                    self._walk(words, starts, i, 0, out)
+        if glued:
+            for i, w in enumerate(words):
+                for k in range(1, len(w)):
+                    if w[k:] in root:
+                        self._walk(words, starts, i, k, out)
+        return out
 
-    stop_dict = STOP_DICT or {}
-    if city_hint and city_hint in stop_dict:
-        variants = _all_variants_for_city(stop_dict[city_hint])
-    else:
-        variants = _all_variants_global(stop_dict)
+    def _walk(self, words: List[str], starts: List[int], i: int, k: int, out: list):
+        END = self._END
+        node = self.root
+        # приклеенное название короче _MIN_STEM+1 символов — почти всегда ложное («...ar»)
+        min_len = _MIN_STEM + 1 if k else 1
+        for j in range(i, len(words)):
+            w = words[j][k:] if j == i else words[j]
+            pos = starts[j] + (k if j == i else 0)
+            # окончание: стем ищем среди детей текущего узла (не глубже последнего слова)
+            for cut in range(1, min(MAX_SUFFIX, len(w) - _MIN_STEM) + 1):
+                stem = node.get(w[:-cut])
+                if stem is not None and END in stem:
+                    if pos + len(w) - cut - starts[i] - k >= min_len:
+                        out.append((starts[i] + k, pos + len(w) - cut, 0 if k else 1, stem[END]))
+                    break
+            node = node.get(w)
+            if node is None:
+                return
+            if END in node and pos + len(w) - starts[i] - k >= min_len:
+                out.append((starts[i] + k, pos + len(w), 0 if k else 2, node[END]))
 
-    if not variants:
-        return (None, 0)
+# fuzzy: сколько кандидатов из триграммного индекса отдаём rapidfuzz (0 — полный перебор)
+FUZZY_SHORTLIST = int(os.getenv("STOP_FUZZY_SHORTLIST", "32"))
+
+def _trigrams(tok: str) -> List[str]:
+    s = f" {tok} "
+    return [s[i:i + 3] for i in range(len(s) - 2)]
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Склейка np.arange(s, e) для всех пар — позиции списков вхождений в CSR."""
+    lens = ends - starts
+    return np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens - starts, lens)
+
+class TrigramIndex:
+    """
+    Триграммный инвертированный индекс по словам названий остановок — для шорт-листа
+    кандидатов перед rapidfuzz.
+
+    Индексируются уникальные слова всех вариантов (их меньше, чем вариантов). Каждое
+    слово текста сравнивается со словами словаря по общим триграммам (коэффициент Дайса),
+    вариант получает средневзвешенный по длине слов лучший Дайс своих слов. Так «окна»
+    текста любой длины покрываются без перебора окон, а стоимость зависит от числа слов
+    текста и длины затронутых списков вхождений, а не от размера словаря.
+    """
+    def __init__(self, norms: List[str]):
+        from scipy.sparse import csr_matrix
+        tok_id: Dict[str, int] = {}
+        v_rows: List[int] = []
+        v_cols: List[int] = []
+        for vi, v in enumerate(norms):
+            for tok in set(v.split()) if v else ():
+                v_rows.append(vi)
+                v_cols.append(tok_id.setdefault(tok, len(tok_id)))
+        self.tokens = list(tok_id)
+        tri_id: Dict[str, int] = {}
+        t_rows: List[int] = []
+        t_cols: List[int] = []
+        tok_ntri = np.zeros(len(self.tokens), dtype=np.float32)
+        for ti, tok in enumerate(self.tokens):
+            tris = set(_trigrams(tok))
+            tok_ntri[ti] = len(tris)
+            for tg in tris:
+                t_rows.append(tri_id.setdefault(tg, len(tri_id)))
+                t_cols.append(ti)
+        self.tri_id = tri_id
+        self.tok_ntri = tok_ntri
+        self.tok_len = np.asarray([len(t) for t in self.tokens], dtype=np.float32)
+        n_tri, n_tok = max(1, len(tri_id)), max(1, len(self.tokens))
+        # триграмма → слова словаря (CSR по триграммам)
+        self.tri_tok = csr_matrix((np.ones(len(t_rows), dtype=np.float32), (t_rows, t_cols)), shape=(n_tri, n_tok))
+        # вариант → его слова, с весом «длина слова / длина всех слов варианта»
+        w = self.tok_len[v_cols] if v_cols else np.zeros(0, dtype=np.float32)
+        vt = csr_matrix((w, (v_rows, v_cols)), shape=(max(1, len(norms)), n_tok))
+        norm = np.asarray(vt.sum(axis=1)).ravel()
+        norm[norm == 0] = 1.0
+        # транспонированно: слово → варианты, где оно встречается (списки вхождений)
+        self.tok_var = csr_matrix(vt.multiply(1.0 / norm[:, None])).T.tocsr()
+
+    def scores(self, q: str, min_dice: float = 0.3) -> Tuple[np.ndarray, np.ndarray]:
+        """(номера вариантов, оценки 0..1) — только варианты, у которых есть похожее слово в q."""
+        ip, ix = self.tri_tok.indptr, self.tri_tok.indices
+        cand_t, cand_d = [], []
+        for w in set(q.split()):
+            if len(w) < 2:
+                continue
+            tris = set(_trigrams(w))
+            hit = np.fromiter((self.tri_id[t] for t in tris if t in self.tri_id), dtype=np.int64)
+            if not len(hit):
+                continue
+            # число общих триграмм слова текста со словами словаря — по спискам вхождений
+            toks, ov = np.unique(ix[_ranges(ip[hit], ip[hit + 1])], return_counts=True)
+            dice = 2.0 * ov / (len(tris) + self.tok_ntri[toks])
+            keep = dice >= min_dice
+            cand_t.append(toks[keep])
+            cand_d.append(dice[keep])
+        if not cand_t or not sum(map(len, cand_t)):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # лучший Дайс для каждого задетого слова словаря (по словам текста)
+        toks, dice = np.concatenate(cand_t), np.concatenate(cand_d)
+        order = np.lexsort((dice, toks))
+        toks, dice = toks[order], dice[order]
+        last = np.append(toks[1:] != toks[:-1], True)
+        toks, best = toks[last], dice[last]
+        # разворачиваем списки вхождений только задетых слов
+        ip, ix, dt = self.tok_var.indptr, self.tok_var.indices, self.tok_var.data
+        lens = ip[toks + 1] - ip[toks]
+        sel = _ranges(ip[toks], ip[toks + 1])
+        var, vinv = np.unique(ix[sel], return_inverse=True)
+        sc = np.bincount(vinv, weights=dt[sel] * np.repeat(best, lens), minlength=len(var))
+        return var, sc
+
+    def shortlist(self, q: str, k: int, groups: Optional[np.ndarray] = None, group: int = -1) -> np.ndarray:
+        """Номера k лучших вариантов (по возрастанию номера); groups/group — только варианты раздела."""
+        var, sc = self.scores(q)
+        if groups is not None:
+            m = groups[var] == group
+            var, sc = var[m], sc[m]
+        if len(var) > k:
+            top = np.argpartition(-sc, k - 1)[:k]
+            var = np.sort(var[top])
+        return var
+
+class StopIndex:
+    """
+    Словарь остановок, скомпилированный один раз: варианты нормализованы заранее
+    и разложены по городам (+ общий раздел), поиск записи по имени — O(1).
+    Записи хранятся колонками: names (list[str]), city_id / lat / lon (NumPy, NaN = нет координат).
+    """
+    def __init__(self, stop_dict: Dict[str, List[dict]]):
+        self.source = stop_dict
+        self.cities: List[str] = []
+        self.names: List[str] = []
+        city_ids: List[int] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        self._by_name: Dict[str, int] = {}
+        self._parts: Dict[str, _Variants] = {}
+        self._routes: Dict[str, List[int]] = {}  # маршрут → номера записей его остановок
+        self._route_parts: Dict[Tuple[str, Optional[int]], _Variants] = {}
+        g_norms: List[str] = []
+        g_rec: List[int] = []
+        norm_cache: Dict[str, str] = {}  # одинаковые алиасы нормализуем один раз
+
+        def norm(x: str) -> str:
+            v = norm_cache.get(x)
+            if v is None:
+                v = norm_cache[x] = _norm_text(x)
+            return v
+
+        for city, stops in (stop_dict or {}).items():
+            cid = len(self.cities)
+            self.cities.append(city)
+            norms: List[str] = []
+            rec: List[int] = []
+            for it in (stops or []):
+                if isinstance(it, str):
+                    it = {"name": it}
+                elif not isinstance(it, dict):
+                    continue
+                base = (it.get("name") or "").strip()
+                i = len(self.names)
+                self.names.append(base)
+                city_ids.append(cid)
+                lats.append(_as_float(it.get("lat")))
+                lons.append(_as_float(it.get("lon")))
+                if not base:
+                    continue
+                for r in _to_alias_list(it.get("routes")):
+                    self._routes.setdefault(_norm_route(r), []).append(i)
+                self._by_name.setdefault(base, i)
+                norms.append(norm(base)); rec.append(i)
+                for a in _to_alias_list(it.get("aliases")):
+                    norms.append(norm(a)); rec.append(i)
+            self._parts[city] = _Variants(norms, rec)
+            g_norms.extend(norms); g_rec.extend(rec)
+        self._global = _Variants(g_norms, g_rec)
+        self.matcher = StopMatcher(self._global)
+        self.trigrams = TrigramIndex(self._global.norms)
+        self.city_id = np.asarray(city_ids, dtype=np.int32)
+        self.lat = np.asarray(lats, dtype=np.float64)
+        self.lon = np.asarray(lons, dtype=np.float64)
+        self._var_city = self.city_id[self._global.rec] if len(self._global.rec) else np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def stats(self) -> Dict[str, int]:
+        return {"stops": len(self.names), "variants": len(self._global), "cities": len(self.cities),
+                "routes": len(self._routes), "trigram_tokens": len(self.trigrams.tokens)}
+
+    def variants(self, city_hint: Optional[str] = None) -> _Variants:
+        """Раздел города, если он есть в словаре, иначе — все города."""
+        if city_hint and city_hint in self._parts:
+            return self._parts[city_hint]
+        return self._global
+
+    def _city_filter(self, city_hint: Optional[str]) -> Optional[int]:
+        return self.cities.index(city_hint) if city_hint and city_hint in self._parts else None
+
+    def _shortlist(self, q: str, k: int, cid: Optional[int]) -> np.ndarray:
+        if cid is None:
+            return self.trigrams.shortlist(q, k)
+        return self.trigrams.shortlist(q, k, self._var_city, cid)
+
+    def _first_record(self, vids: List[int], cid: Optional[int], only: Optional[set] = None) -> Optional[int]:
+        for vi in vids:
+            i = int(self._global.rec[vi])
+            if (cid is None or self.city_id[i] == cid) and (only is None or i in only):
+                return i
+        return None
+
+    def _best(self, found, cid: Optional[int], only: Optional[set] = None) -> Optional[int]:
+        best, best_key = None, None
+        for start, end, tier, vids in found:
+            i = self._first_record(vids, cid, only)
+            if i is None:
+                continue
+            key = (tier, end - start, -vids[0])
+            if best_key is None or key > best_key:
+                best, best_key = i, key
+        return best
+
+    def find_stops(self, text: str, city_hint: Optional[str] = None) -> List[Dict[str, object]]:
+        """Все остановки, названные в тексте: [{name, city, lat, lon, start, end, tier}]
+        (позиции — в нормализованном тексте, tier — см. StopMatcher.find_all)."""
+        q = _norm_text(text)
+        cid = self._city_filter(city_hint)
+        regular = self.matcher.find_all(q, glued=False)
+        spans = [(s, e) for s, e, _, _ in regular]
+        # приклеенное внутри обычного совпадения («arka» в «saryarka») — не отдельная остановка
+        glued = [m for m in self.matcher.find_all(q, regular=False)
+                 if not any(s <= m[0] and m[1] <= e for s, e in spans)]
+        out = []
+        for start, end, tier, vids in sorted(regular + glued):
+            i = self._first_record(vids, cid)
+            if i is not None:
+                out.append({**self.record(i), "start": start, "end": end, "tier": tier})
+        return out
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Номер первой записи с таким базовым именем (O(1))."""
+        return self._by_name.get((name or "").strip())
 
-    # прямое вхождение
-    for v_norm, base in variants:
-        if v_norm and v_norm in q:
-            return (base, 100)
+    def record(self, i: int) -> Dict[str, Optional[object]]:
+        lat, lon = float(self.lat[i]), float(self.lon[i])
+        return {"name": self.names[i], "city": self.cities[int(self.city_id[i])],
+                "lat": None if lat != lat else lat, "lon": None if lon != lon else lon}
 
-    candidates = [v for v, _ in variants]
-    rev_map = {v: base for v, base in variants}
+    def candidates(self, q: str, city_hint: Optional[str] = None, k: int = FUZZY_SHORTLIST) -> np.ndarray:
+        """Шорт-лист номеров записей для fuzzy по нормализованному тексту (без дублей, по порядку)."""
+        cid = self._city_filter(city_hint)
+        vids = self._shortlist(q, k, cid)
+        return np.unique(self._global.rec[vids])
 
+    def route_stops(self, route, city_hint: Optional[str] = None) -> List[int]:
+        """Номера записей остановок маршрута (по routes из GTFS/YAML), с фильтром по городу."""
+        cid = self._city_filter(city_hint)
+        return [i for i in self._routes.get(_norm_route(route), ()) if cid is None or self.city_id[i] == cid]
+
+    def route_variants(self, route, city_hint: Optional[str] = None) -> Optional[_Variants]:
+        """Раздел из вариантов остановок маршрута (None — маршрута нет в словаре)."""
+        if route is None or not self._routes:
+            return None
+        key = (_norm_route(route), self._city_filter(city_hint))
+        part = self._route_parts.get(key)
+        if part is None and key[0] in self._routes:
+            recs = sorted(set(self.route_stops(route, city_hint)))
+            # варианты записи i лежат в общем разделе подряд: rec отсортирован по возрастанию
+            lo = np.searchsorted(self._global.rec, recs, side="left")
+            hi = np.searchsorted(self._global.rec, recs, side="right")
+            vids = [v for a, b in zip(lo, hi) for v in range(a, b)]
+            part = self._route_parts[key] = _Variants([self._global.norms[v] for v in vids],
+                                                      [int(self._global.rec[v]) for v in vids])
+        return part
+
+    def match(self, text: str, city_hint: Optional[str] = None, threshold: int = 70,
+              shortlist: Optional[int] = None, route: Optional[str] = None) -> Tuple[Optional[str], int]:
+        """То же, что fuzzy_stop_match, но по готовому индексу.
+        shortlist — размер шорт-листа для rapidfuzz (по умолчанию STOP_FUZZY_SHORTLIST, 0 — все варианты).
+        route — номер маршрута из текста: если он есть в словаре, остановки маршрута проверяются первыми."""
+        q = _norm_text(text)
+        if not q:
+            return (None, 0)
+        part = self.variants(city_hint)
+        if not len(part):
+            return (None, 0)
+        cid = self._city_filter(city_hint)
+        rpart = self.route_variants(route, city_hint)
+        only = set(rpart.rec.tolist()) if rpart is not None and len(rpart) else None
+
+        # прямое вхождение: целые слова > с окончанием > приклеенное, затем самое длинное,
+        # затем — первое по порядку словаря; в каждом ярусе остановки маршрута — вперёд
+        best = self._direct(self.matcher.find_all(q, glued=False), cid, only)
+        if best is None:  # приклеенные — только если обычных совпадений нет
+            best = self._direct(self.matcher.find_all(q, regular=False), cid, only)
+        if best is not None:
+            return (self.names[best], 100)
+
+        if only is not None:
+            # остановок на маршруте десятки — fuzzy по ним полным перебором
+            name, score = self._fuzzy(q, rpart, rpart.norms, threshold)
+            if name is not None:
+                return (name, score)
+
+        k = FUZZY_SHORTLIST if shortlist is None else shortlist
+        cands = part.norms
+        if k and len(part) > 4 * k:
+            # триграммный шорт-лист; порядок вариантов сохраняем — как и при полном переборе,
+            # из равных по score побеждает первый по словарю
+            cands = [self._global.norms[v] for v in self._shortlist(q, k, cid)]
+            if not cands:
+                return (None, 0)
+        return self._fuzzy(q, part, cands, threshold)
+
+    def _direct(self, found, cid: Optional[int], only: Optional[set]) -> Optional[int]:
+        best = self._best(found, cid, only) if only is not None else None
+        return best if best is not None else self._best(found, cid)
+
+    def _fuzzy(self, q: str, part: _Variants, cands: List[str], threshold: int) -> Tuple[Optional[str], int]:
+        try:
+            from rapidfuzz import process, fuzz
+            hit = process.extractOne(q, cands, scorer=fuzz.WRatio)
+            if hit:
+                cand, score, _ = hit
+                base = self.names[part.rev[cand]]
+                return (base if score >= threshold else None, int(score))
+        except Exception:
+            pass
+
+        import difflib
+        best = difflib.get_close_matches(q, cands, n=1, cutoff=max(0.0, min(1.0, threshold/100.0)))
+        if best:
+            cand = best[0]
+            base = self.names[part.rev[cand]]
+            score = int(100 * difflib.SequenceMatcher(None, q, cand).ratio())
+            return (base if score >= threshold else None, score)
+        return (None, 0)
+
+def _as_float(v) -> float:
     try:
-        from rapidfuzz import process, fuzz
-        hit = process.extractOne(q, candidates, scorer=fuzz.WRatio)
-        if hit:
-            cand, score, _ = hit
-            base = rev_map.get(cand)
-            return (base if score >= threshold else None, int(score))
+        return float(v) if v not in (None, "") else np.nan
     except Exception:
-        pass
+        return np.nan
+
+# ---------- скомпилированный кэш (src.stop_cache) ----------
+def cache_sources(name: str) -> Tuple[List[str], Dict[str, object]]:
+    """(исходные файлы, env) — ключ кэша name: "stops" (STOP_DICT + индекс) или "geocode"."""
+    code = [os.path.abspath(__file__)]  # поменялся код нормализации/индекса — кэш устарел
+    if name == "geocode":
+        return code + ["data/stops_kz.csv"], {}
+    paths = sorted({p for pat in _yaml_patterns() for p in glob.glob(pat)})
+    paths += ["data/stops.json", "data/stops_kz.csv"]
+    paths += [os.path.join(d, f) for d in _gtfs_dirs() for f in GTFS_FILES]
+    env = {k: os.getenv(k) for k in ("STOPS_GLOB", "GTFS_DIRS", "GTFS_CITY")}
+    return code + paths, env
+
+def _compile_stops() -> Tuple[Dict[str, List[dict]], "StopIndex"]:
+    d = load_stop_dict()
+    return d, StopIndex(d)
 
-    import difflib
-    best = difflib.get_close_matches(q, candidates, n=1, cutoff=max(0.0, min(1.0, threshold/100.0)))
-    if best:
-        cand = best[0]
-        base = rev_map.get(cand)
-        score = int(100 * difflib.SequenceMatcher(None, q, cand).ratio())
-        return (base if score >= threshold else None, score)
-    return (None, 0)
+def compiled(name: str, build):
+    """build() через кэш name (см. src.stop_cache): при неизменных исходниках — без разбора файлов."""
+    from .stop_cache import cached
+    sources, env = cache_sources(name)
+    return cached(name, sources, build, env)
+
+# Держим прогруженный словать в модуле (используется во многих местах);
+# индекс — из того же кэша, его source — этот же объект
+def sources_key() -> str:
+    """Отпечаток всех исходников словаря и geocode — для watch: поменялся → пора reload_stops()."""
+    from .stop_cache import cache_key, fingerprint
+    parts = [cache_sources(name) for name in ("stops", "geocode")]
+    return cache_key(fingerprint([p for paths, _ in parts for p in paths]),
+                     {k: v for _, env in parts for k, v in env.items()})
+
+# ---------- снимок: словарь и всё, что из него построено, — одной ссылкой ----------
+class StopSnapshot:
+    """
+    Неизменяемый набор: словарь, StopIndex и производные структуры других модулей
+    (derived: "all_stops" — extractors, "geocode" — индекс geocode). Публикуется одним
+    присваиванием _SNAPSHOT; запрос берёт stop_snapshot() один раз и работает только с ним,
+    так что посреди reload_stops() новый индекс со старым geocode не смешается.
+    """
+    __slots__ = ("stop_dict", "index", "derived", "key")
+
+    def __init__(self, stop_dict: Dict[str, List[dict]], index: "StopIndex",
+                 derived: Dict[str, object], key: Optional[str]):
+        self.stop_dict = stop_dict
+        self.index = index
+        self.derived = MappingProxyType(dict(derived))
+        self.key = key  # отпечаток исходников (sources_key) на момент сборки
+
+    def __getitem__(self, name: str):
+        return self.derived[name]
+
+# модули с производными структурами регистрируют build(stop_dict) -> объект (см. derive)
+_derived: Dict[str, Callable[[Dict[str, List[dict]]], object]] = {}
+_swap_lock = threading.Lock()
+
+def _publish(snap: StopSnapshot) -> StopSnapshot:
+    # вызывается под _swap_lock; STOP_DICT/_INDEX — зеркала для старого кода, читать — через снимок
+    global _SNAPSHOT, STOP_DICT, _INDEX
+    _SNAPSHOT = snap
+    STOP_DICT, _INDEX = snap.stop_dict, snap.index
+    return snap
+
+def _build(stop_dict: Dict[str, List[dict]], index: Optional["StopIndex"] = None,
+           key: Optional[str] = None, **overrides) -> StopSnapshot:
+    index = index if index is not None else StopIndex(stop_dict or {})
+    derived = {name: overrides[name] if name in overrides else build(stop_dict)
+               for name, build in _derived.items()}
+    return StopSnapshot(stop_dict, index, {**overrides, **derived}, key)
+
+_d, _i = compiled("stops", _compile_stops)
+STOP_DICT: Dict[str, List[dict]] = _d
+_INDEX: Optional[StopIndex] = _i
+_SNAPSHOT: StopSnapshot = StopSnapshot(_d, _i, {}, sources_key())
+del _d, _i
+
+def stop_snapshot() -> StopSnapshot:
+    """Текущий снимок. Если STOP_DICT заменили целиком (тесты, бенчмарки) — пересобирается."""
+    snap = _SNAPSHOT
+    if snap.stop_dict is not STOP_DICT:
+        # рассинхрон бывает и посреди _publish(): дожидаемся конца подмены, а не строим заново
+        with _swap_lock:
+            snap = _SNAPSHOT
+            if snap.stop_dict is not STOP_DICT:
+                snap = _publish(_build(STOP_DICT, key=snap.key))
+    return snap
+
+def get_stop_index() -> StopIndex:
+    """Индекс текущего снимка; несколько обращений за запрос — берите stop_snapshot() один раз."""
+    return stop_snapshot().index
+
+def derive(name: str):
+    """
+    Декоратор производной структуры снимка: build(stop_dict) строится сразу для текущего
+    снимка и при каждом reload_stops() — до публикации нового снимка.
+    """
+    def register(build: Callable[[Dict[str, List[dict]]], object]):
+        with _swap_lock:
+            _derived[name] = build
+            snap = _SNAPSHOT
+            _publish(StopSnapshot(snap.stop_dict, snap.index, {**snap.derived, name: build(snap.stop_dict)},
+                                  snap.key))
+        return build
+    return register
+
+def publish_stops(stop_dict: Dict[str, List[dict]], **overrides) -> StopSnapshot:
+    """Подменить словарь целиком (бенчмарки, тесты); overrides — готовые производные по имени."""
+    snap = _build(stop_dict, **overrides)
+    with _swap_lock:
+        return _publish(snap)
+
+# ---------- горячая перезагрузка ----------
+_reload_lock = threading.Lock()
+_reloads = {"count": 0, "failures": 0, "last_ms": None, "last_at": None, "last_error": None}
+
+def stops_changed() -> bool:
+    """Отличаются ли исходники на диске от загруженных (для file-watch)."""
+    return sources_key() != _SNAPSHOT.key
+
+def reload_stops() -> Dict[str, object]:
+    """
+    Перечитывает YAML/JSON/CSV/GTFS, строит новый словарь, индекс и производные структуры
+    (через кэш src.stop_cache) и публикует их одним снимком. Запросы всё это время работают
+    на старом снимке. При ошибке остаётся старое.
+    """
+    with _reload_lock:
+        t0 = time.perf_counter()
+        try:
+            key = sources_key()
+            d, idx = compiled("stops", _compile_stops)
+            snap = _build(d, idx, key)
+        except Exception as e:
+            _reloads["failures"] += 1
+            _reloads["last_error"] = str(e)
+            raise
+        with _swap_lock:
+            _publish(snap)
+        _reloads["count"] += 1
+        _reloads["last_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        _reloads["last_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        _reloads["last_error"] = None
+    logger.info("place_dict: stops reloaded in %.1f ms (%d stops)", _reloads["last_ms"], len(idx))
+    return stops_stats()
+
+def stops_stats() -> Dict[str, object]:
+    return {**get_stop_index().stats(), "reloads": _reloads["count"], "reload_failures": _reloads["failures"],
+            "last_reload_ms": _reloads["last_ms"], "last_reload_at": _reloads["last_at"],
+            "last_error": _reloads["last_error"]}
+
+# ---------- fuzzy-поиск ----------
+def fuzzy_stop_match(text: str, city_hint: Optional[str] = None, threshold: int = 70,
+                     route: Optional[str] = None) -> Tuple[Optional[str], int]:
+    """
+    (best_base_name, score 0..100). Сначала прямое вхождение, затем RapidFuzz, затем difflib.
+    route — номер маршрута (extract_route): сначала ищем среди остановок этого маршрута.
+    """
+    return get_stop_index().match(text, city_hint=city_hint, threshold=threshold, route=route)
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
-import os, re, hashlib, random, pathlib
+import os, re, random, pathlib
 import pandas as pd
-from unidecode import unidecode
+from .utils import text_hash
 
 DATA_DIR = pathlib.Path("data"); DATA_DIR.mkdir(exist_ok=True)
 OUT_PARQUET = DATA_DIR / "complaints.parquet"
@@ -19,12 +19,6 @@ def _clean_text(s: str) -> str:
     s = _RE_SPACES.sub(" ", s)
     return s.strip()
 
-def _norm_for_hash(s: str) -> str:
-    s = unidecode((s or "").lower())
-    s = re.sub(r"[^a-z0-9а-яёқңғүұіһәө\- ]+", " ", s)
-    s = _RE_SPACES.sub(" ", s).strip()
-    return s
-
 def load_any():
     # подхватываем первый подходящий файл
     cands = [
@@ -50,7 +44,7 @@ def main():
     df = df[df["text"].str.len() > 2].copy()
 
     # дедуп по нормализованному хэшу
-    df["norm_hash"] = df["text"].map(_norm_for_hash).map(lambda x: hashlib.md5(x.encode()).hexdigest())
+    df["norm_hash"] = df["text"].map(text_hash)
     df = df.drop_duplicates(subset=["norm_hash"]).drop(columns=["norm_hash"]).reset_index(drop=True)
 
     # баланс классов (если есть priority)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Профилирование одного вызова по запросу (X-Profile: 1 + X-Admin-Key, см. api.py).
+
+cProfile включается только на время вызова. До Python 3.12 он ставится через
+setprofile текущего потока — в профиль попадает ровно работа этого запроса. С 3.12
+cProfile построен на sys.monitoring, который действует на весь процесс: вызовы соседних
+запросов из других потоков за это время тоже попадут в профиль (поле "isolated" в
+сводке), а второй профилировщик одновременно включить нельзя — поэтому профилируемые
+вызовы идут по одному, под общим локом. Запросы без заголовка сюда не заходят вовсе,
+их стоимость не меняется.
+"""
+import cProfile, os, pstats, sys, threading, time
+from typing import Any, Callable, Dict, List, Tuple
+
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "25"))
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+ISOLATED = sys.version_info < (3, 12)  # профиль только своего потока
+_lock = threading.Lock()
+
+def _where(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":  # встроенные функции: ('~', 0, "<built-in method ...>")
+        return name
+    # путь обрезаем до пакета: src/place_dict.py, rapidfuzz/process.py, ...
+    parts = filename.replace("\\", "/").split("/")
+    return f"{'/'.join(parts[-2:])}:{line}({name})"
+
+def summarize(prof: cProfile.Profile, top: int = PROFILE_TOP, sort: str = "cumulative") -> Dict[str, Any]:
+    st = pstats.Stats(prof)
+    key = {"cumulative": 3, "tottime": 2, "ncalls": 1}[sort if sort in SORT_KEYS else "cumulative"]
+    rows: List[Dict[str, Any]] = []
+    # stats: func → (primitive calls, ncalls, tottime, cumtime, callers)
+    items = sorted(st.stats.items(), key=lambda kv: kv[1][key], reverse=True)
+    for func, (cc, nc, tt, ct, _callers) in items[:top]:
+        rows.append({
+            "func": _where(func),
+            "ncalls": nc if nc == cc else f"{nc}/{cc}",
+            "tottime_ms": round(tt * 1000.0, 3),
+            "cumtime_ms": round(ct * 1000.0, 3),
+        })
+    return {"sort": sort, "total_calls": st.total_calls, "top": rows}
+
+def profile_call(fn: Callable, *args, top: int = PROFILE_TOP, sort: str = "cumulative", **kw) -> Tuple[Any, Dict[str, Any]]:
+    """fn(*args, **kw) под cProfile → (результат, сводка по top функциям). Вызовы сериализуются."""
+    prof = cProfile.Profile()
+    with _lock:
+        t0 = time.perf_counter()
+        prof.enable()
+        try:
+            res = fn(*args, **kw)
+        finally:
+            prof.disable()
+        wall = time.perf_counter() - t0
+    summary = summarize(prof, top=top, sort=sort)
+    summary["wall_ms"] = round(wall * 1000.0, 3)
+    summary["isolated"] = ISOLATED
+    return res, summary
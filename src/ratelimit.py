@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limit: sliding window counter, O(1) на запрос и ограниченная память.
+
+Для ключа храним только (номер окна, счётчик прошлого окна, счётчик текущего);
+оценка = prev * (1 - доля прошедшего окна) + cur. Никаких списков таймстемпов.
+
+Бэкенды:
+- local — OrderedDict в процессе; ключи, простаивающие дольше 2 окон (своего окна —
+  у политик API-ключей оно может быть длиннее), и всё сверх max_keys вытесняются (LRU),
+  так что сканирующий трафик память не раздувает
+- shm — открытая адресация в multiprocessing.shared_memory + fcntl-локи по страйпам:
+  одна таблица на все воркеры (src.serve, uvicorn --workers), лимит не умножается на N.
+  Таблица фиксированного размера; при коллизии вытесняется самый давний из пробы.
+  Сегмент удаляет (unlink) процесс, который его создал, при close()/остановке
+
+Политики: лимит по умолчанию (на IP) и отдельные лимиты для API-ключей
+(ключ считается отдельным «клиентом» независимо от IP).
+"""
+import fcntl, hashlib, math, os, tempfile, threading, time
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+Policy = namedtuple("Policy", "limit window")  # limit запросов за window секунд; limit<=0 — без лимита
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limit exceeded, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class CostExceedsLimit(Exception):
+    """Батч больше лимита ключа: не пройдёт никогда, повтор бессмыслен."""
+    def __init__(self, cost: int, policy: Policy):
+        super().__init__(f"{cost} requests exceed the limit of {policy.limit} per {policy.window:g}s")
+        self.cost = cost
+        self.policy = policy
+
+def parse_policy(spec: str) -> Policy:
+    """"120/60" → 120 запросов за 60 с; "120" → за минуту."""
+    limit, _, window = str(spec).strip().partition("/")
+    return Policy(int(limit), float(window or 60))
+
+def parse_key_policies(spec: str) -> Dict[str, Policy]:
+    """"key1=1000/60,key2=10/1" → {api_key: Policy}."""
+    out: Dict[str, Policy] = {}
+    for part in (spec or "").split(","):
+        key, sep, pol = part.strip().rpartition("=")
+        if sep and key:
+            out[key] = parse_policy(pol)
+    return out
+
+def _slide(win: int, prev: int, cur: int, now: float, window: float) -> Tuple[int, int, int, float]:
+    """Сдвигает окно к now: (win, prev, cur, оценка числа запросов за последние window с)."""
+    w = int(now // window)
+    if w != win:
+        prev, cur = (cur, 0) if w == win + 1 else (0, 0)
+        win = w
+    frac = (now - w * window) / window
+    return win, prev, cur, prev * (1.0 - frac) + cur
+
+def _retry_after(prev: int, cur: int, limit: int, now: float, window: float, cost: int = 1) -> float:
+    # через сколько в оценку влезет ещё cost запросов (вклад prev убывает линейно до конца окна)
+    elapsed = now - (now // window) * window
+    if cur + cost > limit or prev <= 0:
+        return window - elapsed
+    t = window * (1.0 - (limit - cur - cost) / prev) - elapsed
+    return min(max(t, 0.0), window - elapsed)
+
+class LocalBackend:
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max(1, int(max_keys))
+        self._d: "OrderedDict[str, list]" = OrderedDict()  # key → [win, prev, cur, seen, window]
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def hit(self, key: str, limit: int, window: float, now: float, cost: int = 1) -> Tuple[bool, float, float]:
+        with self._lock:
+            st = self._d.get(key)
+            if st is None:
+                st = self._d[key] = [int(now // window), 0, 0, now, window]
+            else:
+                self._d.move_to_end(key)
+            win, prev, cur, est = _slide(st[0], st[1], st[2], now, window)
+            ok = est + cost <= limit
+            if ok:
+                cur += cost
+            st[:] = [win, prev, cur, now, window]
+            self._evict(now)
+            return ok, max(0.0, limit - est - (cost if ok else 0)), \
+                0.0 if ok else _retry_after(prev, cur, limit, now, window, cost)
+
+    def _evict(self, now: float):
+        # голова OrderedDict — самые давние ключи: O(1) амортизированно; простой меряется
+        # окном самой записи, а не окном текущего запроса
+        while self._d:
+            key, st = next(iter(self._d.items()))
+            if len(self._d) > self.max_keys or now - st[3] > 2 * st[4]:
+                self._d.popitem(last=False)
+                self.evictions += 1
+            else:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "local", "keys": len(self._d), "max_keys": self.max_keys, "evictions": self.evictions}
+
+_SLOT = np.dtype([("key", "<u8"), ("win", "<i8"), ("prev", "<i4"), ("cur", "<i4"), ("seen", "<f8"),
+                  ("window", "<f8")])
+_MAGIC = 0x484B5232  # "HKR2": раскладка слота с окном записи
+_HEADER = 64
+_PROBES = 8
+_STRIPES = 64
+
+class SharedMemoryBackend:
+    """Таблица слотов в именованной shared memory; создаёт или подключается к существующей."""
+    def __init__(self, name: str = "haka-ratelimit", slots: int = 65536, lock_dir: Optional[str] = None):
+        from multiprocessing import shared_memory, resource_tracker
+        self.name = name
+        self.slots = 1 << max(4, int(slots - 1).bit_length())  # степень двойки
+        size = _HEADER + self.slots * _SLOT.itemsize
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            created = False
+        # unlink — только владелец (родитель src.serve, см. claim) и только в своём процессе:
+        # воркер, случайно создавший сегмент первым, при перезапуске не должен удалять его у остальных
+        self._owner_pid: Optional[int] = None
+        # сегмент общий для всех воркеров: не даём resource_tracker удалить его при выходе процесса
+        try:
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except Exception:
+            pass
+        header = np.ndarray((2,), dtype="<u8", buffer=self._shm.buf[:16])
+        if created:
+            header[1] = self.slots
+            header[0] = _MAGIC
+        else:
+            for _ in range(100):  # создатель мог ещё не дописать заголовок
+                if header[0] == _MAGIC:
+                    break
+                time.sleep(0.01)
+            if header[0] != _MAGIC or int(header[1]) != self.slots:
+                raise ValueError(f"shared memory {name!r} has a different layout "
+                                 f"(slots={int(header[1])}, expected {self.slots})")
+        self.table = np.ndarray((self.slots,), dtype=_SLOT, buffer=self._shm.buf[_HEADER:size])
+        lock_path = os.path.join(lock_dir or tempfile.gettempdir(), f"{name}.lock")
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._tlock = threading.Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+        return h or 1  # 0 — пустой слот
+
+    def hit(self, key: str, limit: int, window: float, now: float, cost: int = 1) -> Tuple[bool, float, float]:
+        h = self._hash(key)
+        base = h & (self.slots - 1)
+        stripe = base % _STRIPES
+        with self._tlock:
+            # байтовый лок страйпа в lock-файле: процессы блокируют только «свою» часть таблицы
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                return self._hit_locked(h, base, limit, window, now, cost)
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+
+    def _hit_locked(self, h: int, base: int, limit: int, window: float, now: float, cost: int = 1):
+        t = self.table
+        idx, free, lru, lru_seen = -1, -1, -1, math.inf
+        for i in range(_PROBES):
+            # проба остаётся внутри страйпа: шаг _STRIPES сохраняет base % _STRIPES
+            j = (base + i * _STRIPES) & (self.slots - 1)
+            row = t[j]
+            if int(row["key"]) == h:
+                idx = j
+                break
+            seen = float(row["seen"])
+            if int(row["key"]) == 0 or now - seen > 2 * float(row["window"]):
+                if free < 0:
+                    free = j  # пустой или простаивающий слот
+            elif seen < lru_seen:
+                lru, lru_seen = j, seen
+        if idx < 0:
+            if free >= 0:
+                idx = free
+            else:
+                idx = lru  # все слоты пробы живые — вытесняем самый давний
+                self.evictions += 1
+            t[idx] = (h, int(now // window), 0, 0, now, window)
+        slot = t[idx]
+        win, prev, cur, est = _slide(int(slot["win"]), int(slot["prev"]), int(slot["cur"]), now, window)
+        ok = est + cost <= limit
+        if ok:
+            cur += cost
+        t[idx] = (h, win, prev, cur, now, window)
+        return ok, max(0.0, limit - est - (cost if ok else 0)), \
+            0.0 if ok else _retry_after(prev, cur, limit, now, window, cost)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "shm", "name": self.name, "slots": self.slots,
+                "keys": int(np.count_nonzero(self.table["key"])), "evictions": self.evictions}
+
+    def claim(self):
+        """Этот процесс владеет сегментом: удалит его при close. Форкнутые воркеры — нет."""
+        self._owner_pid = os.getpid()
+
+    def close(self, unlink: Optional[bool] = None):
+        """unlink=None — удалить сегмент, если этот процесс его владелец (claim)."""
+        if self.table is None:
+            return
+        if unlink is None:
+            unlink = self._owner_pid == os.getpid()
+        os.close(self._lock_fd)
+        self.table = None
+        self._shm.close()
+        if unlink:
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self._shm._name, "shared_memory")  # unlink() снимет регистрацию сам
+            self._shm.unlink()
+
+class RateLimiter:
+    def __init__(self, backend, default: Policy, key_policies: Optional[Dict[str, Policy]] = None):
+        self.backend = backend
+        self.default = default
+        self.key_policies = key_policies or {}
+        self.allowed = 0
+        self.limited = 0
+
+    def policy_for(self, ip: str, api_key: Optional[str] = None) -> Tuple[str, Policy]:
+        if api_key and api_key in self.key_policies:
+            # ключ хэшируем: в shm/статистику сырой ключ не попадает
+            return "k:" + hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:16], self.key_policies[api_key]
+        return "ip:" + ip, self.default
+
+    def check(self, ip: str, api_key: Optional[str] = None, now: Optional[float] = None, cost: int = 1) -> float:
+        """
+        Считает cost запросов (батч — по числу текстов) целиком или не считает ничего;
+        RateLimitExceeded, если не влезают сейчас, CostExceedsLimit — если больше самого
+        лимита. Возвращает остаток.
+        """
+        key, pol = self.policy_for(ip, api_key)
+        if pol.limit <= 0:
+            return math.inf
+        cost = max(1, int(cost))
+        if cost > pol.limit:
+            self.limited += 1
+            raise CostExceedsLimit(cost, pol)
+        ok, remaining, retry = self.backend.hit(f"{key}|{pol.limit}/{pol.window:g}", pol.limit, pol.window,
+                                                time.time() if now is None else now, cost)
+        if not ok:
+            self.limited += 1
+            raise RateLimitExceeded(retry)
+        self.allowed += 1
+        return remaining
+
+    def close(self):
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"allowed": self.allowed, "limited": self.limited,
+                "default": {"limit": self.default.limit, "window_sec": self.default.window},
+                "key_policies": len(self.key_policies), **self.backend.stats()}
+
+def limiter_from_env() -> RateLimiter:
+    """RATE_LIMIT_PER_MIN / RATE_LIMIT (напр. "120/60"), RATE_LIMIT_KEYS ("key=1000/60,..."),
+    RATE_LIMIT_BACKEND=local|shm, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHM_NAME, RATE_LIMIT_SLOTS."""
+    default = parse_policy(os.getenv("RATE_LIMIT") or f"{os.getenv('RATE_LIMIT_PER_MIN', '120')}/60")
+    keys = parse_key_policies(os.getenv("RATE_LIMIT_KEYS", ""))
+    if os.getenv("RATE_LIMIT_BACKEND", "local").lower() == "shm":
+        backend = SharedMemoryBackend(name=os.getenv("RATE_LIMIT_SHM_NAME", "haka-ratelimit"),
+                                      slots=int(os.getenv("RATE_LIMIT_SLOTS", "65536")))
+    else:
+        backend = LocalBackend(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
+    return RateLimiter(backend, default, keys)
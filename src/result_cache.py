@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов /analyze: LRU + TTL + склейка одинаковых запросов «в полёте».
+
+Ключ строится снаружи (хэш нормализованного текста + city_hint + версия модели),
+здесь — только хранение и счётчики.
+"""
+import asyncio, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class ResultCache:
+    def __init__(self, max_items: int = 10000, ttl_sec: float = 300.0):
+        self.max_items = max(1, int(max_items))
+        self.ttl = float(ttl_sec) if ttl_sec and ttl_sec > 0 else None
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        ts, value = item
+        if self.ttl is not None and time.monotonic() - ts > self.ttl:
+            del self._data[key]
+            self.expired += 1
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        # get + учёт hit/miss (для путей без склейки, например /analyze/batch)
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return hit, value
+
+    def put(self, key: str, value: Any):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            # тот же текст уже считается — ждём его результат, а не считаем второй раз
+            self.coalesced += 1
+        else:
+            hit, value = self.lookup(key)
+            if hit:
+                return value
+            # счёт — отдельная задача: отмена (обрыв клиента) любого из ждущих, включая
+            # первого, не отменяет её для остальных
+            task = self._inflight[key] = asyncio.ensure_future(self._compute(key, compute))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # без ждущих — не шумим
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "max_items": self.max_items,
+            "ttl_sec": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "inflight": len(self._inflight),
+            "hit_rate": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+        }
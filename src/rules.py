@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Движок правил: набор именованных регулярок, которые ищутся одним проходом по тексту.
+
+RuleSet([(имя, шаблон), ...]).scan(text) → {имя: начало первого совпадения} — то же,
+что дал бы re.search(шаблон, text, re.I) для каждого правила отдельно, но за один finditer:
+
+- по каждому правилу считается множество первых символов (разбор шаблона re._parser,
+  с учётом регистра); правила, начинающиеся с \\b и буквы/цифры, могут начаться только
+  в начале слова, остальные — на любом своём первом символе
+- общий шаблон начинается с класса символов «не-буква или первый символ свободного
+  правила» — его sre проматывает в C; в остальных позициях не исполняется ничего
+- в позиции-кандидате ветки правил идут с собственного класса первых символов, так что
+  sre пропускает неподходящие ветки без входа в них; сами правила — внутри lookahead
+  (совпадение нулевой длины), поэтому совпадение одного правила не прячет другие
+- если в одной позиции совпало несколько правил, остальные добираются «хвостами»
+  (альтернатива правил после найденного) через .match в той же позиции
+
+Разбор идёт по приватным re._parser/re._constants, поэтому предфильтр включён только на
+версиях Python из PREFILTER_VERSIONS (на каждой из них прогоняется tests/test_rules.py).
+На других версиях, без этих модулей, или если хоть одно правило разобрать не удалось,
+набор работает «простым путём» — по re.search на правило: результат тот же, медленнее.
+"""
+import re, sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+PREFILTER_VERSIONS = ((3, 8), (3, 13))  # включительно; новую версию — добавить после прогона тестов
+
+try:
+    from re import _constants as _C, _parser as _P  # Python 3.11+
+except ImportError:  # pragma: no cover
+    try:
+        import sre_constants as _C, sre_parse as _P  # type: ignore
+    except ImportError:
+        _C = _P = None
+
+_WORD = re.compile(r"\w")
+_MAX_RANGE = 4096  # диапазон шире — не перечисляем, набор уходит на простой путь
+_bmp: Optional[str] = None
+
+def prefilter_supported() -> bool:
+    lo, hi = PREFILTER_VERSIONS
+    return _P is not None and lo <= sys.version_info[:2] <= hi
+
+class _Unknown(Exception):
+    """Конструкция, для которой первые символы не считаем."""
+
+def _all_bmp() -> str:
+    # все символы BMP без суррогатов — для замыкания класса по регистру через сам re
+    global _bmp
+    if _bmp is None:
+        cps = array("I", range(0xD800))
+        cps.extend(range(0xE000, 0x10000))
+        _bmp = cps.tobytes().decode("utf-32-le" if array("I", [1]).tobytes()[0] else "utf-32-be")
+    return _bmp
+
+def _class(chars: Set[str], cats: Sequence[str] = ()) -> str:
+    return "[" + "".join(re.escape(c) for c in sorted(chars)) + "".join(sorted(cats)) + "]"
+
+def _case_closure(sets: List[Set[str]]) -> List[Set[str]]:
+    """
+    Для каждого множества — все символы, которые совпадают с ним под re.I. Один findall
+    по BMP на все множества сразу (регистровые пары вне BMP живут в своих блоках).
+    """
+    union = set().union(*sets)
+    if not union:
+        return [set() for _ in sets]
+    pool = set(re.findall(f"(?i){_class(union)}", _all_bmp())) | union
+    for c in union:
+        if ord(c) > 0xFFFF:
+            pool.update(x for x in (c.lower(), c.upper()) if len(x) == 1)
+    out = []
+    for chars in sets:
+        cls = re.compile(f"(?i){_class(chars)}") if chars else None
+        out.append({x for x in pool if cls.fullmatch(x)} | chars if cls else set())
+    return out
+
+def _first(items, bounded: bool, word: Set[str], free: Set[str], cats: Set[Tuple[str, bool]]) -> bool:
+    """
+    Первые символы последовательности items (разобранный шаблон): после \\b и словесный
+    символ → word, иначе → free; категории (\\d, \\s) → cats. Возвращает True, если
+    последовательность может совпасть с пустой строкой.
+    """
+    def add(c: str):
+        (word if bounded and _WORD.match(c) else free).add(c)
+
+    for op, av in items:
+        if op is _C.AT:
+            if av is not _C.AT_BOUNDARY:
+                raise _Unknown(av)
+            bounded = True
+        elif op is _C.LITERAL:
+            add(chr(av))
+            return False
+        elif op is _C.IN:
+            for o, a in av:
+                if o is _C.LITERAL:
+                    add(chr(a))
+                elif o is _C.RANGE and a[1] - a[0] < _MAX_RANGE:
+                    for x in range(a[0], a[1] + 1):
+                        add(chr(x))
+                elif o is _C.CATEGORY and a is _C.CATEGORY_DIGIT:
+                    cats.add((r"\d", bounded))  # \d — «словесный»
+                elif o is _C.CATEGORY and a is _C.CATEGORY_SPACE:
+                    cats.add((r"\s", False))
+                else:
+                    raise _Unknown(o)
+            return False
+        elif op is _C.SUBPATTERN:
+            if av[1] or av[2]:  # локальные флаги (?i:...) и т.п.
+                raise _Unknown("flags")
+            if not _first(av[3], bounded, word, free, cats):
+                return False
+        elif op is _C.BRANCH:
+            nullable = False
+            for alt in av[1]:
+                nullable |= _first(alt, bounded, word, free, cats)
+            if not nullable:
+                return False
+        elif op in (_C.MAX_REPEAT, _C.MIN_REPEAT):
+            nullable = _first(av[2], bounded, word, free, cats)
+            if av[0] > 0 and not nullable:
+                return False
+        else:
+            raise _Unknown(op)
+    return True
+
+class RuleSet:
+    """
+    Именованные правила (re.I), которые ищутся одним проходом. Порядок правил не влияет
+    на результат scan — только на то, какое из совпавших в одной позиции найдётся первым.
+    """
+    def __init__(self, rules: Sequence[Tuple[str, str]], prefilter: bool = True):
+        self.names: List[str] = [name for name, _ in rules]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("duplicate rule names")
+        self.patterns: Dict[str, "re.Pattern[str]"] = {name: re.compile(p, re.I) for name, p in rules}
+        self._index = {name: j for j, name in enumerate(self.names)}
+        self._stops: Dict[frozenset, frozenset] = {}
+        self._main: Optional["re.Pattern[str]"] = None  # None — простой путь
+        if rules and prefilter and prefilter_supported():
+            try:
+                self._compile(rules)
+            except Exception:  # шаблон не разобрался или приватный разбор разошёлся с этой версией re
+                self._main = None
+        self.prefiltered = self._main is not None
+
+    def _compile(self, rules: Sequence[Tuple[str, str]]):
+        n = len(rules)
+        word: List[Set[str]] = [set() for _ in range(n)]
+        free: List[Set[str]] = [set() for _ in range(n)]
+        cats: List[Set[Tuple[str, bool]]] = [set() for _ in range(n)]
+        for j, (_, p) in enumerate(rules):
+            if _first(_P.parse(p, re.I), False, word[j], free[j], cats[j]):
+                raise _Unknown("empty match")
+        word, free = _case_closure(word), _case_closure(free)
+        for j in range(n):  # регистровая пара словесного символа может оказаться не-словесной
+            free[j] |= {c for c in word[j] if not _WORD.match(c)}
+            word[j] = {c for c in word[j] if _WORD.match(c)}
+        firsts = [word[j] | free[j] for j in range(n)]
+        first_cats = [{c for c, _ in cats[j]} for j in range(n)]
+
+        # «символ из первых символов правила j, и с этой позиции совпадает правило j»
+        def alt(j: int, tag: str) -> str:
+            return f"{_class(firsts[j], first_cats[j])}(?<=(?=(?P<{tag}{j}>(?i:{rules[j][1]})))[\\s\\S])"
+
+        self._alts = [alt(j, "r") for j in range(n)]
+        # кандидат q: не-буква (тогда правила «с начала слова» проверяются в q+1)
+        # или первый символ свободного правила (свободные проверяются в q)
+        free_all = set().union(*free)
+        free_cats = {c for j in range(n) for c, bounded in cats[j] if not bounded}
+        self._free = re.compile(f"(?=\\W){_class(free_all, free_cats)}") if free_all or free_cats else None
+        word_alts = [alt(j, "r") for j in range(n) if word[j] or any(b for _, b in cats[j])]
+        free_alts = [alt(j, "f") for j in range(n) if free[j] or any(not b for _, b in cats[j])]
+        inner = [f"\\W(?=(?:{'|'.join(word_alts)}))"] if word_alts else []
+        head = _class(free_all, free_cats | ({r"\W"} if word_alts else set()))
+        main = re.compile(f"{head}(?<={'|'.join(inner + free_alts)})")
+
+        # правила после j, которые могут начаться в той же позиции (пересекаются первые символы):
+        # когда все они уже найдены, позицию можно не добирать
+        def overlap(a: int, b: int) -> bool:
+            if firsts[a] & firsts[b] or (first_cats[a] and first_cats[b]):
+                return True
+            return any(re.match(c, x) for c in first_cats[a] for x in firsts[b]) or \
+                any(re.match(c, x) for c in first_cats[b] for x in firsts[a])
+        self._co: List[frozenset] = [frozenset(range(n))] + \
+            [frozenset(k for k in range(j + 1, n) if overlap(j, k)) for j in range(n)]
+        self._at: Dict[int, "re.Pattern[str]"] = {}  # правила с индекса j — компилируются по мере надобности
+        # номер группы в общем шаблоне → индекс правила (lastindex дешевле разбора lastgroup)
+        self._rule_of = {g: int(name[1:]) for name, g in main.groupindex.items()}
+        self._main = main
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _at_pattern(self, j: int) -> "re.Pattern[str]":
+        pat = self._at.get(j)
+        if pat is None:
+            pat = self._at[j] = re.compile(f"[\\s\\S](?<={'|'.join(self._alts[j:])})")
+        return pat
+
+    def _collect(self, text: str, p: int, j: int, seen: Dict[int, int]):
+        """Добрать правила после j (j=-1 — все), совпадающие в позиции p."""
+        while True:
+            if self._co[j + 1] <= seen.keys():
+                return
+            m = self._at_pattern(j + 1).match(text, p)
+            if m is None:
+                return
+            j = int(m.lastgroup[1:])
+            if j not in seen:
+                seen[j] = p
+
+    def _scan(self, text: str, stop: Optional[frozenset], seen: Dict[int, int]):
+        self._collect(text, 0, -1, seen)  # начало строки: «с начала слова» без символа перед ним
+        free, co, rule_of, collect = self._free, self._co, self._rule_of, self._collect
+        for m in self._main.finditer(text):
+            if stop is not None and stop <= seen.keys():
+                break
+            g = m.lastindex
+            j, p = rule_of[g], m.start(g)
+            if p != m.start() and free is not None and free.match(text, p - 1):
+                # q = p-1 — не-буква и сам первый символ свободного правила: ветка «с начала
+                # слова» в p победила, правила в самой q добираем отдельно
+                collect(text, p - 1, -1, seen)
+            if j not in seen:
+                seen[j] = p
+            if not co[j + 1] <= seen.keys():
+                collect(text, p, j, seen)
+
+    def scan(self, text: str, stop_after: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        {имя правила: позиция первого совпадения} для всех совпавших правил. stop_after —
+        закончить, как только найдены все эти правила (позиции идут по возрастанию, так что
+        найденное к этому моменту точно; не найденные дальше не ищутся).
+        """
+        text = text or ""
+        seen: Dict[int, int] = {}
+        if self._main is None:  # простой путь: каждое правило — один search
+            for j, pat in enumerate(self.patterns.values()):
+                m = pat.search(text)
+                if m:
+                    seen[j] = m.start()
+        elif text:
+            stop = None
+            if stop_after:
+                key = stop_after if isinstance(stop_after, frozenset) else frozenset(stop_after)
+                stop = self._stops.get(key)
+                if stop is None:
+                    stop = self._stops[key] = frozenset(self._index[name] for name in key)
+            self._scan(text, stop, seen)
+        names = self.names
+        return {names[j]: p for j, p in sorted(seen.items(), key=lambda kv: (kv[1], kv[0]))}
+
+    def match(self, name: str, text: str, pos: int) -> Optional["re.Match[str]"]:
+        """Совпадение правила name в позиции pos (позиции — из scan)."""
+        return self.patterns[name].match(text, pos)
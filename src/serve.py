@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-fork сервер: модели и словари остановок грузятся один раз в родителе,
+воркеры uvicorn получают их через fork (copy-on-write), а не импортируют заново.
+
+    python -m src.serve --workers 8 --host 0.0.0.0 --port 8000
+
+- родитель импортирует src.api (ModelSet, STOP_DICT, geocode CSV), прогоняет
+  пайплайн на нескольких текстах (ленивые импорты/компиляции — тоже до fork)
+- gc.freeze() перед fork: всё загруженное уходит в permanent generation, сборщик
+  мусора в воркерах его не обходит и не пачкает страницы заголовками объектов
+- слушающий сокет открывает родитель, воркеры делают accept на нём же
+- упавший воркер перезапускается; SIGTERM/SIGINT — мягкая остановка всех
+
+Refcount'ы Python-объектов всё равно пишут в страницы, поэтому лучше всего делятся
+NumPy-буферы: с mmap-артефактами (MODEL_ARTIFACTS) веса и словари не копируются вовсе.
+Горячая перезагрузка моделей в воркере загружает новую версию уже в его память.
+"""
+import argparse, gc, os, signal, socket, sys, time
+from typing import Dict
+
+import structlog
+logger = structlog.get_logger(__name__)
+
+def _preload():
+    """Импорт приложения и прогрев — всё, что должно оказаться в общих страницах."""
+    from . import api, geocode  # noqa: F401  (geocode читает CSV при импорте)
+    from .model_registry import WARMUP_TEXTS
+    api._analyze_many(WARMUP_TEXTS)
+    return api.app
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _child(app, sock: socket.socket, args) -> int:
+    import uvicorn
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    gc.enable()
+    config = uvicorn.Config(app, log_level=args.log_level, lifespan="on",
+                            timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+    return 0
+
+def serve(args) -> int:
+    # до fork — никакого GC: иначе сборка перед freeze перетасует поколения зря
+    gc.disable()
+    app = _preload()
+    # shm-таблица лимита создана здесь, при импорте src.api: владелец — родитель, воркеры
+    # только подключаются и при перезапуске её не удаляют
+    from . import api
+    claim = getattr(api._limiter.backend, "claim", None)
+    if claim is not None:
+        claim()
+    sock = _bind(args.host, args.port, args.backlog)
+    if args.freeze:
+        gc.collect()
+        gc.freeze()
+
+    children: Dict[int, int] = {}  # pid → номер воркера
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = _child(app, sock, args)
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(args.workers):
+        spawn(slot)
+    logger.info("prefork_started", pid=os.getpid(), workers=args.workers,
+                host=args.host, port=args.port, frozen=gc.get_freeze_count())
+
+    restarts = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        restarts += 1
+        logger.warning("worker_died", pid=pid, slot=slot, status=status, restarts=restarts)
+        time.sleep(min(5.0, 0.1 * restarts))  # не крутим fork-бомбу, если воркер падает сразу
+        spawn(slot)
+    sock.close()
+    api._limiter.close()  # родитель — владелец shm-таблицы: удаляет её
+    return 0
+
+def main():
+    ap = argparse.ArgumentParser(description="pre-fork uvicorn: модели загружаются один раз в родителе")
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    ap.add_argument("--backlog", type=int, default=2048)
+    ap.add_argument("--keep-alive", type=int, default=5)
+    ap.add_argument("--log-level", default="info")
+    ap.add_argument("--no-freeze", dest="freeze", action="store_false", help="не вызывать gc.freeze() перед fork")
+    sys.exit(serve(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
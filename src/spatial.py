@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Пространственные запросы по остановкам и жалобам (для карты дашборда).
+
+- StopTree — cKDTree по координатам остановок StopIndex. Точки — единичные векторы
+  на сфере: хорда монотонна по дуге, так что k ближайших по дереву = k ближайших
+  по расстоянию на земле (без искажений долготы на широте Казахстана)
+- ComplaintStore — кольцевой буфер жалоб с координатами (NumPy-колонки ts/lat/lon/
+  priority/aspect). Горячие точки — агрегация по ячейкам сетки за окно времени:
+  маска по ts + np.unique по номеру ячейки, миллисекунды на сотнях тысяч записей.
+  Хранилище в памяти процесса: при нескольких воркерах у каждого своё
+"""
+import math, threading, time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .place_dict import StopIndex, get_stop_index
+
+EARTH_R = 6371008.8  # м
+_OFF = 1 << 30  # сдвиг номеров ячеек в неотрицательные: (y, x) → один int64
+
+def _unit(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    la, lo = np.radians(lat), np.radians(lon)
+    return np.column_stack((np.cos(la) * np.cos(lo), np.cos(la) * np.sin(lo), np.sin(la)))
+
+def _chord_to_m(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_R * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+def _m_to_chord(m: float) -> float:
+    return 2.0 * math.sin(min(math.pi / 2, m / (2.0 * EARTH_R)))
+
+class StopTree:
+    """KD-дерево по остановкам индекса, у которых есть координаты."""
+    def __init__(self, idx: StopIndex):
+        from scipy.spatial import cKDTree
+        self.index = idx
+        ok = ~(np.isnan(idx.lat) | np.isnan(idx.lon))
+        self.ids = np.flatnonzero(ok)
+        self.tree = cKDTree(_unit(idx.lat[ok], idx.lon[ok])) if len(self.ids) else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, lat: float, lon: float, k: int = 5, radius_m: Optional[float] = None,
+                city: Optional[str] = None) -> List[Dict[str, Any]]:
+        """k ближайших остановок к точке (не дальше radius_m, только город city)."""
+        if self.tree is None or k <= 0:
+            return []
+        cid = self.index.cities.index(city) if city in self.index.cities else None
+        if city and cid is None:
+            return []
+        ub = _m_to_chord(radius_m) if radius_m else np.inf
+        # с фильтром по городу берём с запасом: чужие города отсеются после
+        kk = min(len(self.ids), k if cid is None else max(4 * k, 32))
+        while True:
+            dist, pos = self.tree.query(_unit(np.array([lat]), np.array([lon]))[0], k=kk, distance_upper_bound=ub)
+            dist, pos = np.atleast_1d(dist), np.atleast_1d(pos)
+            keep = pos < len(self.ids)
+            dist, pos = dist[keep], pos[keep]
+            ids = self.ids[pos]
+            if cid is not None:
+                m = self.index.city_id[ids] == cid
+                ids, dist = ids[m], dist[m]
+            if len(ids) >= k or kk >= len(self.ids) or len(pos) < kk:
+                break
+            kk = min(len(self.ids), kk * 4)
+        out = []
+        for i, d in zip(ids[:k], _chord_to_m(dist[:k])):
+            rec = self.index.record(int(i))
+            rec["distance_m"] = round(float(d), 1)
+            out.append(rec)
+        return out
+
+_tree: Optional[StopTree] = None
+_tree_lock = threading.Lock()
+
+def get_stop_tree() -> StopTree:
+    """Дерево по текущему индексу; после reload_stops() пересобирается при первом запросе."""
+    global _tree
+    idx = get_stop_index()
+    t = _tree
+    if t is None or t.index is not idx:
+        with _tree_lock:
+            t = _tree
+            if t is None or t.index is not idx:
+                t = _tree = StopTree(idx)
+    return t
+
+def _crosstab(rows: np.ndarray, cols: np.ndarray, n_rows: int, n_cols: int) -> np.ndarray:
+    flat = rows * max(1, n_cols) + cols
+    return np.bincount(flat, minlength=n_rows * max(1, n_cols)).reshape(n_rows, max(1, n_cols))
+
+class ComplaintStore:
+    """
+    Кольцевой буфер жалоб с координатами: при переполнении затираются самые старые.
+    priority/aspect хранятся кодами (словари меток растут по мере появления).
+    """
+    def __init__(self, capacity: int = 200000):
+        self.capacity = max(1, int(capacity))
+        self.ts = np.zeros(self.capacity, dtype=np.float64)
+        self.lat = np.zeros(self.capacity, dtype=np.float64)
+        self.lon = np.zeros(self.capacity, dtype=np.float64)
+        self.prio = np.zeros(self.capacity, dtype=np.int16)
+        self.aspect = np.zeros(self.capacity, dtype=np.int16)
+        self.labels: Dict[str, List[str]] = {"priority": [], "aspect": []}
+        self._codes: Dict[str, Dict[str, int]] = {"priority": {}, "aspect": {}}
+        self.size = 0
+        self.pos = 0
+        self.added = 0
+        self._lock = threading.Lock()
+
+    def _code(self, kind: str, label: Optional[str]) -> int:
+        label = label or ""
+        c = self._codes[kind].get(label)
+        if c is None:
+            c = self._codes[kind][label] = len(self.labels[kind])
+            self.labels[kind].append(label)
+        return c
+
+    def add(self, lat: float, lon: float, priority: Optional[str] = None, aspect: Optional[str] = None,
+            ts: Optional[float] = None):
+        with self._lock:
+            i = self.pos
+            self.ts[i] = time.time() if ts is None else ts
+            self.lat[i], self.lon[i] = lat, lon
+            self.prio[i] = self._code("priority", priority)
+            self.aspect[i] = self._code("aspect", aspect)
+            self.pos = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.added += 1
+
+    def hotspots(self, window_sec: float = 3600.0, cell_m: float = 500.0, top: int = 50,
+                 priority: Optional[str] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Ячейки сетки cell_m × cell_m (по широте; по долготе — с поправкой на cos широты
+        центра Казахстана) с числом жалоб за последние window_sec секунд, по убыванию.
+        """
+        now = time.time() if now is None else now
+        # add() идёт из event loop, запрос — из threadpool: колонки и словари меток снимаем
+        # под локом (копии только отобранных строк), агрегируем уже без него
+        with self._lock:
+            n = self.size
+            ts = self.ts[:n]
+            m = (ts >= now - window_sec) & (ts <= now)
+            if priority is not None:
+                code = self._codes["priority"].get(priority)
+                m &= self.prio[:n] == (code if code is not None else -1)
+            sel = np.flatnonzero(m)
+            lat, lon, prio, asp = self.lat[sel], self.lon[sel], self.prio[sel], self.aspect[sel]
+            labels = {k: list(v) for k, v in self.labels.items()}
+        dlat = cell_m / 111320.0
+        dlon = dlat / math.cos(math.radians(48.0))
+        if not len(sel):
+            return {"total": 0, "cells": [], "cell_m": cell_m, "window_sec": window_sec}
+        iy = np.floor(lat / dlat).astype(np.int64)
+        ix = np.floor(lon / dlon).astype(np.int64)
+        cell = ((iy + _OFF) << 32) | (ix + _OFF)
+        cells, inv, counts = np.unique(cell, return_inverse=True, return_counts=True)
+        order = np.argsort(-counts, kind="stable")[:max(0, top)]
+        # разбивка по priority/aspect — только для отобранных ячеек
+        rank = np.full(len(cells), -1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        r = rank[inv]
+        keep = r >= 0
+        by_prio = _crosstab(r[keep], prio[keep], len(order), len(labels["priority"]))
+        by_asp = _crosstab(r[keep], asp[keep], len(order), len(labels["aspect"]))
+        out = []
+        for j, c in enumerate(cells[order]):
+            cy, cx = (int(c) >> 32) - _OFF, (int(c) & 0xFFFFFFFF) - _OFF
+            out.append({
+                "lat": round((cy + 0.5) * dlat, 6), "lon": round((cx + 0.5) * dlon, 6),
+                "count": int(counts[order[j]]),
+                "priorities": {labels["priority"][p]: int(v) for p, v in enumerate(by_prio[j]) if v},
+                "aspects": {labels["aspect"][a]: int(v) for a, v in enumerate(by_asp[j]) if v},
+            })
+        return {"total": int(len(sel)), "cells": out, "cell_m": cell_m, "window_sec": window_sec}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": self.size, "capacity": self.capacity, "added": self.added}
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Скомпилированный кэш словаря остановок: нормализованный STOP_DICT + StopIndex
+(и индекс geocode) в pickle, чтобы воркер при старте не разбирал YAML/CSV/GTFS заново.
+
+- ключ — пути, mtime и размеры исходников (+ env, влияющие на загрузку, и версия
+  кода place_dict): поменялся любой файл — кэш пересобирается при следующем импорте
+- файл: pickle заголовка (ключ, отпечатки исходников), затем pickle данных — при чужом
+  ключе данные не читаются
+- запись атомарная (tmp + os.replace): соседние воркеры видят старый или новый файл целиком
+- STOP_CACHE=0 — выключить, STOP_CACHE_DIR — каталог (по умолчанию .cache/stops);
+  кэш — это pickle, каталог должен быть доступен на запись только сервису
+
+    python -m src.stop_cache build            # собрать при деплое (до старта воркеров)
+    python -m src.stop_cache build --force    # пересобрать, даже если исходники не менялись
+    python -m src.stop_cache info             # когда собран, какие исходники изменились, размер
+"""
+import argparse, hashlib, json, logging, os, pickle, tempfile, time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+NAMES = ("stops", "geocode")
+
+def enabled() -> bool:
+    return os.getenv("STOP_CACHE", "1") != "0"
+
+def cache_path(name: str) -> str:
+    return os.path.join(os.getenv("STOP_CACHE_DIR", ".cache/stops"), f"{name}.pkl")
+
+def fingerprint(paths: Iterable[str]) -> List[list]:
+    """[[путь, mtime_ns, размер]] — отсутствующий файл тоже часть ключа (появится → пересборка)."""
+    out = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            out.append([p, st.st_mtime_ns, st.st_size])
+        except OSError:
+            out.append([p, None, None])
+    return out
+
+def cache_key(files: List[list], extra: Optional[Dict[str, Any]] = None) -> str:
+    raw = json.dumps({"version": CACHE_VERSION, "files": files, "extra": extra or {}},
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def read_header(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+def load(path: str, key: str) -> Optional[Any]:
+    try:
+        with open(path, "rb") as f:
+            if (pickle.load(f) or {}).get("key") != key:
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("stop_cache: unreadable %s (%s), rebuilding", path, e)
+        return None
+
+def save(path: str, header: Dict[str, Any], payload: Any):
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=d)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp, 0o644)  # mkstemp создаёт 0600: собранный при деплое кэш должны читать воркеры
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def cached(name: str, sources: Iterable[str], build: Callable[[], Any],
+           extra: Optional[Dict[str, Any]] = None) -> Any:
+    """Данные из кэша name, если ключ совпал, иначе build() (и запись в кэш)."""
+    if not enabled():
+        return build()
+    path = cache_path(name)
+    files = fingerprint(sources)
+    key = cache_key(files, extra)
+    payload = load(path, key)
+    if payload is not None:
+        return payload
+    payload = build()
+    try:
+        save(path, {"key": key, "files": files, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, payload)
+    except Exception as e:  # read-only FS и т.п. — работаем без кэша
+        logger.warning("stop_cache: cannot write %s (%s)", path, e)
+    return payload
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="скомпилированный кэш словаря остановок")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="собрать кэш (по умолчанию — только устаревшие части)")
+    b.add_argument("--force", action="store_true", help="пересобрать всё")
+    sub.add_parser("info", help="когда собран и какие исходники изменились")
+    args = ap.parse_args()
+    os.environ["STOP_CACHE"] = "1"
+
+    if args.cmd == "build":
+        if args.force:
+            for name in NAMES:
+                try:
+                    os.unlink(cache_path(name))
+                except FileNotFoundError:
+                    pass
+        t0 = time.perf_counter()
+        from . import place_dict, geocode  # импорт сам собирает устаревшие части
+        dt = (time.perf_counter() - t0) * 1000.0
+        snap = place_dict.stop_snapshot()
+        idx = snap.index
+        print(f"[build] stops={len(idx)} cities={len(idx.cities)} geocode={len(snap['geocode'])} "
+              f"in {dt:.0f} ms → {os.path.dirname(cache_path('stops'))}")
+    else:
+        # только заголовки: распаковка данных импортирует place_dict, а тот при устаревшем
+        # кэше пересобрал бы его. Новые файлы под glob'ами здесь не видны — их увидит ключ при импорте
+        out = {}
+        for name in NAMES:
+            path = cache_path(name)
+            head = read_header(path)
+            if head is None:
+                out[name] = {"path": path, "exists": os.path.exists(path)}
+                continue
+            out[name] = {"path": path, "created_at": head.get("created_at"), "sources": len(head["files"]),
+                         "changed": [f[0] for f in head["files"] if fingerprint([f[0]])[0] != f],
+                         "size_mb": round(os.path.getsize(path) / 2 ** 20, 2)}
+        print(json.dumps(out, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
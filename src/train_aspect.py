@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 import argparse, pathlib, re, numpy as np, pandas as pd, joblib
 from sklearn.model_selection import train_test_split, StratifiedKFold, GridSearchCV
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report
 from .utils import load_config
 from .constants import ASPECT_PATTERNS
+from .featurize import SharedFeaturizer, make_char_vectorizer
 
 SEED = 42
 
@@ -33,6 +33,8 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--mask", type=int, default=0, help="1=маскировать срабатывания правил")
     ap.add_argument("--drop_rule_hits_train", type=int, default=0, help="1=выкинуть из train строки, где сработали правила")
+    ap.add_argument("--hashing", type=int, default=0, help="1=HashingTfidf вместо словаря")
+    ap.add_argument("--char_bits", type=int, default=19, help="hashing: 2**bits бакетов")
     args = ap.parse_args()
 
     cfg = load_config()
@@ -55,11 +57,12 @@ def main():
         keep = [not _has_rule_hit(r, compiled) for r in raw_tr]
         X_train, y_train = X_train[keep], y_train[keep]
 
-    vect = TfidfVectorizer(
-        analyzer="char_wb", ngram_range=(3,5), min_df=3, sublinear_tf=True
-    )  # char_wb обычно «честнее» к утечкам
-    Xtr = vect.fit_transform(X_train)
-    Xte = vect.transform(X_test)
+    # char_wb обычно «честнее» к утечкам; те же параметры, что у priority-char,
+    # чтобы в API обе модели брали n-граммы из одного прохода
+    vect = make_char_vectorizer(hashing=bool(args.hashing), n_features=2 ** args.char_bits)
+    feats = SharedFeaturizer({"aspect": vect})
+    Xtr = feats.fit_transform(X_train)["aspect"]
+    Xte = feats.transform(X_test)["aspect"]
 
     # лёгкий грид по C
     param_grid = {"C": [0.5, 1.0, 2.0]}
@@ -75,7 +78,8 @@ def main():
     print(classification_report(y_test, y_pred))
 
     pathlib.Path("models").mkdir(exist_ok=True)
-    joblib.dump({"vect": vect, "clf": clf, "classes": np.unique(y)}, "models/aspect_lr.joblib")
+    joblib.dump({"vect": vect, "clf": clf, "classes": np.unique(y),
+                 "format": "hashing" if args.hashing else "vocab"}, "models/aspect_lr.joblib")
     print("[save] models/aspect_lr.joblib")
 
 if __name__ == "__main__":
@@ -3,12 +3,12 @@ import argparse, pathlib, numpy as np, pandas as pd, joblib
 from collections import Counter
 from scipy.sparse import hstack, vstack
 from sklearn.model_selection import train_test_split, StratifiedKFold, GridSearchCV
-from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.svm import LinearSVC
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.metrics import classification_report, confusion_matrix
 
 from .utils import load_config
+from .featurize import SharedFeaturizer, make_word_vectorizer, make_char_vectorizer
 
 SEED = 42
 
@@ -65,6 +65,13 @@ def main():
                     help=">1.0 = дублирование минорных классов (class-wise target)")
     ap.add_argument("--calib_split", type=float, default=0.15,
                     help="доля на калибровку (prefit)")
+    ap.add_argument("--char_analyzer", type=str, default="char", choices=["char", "char_wb"],
+                    help="char_wb — тот же анализатор, что у aspect: в API n-граммы строятся один раз "
+                         "на обе модели (сверьте отчёт по точности с char перед заменой)")
+    ap.add_argument("--hashing", type=int, default=0,
+                    help="1 = HashingTfidf вместо словаря (бандл без vocabulary_, быстрее грузится)")
+    ap.add_argument("--word_bits", type=int, default=18, help="hashing: 2**bits бакетов для word")
+    ap.add_argument("--char_bits", type=int, default=19, help="hashing: 2**bits бакетов для char")
     args = ap.parse_args()
 
     cfg = load_config()
@@ -74,12 +81,16 @@ def main():
     y = df["priority"].astype(str).values
     texts_raw = (df["text_clean"] if "text_clean" in df.columns else df["text"]).astype(str).values
 
-    # word + char (char n-grams уже помогают на шумных коротких жалобах)
-    vect_word = TfidfVectorizer(ngram_range=(1, 2), min_df=3, max_df=0.9, sublinear_tf=True)
-    vect_char = TfidfVectorizer(analyzer="char", ngram_range=(3, 5), min_df=3, sublinear_tf=True)
+    # word + char (char n-grams уже помогают на шумных коротких жалобах);
+    # оба векторизатора учатся за один проход предобработки текста
+    hashing = bool(args.hashing)
+    vect_word = make_word_vectorizer(hashing=hashing, n_features=2 ** args.word_bits)
+    vect_char = make_char_vectorizer(hashing=hashing, n_features=2 ** args.char_bits,
+                                     analyzer=args.char_analyzer)
 
-    Xw = vect_word.fit_transform(texts_raw)
-    Xc = vect_char.fit_transform(texts_raw)
+    feats = SharedFeaturizer({"word": vect_word, "char": vect_char})
+    Xs = feats.fit_transform(texts_raw)
+    Xw, Xc = Xs["word"], Xs["char"]
     X_all = hstack([Xw, Xc], format="csr")
 
     # держим тексты при сплите — пригодятся для hardcases
@@ -154,6 +165,7 @@ def main():
             "base_word": base_word,  # для explain
             "clf": clf,              # calibr. (sigmoid)
             "classes": np.unique(y),
+            "format": "hashing" if hashing else "vocab",
         },
         "models/priority.joblib",
     )
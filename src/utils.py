@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-import os, yaml, pandas as pd
+import os, re, hashlib, yaml, pandas as pd
+from unidecode import unidecode
 
 def load_config(path="config.yml"):
     with open(path, "r", encoding="utf-8") as f:
@@ -14,3 +15,22 @@ def read_csv_smart(path: str) -> pd.DataFrame:
         return pd.read_csv(path)
     except Exception:
         return pd.read_csv(path, sep=";")
+
+_RE_SPACES = re.compile(r"\s+")
+
+def norm_for_hash(s: str) -> str:
+    # та же нормализация, что и при дедупе датасета (preprocess)
+    s = unidecode((s or "").lower())
+    s = re.sub(r"[^a-z0-9а-яёқңғүұіһәө\- ]+", " ", s)
+    return _RE_SPACES.sub(" ", s).strip()
+
+def text_hash(s: str) -> str:
+    return hashlib.md5(norm_for_hash(s).encode()).hexdigest()
+
+def norm_spaces(s: str) -> str:
+    # только пробелы: регистр, пунктуация и письменность влияют на экстракторы
+    return _RE_SPACES.sub(" ", s or "").strip()
+
+def exact_text_hash(s: str) -> str:
+    # текст как есть: пробелы схлопывает _clean_input до ключа, здесь ничего не нормализуем
+    return hashlib.md5((s or "").encode("utf-8")).hexdigest()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import asyncio, importlib, json, os, sys
+import pytest
+from bench._fixtures import train_tiny_bundles
+from src.ratelimit import LocalBackend, Policy, RateLimiter
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    # src.api читает окружение и грузит модели при импорте: тренируем крошечные и импортируем заново
+    tmp = tmp_path_factory.mktemp("api")
+    train_tiny_bundles(str(tmp), n=200)
+    env = {"MODELS_DIR": str(tmp / "models"), "MODEL_ARTIFACTS": str(tmp / "no-artifacts"),
+           "INFERENCE_MODE": "inline", "API_KEY": "", "RESULT_CACHE_SIZE": "0", "MICROBATCH_WINDOW_MS": "0"}
+    old = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    sys.modules.pop("src.api", None)
+    try:
+        yield importlib.import_module("src.api")
+    finally:
+        sys.modules.pop("src.api", None)
+        for k, v in old.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+def _call(app, method, path, body=None, client=("10.0.0.1", 1)):
+    """Один HTTP-запрос прямо в ASGI-приложение: (status, json)."""
+    path, _, qs = path.partition("?")
+    scope = {"type": "http", "http_version": "1.1", "method": method, "path": path, "raw_path": path.encode(),
+             "query_string": qs.encode(), "headers": [(b"content-type", b"application/json")],
+             "client": client, "server": ("test", 80), "scheme": "http", "root_path": ""}
+    raw = json.dumps(body).encode() if body is not None else b""
+    out = {"status": None, "body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    async def send(msg):
+        if msg["type"] == "http.response.start":
+            out["status"] = msg["status"]
+        elif msg["type"] == "http.response.body":
+            out["body"] += msg.get("body", b"")
+
+    asyncio.run(app(scope, receive, send))
+    return out["status"], json.loads(out["body"] or b"null")
+
+TEXTS = ["Алматы, маршрут 19: водитель грубил пассажирам", "автобус 45 опоздал на 20 минут утром",
+         "в салоне драка на остановке Сайран", "Астана №12 переполнен, кешке", "onay карта не проходит"]
+
+def test_batch_keeps_order_and_matches_single(api, monkeypatch):
+    monkeypatch.setattr(api, "_limiter", RateLimiter(LocalBackend(), Policy(1000, 60)))
+    status, body = _call(api.app, "POST", "/analyze/batch", {"items": [{"text": t} for t in TEXTS]})
+    assert status == 200 and len(body["results"]) == len(TEXTS)
+    for t, got in zip(TEXTS, body["results"]):
+        status, single = _call(api.app, "POST", "/analyze", {"text": t})
+        assert status == 200 and got == single
+
+def test_batch_is_charged_per_text(api, monkeypatch):
+    monkeypatch.setattr(api, "_limiter", RateLimiter(LocalBackend(), Policy(6, 60)))
+    items = {"items": [{"text": t} for t in TEXTS]}
+    assert _call(api.app, "POST", "/analyze/batch", items)[0] == 200        # 5 из 6
+    assert _call(api.app, "POST", "/analyze/batch", items)[0] == 429        # ещё 5 не влезают
+    assert _call(api.app, "POST", "/analyze", {"text": TEXTS[0]})[0] == 200  # а 1 — влезает
+    assert _call(api.app, "POST", "/analyze", {"text": TEXTS[0]})[0] == 429
+    # батч больше самого лимита — 413 без Retry-After, а не вечный 429
+    monkeypatch.setattr(api, "_limiter", RateLimiter(LocalBackend(), Policy(3, 60)))
+    status, body = _call(api.app, "POST", "/analyze/batch", items)
+    assert status == 413 and "limit of 3 per 60s" in body["detail"]
+    assert _call(api.app, "POST", "/analyze/batch", {"items": items["items"][:3]})[0] == 200
+
+def test_cache_key_separates_texts_the_extractors_tell_apart(api):
+    from src.extractors import extract_participant, extract_route, extract_time
+    pairs = [("Водитель грубил на маршруте 5", "Voditel grubil na marshrute 5", extract_participant),
+             ("автобус в 08:30", "автобус в 08 30", extract_time),
+             ("Маршрут 5 авария", "marshrut 5 avariia", extract_route)]
+    for a, b, extract in pairs:
+        assert extract(a) != extract(b)
+        assert api._cache_key(a, None) != api._cache_key(b, None)
+    # пробелы ни на что не влияют: один ключ и тот же ответ
+    spaced = api._clean_input("  маршрут 12\n\nводитель   грубил\tна остановке  Сайран ")
+    plain = api._clean_input("маршрут 12 водитель грубил на остановке Сайран")
+    assert spaced == plain and api._cache_key(spaced, "Almaty") == api._cache_key(plain, "Almaty")
+    assert api._analyze_many(["маршрут 12\n\nводитель   грубил"])[0].probs == \
+        api._analyze_many(["маршрут 12 водитель грубил"])[0].probs
+
+def test_cache_key_keeps_case_and_whitespace_apart(api):
+    # ключ — точный текст, а не дедуп-хэш utils.text_hash (тот склеил бы все варианты)
+    variants = ["Маршрут 5, авария", "маршрут 5, авария", "Маршрут  5, авария", "Маршрут 5,авария", "Маршрут 5, авария "]
+    assert len({api._cache_key(v, None) for v in variants}) == len(variants)
+
+def test_stops_nearest_endpoint(api, monkeypatch):
+    from src import place_dict
+    for name in ("_SNAPSHOT", "STOP_DICT", "_INDEX"):  # вернуть словарь после теста
+        monkeypatch.setattr(place_dict, name, getattr(place_dict, name))
+    place_dict.publish_stops({
+        "Almaty": [{"name": "Сайран", "lat": 43.2400, "lon": 76.8700}, {"name": "Абай", "lat": 43.2500, "lon": 76.9000},
+                   {"name": "Без координат"}],
+        "Astana": [{"name": "Сарыарка", "lat": 51.1600, "lon": 71.4500}],
+    })
+    status, body = _call(api.app, "GET", "/stops/nearest?lat=43.241&lon=76.871&k=2")
+    assert status == 200 and body["indexed"] == 3
+    assert [s["name"] for s in body["stops"]] == ["Сайран", "Абай"] and body["stops"][0]["distance_m"] < 200
+    status, body = _call(api.app, "GET", "/stops/nearest?lat=43.241&lon=76.871&city=Astana&k=5")
+    assert [s["name"] for s in body["stops"]] == ["Сарыарка"]
+    assert _call(api.app, "GET", "/stops/nearest?lat=43.241&lon=76.871&radius_m=50")[1]["stops"] == []
+    assert _call(api.app, "GET", "/stops/nearest?lat=143&lon=76")[0] == 422
+
+def test_record_complaints_and_hotspots_endpoint(api, monkeypatch):
+    from src.spatial import ComplaintStore
+    monkeypatch.setattr(api, "_complaints", ComplaintStore(100))
+    Resp = api.AnalyzeResponse
+    api._record_complaints([
+        Resp(priority="high", aspect="safety", place={"name": "Сайран", "lat": 43.2400, "lon": 76.8700}),
+        Resp(priority="low", aspect="crowding", place={"name": "Сайран", "lat": 43.2401, "lon": 76.8701}),
+        Resp(priority="high", aspect="safety", place={"name": "Сарыарка", "lat": 51.16, "lon": 71.45}),
+        Resp(priority="low", place={"name": "без координат", "lat": None, "lon": None}),
+        Resp(priority="low", place=None),
+    ])
+    status, body = _call(api.app, "GET", "/complaints/hotspots?window_min=5&cell_m=1000")
+    assert status == 200 and body["stored"] == 3 and body["total"] == 3
+    assert [c["count"] for c in body["cells"]] == [2, 1]
+    assert body["cells"][0]["priorities"] == {"high": 1, "low": 1}
+    status, body = _call(api.app, "GET", "/complaints/hotspots?priority=high&top=1")
+    assert body["total"] == 2 and len(body["cells"]) == 1
+    assert _call(api.app, "GET", "/complaints/hotspots?cell_m=1")[0] == 422
+    monkeypatch.setattr(api, "_complaints", None)
+    assert _call(api.app, "GET", "/complaints/hotspots")[0] == 404
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import joblib
+import numpy as np
+import pytest
+from bench._fixtures import synthetic_corpus, train_tiny_bundles
+from src.artifacts import export_bundles, load_artifacts
+from src.featurize import SharedFeaturizer, hstack_features
+from src.compiled_model import CompiledCalibratedLinear
+
+@pytest.mark.parametrize("hashing", [False, True])
+def test_exported_artifacts_match_joblib(tmp_path, hashing):
+    p_path, a_path = train_tiny_bundles(str(tmp_path), n=240, hashing=hashing, word_bits=12, char_bits=13)
+    export_bundles(p_path, a_path, str(tmp_path / "artifacts"))
+    art = load_artifacts(str(tmp_path / "artifacts"))
+    P, A = joblib.load(p_path), joblib.load(a_path)
+    texts = [r["text"] for r in synthetic_corpus(40, seed=5)] + ["", "zzz неизвестное"]
+
+    ref = SharedFeaturizer({"word": P["vect_word"], "char": P["vect_char"], "aspect": A["vect"]}).transform(texts)
+    p2, a2 = art["priority"], art["aspect"]
+    got = SharedFeaturizer({"word": p2["vect_word"], "char": p2["vect_char"], "aspect": a2["vect"]}).transform(texts)
+    for name in ref:
+        assert (ref[name] != got[name]).nnz == 0
+
+    X = hstack_features([ref["word"], ref["char"]])
+    assert isinstance(p2["clf"].W, np.memmap) or isinstance(p2["clf"].W.base, np.memmap)
+    assert np.array_equal(CompiledCalibratedLinear.from_sklearn(P["clf"]).predict_proba(X), p2["clf"].predict_proba(X))
+    assert np.array_equal(A["clf"].predict(ref["aspect"]), a2["clf"].predict(ref["aspect"]))
+    assert art["version"]
+
+def test_feature_name_with_and_without_permutation():
+    from src.artifacts import MappedTfidf
+    names = ["аялдама", "водитель", "кешке", "маршрут"]
+    terms = np.array([t.encode("utf-8") for t in names])
+    assert [MappedTfidf({}, terms, None).feature_name(i) for i in range(4)] == names
+    feature_of = np.array([2, 0, 3, 1])  # позиция в terms → индекс признака
+    m = MappedTfidf({}, terms, None, index=feature_of)
+    assert [m.feature_name(int(f)) for f in feature_of] == names
+    assert list(m.lookup(names)) == list(feature_of)
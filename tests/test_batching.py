@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from src.batching import MicroBatcher
+
+def test_batcher_coalesces_and_keeps_order():
+    calls = []
+    def run(items):
+        calls.append(list(items))
+        return [x * 10 for x in items]
+
+    async def main():
+        b = MicroBatcher(run, window_ms=5, max_batch=8)
+        res = await asyncio.gather(*[b.submit(i) for i in range(10)])
+        return b, res
+
+    b, res = asyncio.run(main())
+    assert res == [i * 10 for i in range(10)]
+    assert [len(c) for c in calls] == [8, 2]
+    assert b.stats()["items"] == 10 and b.stats()["max_batch_size"] == 8
+
+def test_batcher_isolates_bad_item():
+    def run(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [s.upper() for s in items]
+
+    async def main():
+        b = MicroBatcher(run, window_ms=5, max_batch=4)
+        return await asyncio.gather(*[b.submit(s) for s in ("a", "bad", "c")], return_exceptions=True)
+
+    res = asyncio.run(main())
+    assert res[0] == "A" and res[2] == "C"
+    assert isinstance(res[1], ValueError)
+
+def test_batcher_fails_fast_on_overload():
+    class Busy(Exception):
+        pass
+    calls = []
+    def run(items):
+        calls.append(list(items))
+        raise Busy("pool saturated")
+
+    async def main():
+        b = MicroBatcher(run, window_ms=5, max_batch=8, fail_fast=(Busy,))
+        res = await asyncio.gather(*[b.submit(i) for i in range(5)], return_exceptions=True)
+        return b, res
+
+    b, res = asyncio.run(main())
+    assert all(isinstance(r, Busy) for r in res)
+    assert len(calls) == 1 and b.stats()["errors"] == 1  # без повторов по одному
+    assert not b._tasks
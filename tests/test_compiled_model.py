@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+from sklearn.svm import LinearSVC
+from sklearn.calibration import CalibratedClassifierCV
+from src.compiled_model import CompiledCalibratedLinear
+
+@pytest.mark.parametrize("n_classes", [2, 4])
+@pytest.mark.parametrize("cv", ["prefit", 3])
+def test_compiled_matches_sklearn_exactly(n_classes, cv):
+    rng = np.random.RandomState(0)
+    X = sparse_random(240, 60, density=0.15, format="csr", random_state=rng)
+    y = np.array(["low", "medium", "high", "critical"][:n_classes])[rng.randint(0, n_classes, 240)]
+    est = LinearSVC(dual=True, random_state=0)
+    if cv == "prefit":
+        est.fit(X, y)
+    clf = CalibratedClassifierCV(est, method="sigmoid", cv=cv).fit(X, y)
+
+    comp = CompiledCalibratedLinear.from_sklearn(clf)
+    pred, proba = comp.predict_with_proba(X)
+    assert np.array_equal(proba, clf.predict_proba(X))
+    assert np.array_equal(pred, clf.predict(X))
+
+def test_isotonic_is_not_compiled():
+    rng = np.random.RandomState(1)
+    X = sparse_random(120, 20, density=0.3, format="csr", random_state=rng)
+    y = rng.randint(0, 2, 120)
+    clf = CalibratedClassifierCV(LinearSVC(dual=True).fit(X, y), method="isotonic", cv="prefit").fit(X, y)
+    assert CompiledCalibratedLinear.from_sklearn(clf) is None
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import joblib
+import numpy as np
+from bench._fixtures import synthetic_corpus, train_tiny_bundles
+from src.artifacts import export_bundles, load_artifacts
+from src.explain_utils import ExplainEngine, engine_for_bundle
+
+def _sklearn_contributions(text, pred, vect, base):
+    """Эталон напрямую через sklearn: tfidf(text) * coef_[pred], только положительные, по убыванию."""
+    row = vect.transform([text]).toarray()[0]
+    coef = base.coef_[list(base.classes_).index(pred)]
+    names = vect.get_feature_names_out()
+    scores = row * coef
+    return sorted(((str(names[i]), float(scores[i])) for i in np.flatnonzero(scores > 0)), key=lambda x: -x[1])
+
+def _same(got, ref, k):
+    # равные вклады могут встать в любом порядке: сверяем значения по позициям и имена с их весами
+    assert len(got) == min(k, len(ref))
+    assert np.allclose([w for _, w in got], [w for _, w in ref[:k]])
+    ref_w = dict(ref)
+    assert all(np.isclose(ref_w[t], w) for t, w in got)
+
+def test_contributions_match_sklearn(tmp_path):
+    p_path, a_path = train_tiny_bundles(str(tmp_path), n=240)
+    P = joblib.load(p_path)
+    export_bundles(p_path, a_path, str(tmp_path / "artifacts"))
+    mapped = load_artifacts(str(tmp_path / "artifacts"))["priority"]
+    engines = [engine_for_bundle(P), ExplainEngine(mapped["vect_word"], mapped["base_word"])]
+    assert engines[1].mapped and engines[1].has_weights
+
+    texts = [r["text"] for r in synthetic_corpus(12, seed=9)] + ["водитель грубил, опасно едет водитель"]
+    Xw = P["vect_word"].transform(texts)
+    for pred in P["base_word"].classes_:
+        preds = [str(pred)] * len(texts)
+        refs = [_sklearn_contributions(t, pred, P["vect_word"], P["base_word"]) for t in texts]
+        for eng in engines:
+            for k in (3, 1000):
+                for got, ref in zip(eng.explain_batch(Xw, preds, k=k, texts=texts), refs):
+                    _same(got, ref, k)
+        assert engines[0].top_tokens(texts[-1], str(pred), k=3) == [t for t, _ in engines[0].contributions(
+            Xw[len(texts) - 1], str(pred), k=3)]
+
+    # без base_word — самые тяжёлые по TF-IDF токены текста, отрицательных весов нет
+    plain = ExplainEngine(P["vect_word"])
+    row = Xw[0].toarray()[0]
+    names = P["vect_word"].get_feature_names_out()
+    ref = sorted(((str(names[i]), float(row[i])) for i in np.flatnonzero(row)), key=lambda x: -x[1])
+    _same(plain.contributions(Xw[0], None, k=4), ref, 4)
+    assert plain.contributions(P["vect_word"].transform(["zzz"]), "high") == []
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import pickle
+import joblib, pytest
+import numpy as np
+from bench._fixtures import synthetic_corpus, train_tiny_bundles
+from src.featurize import SharedFeaturizer, make_word_vectorizer, make_char_vectorizer
+
+TRAIN = [
+    "маршрут 12 опоздал на остановке Сайран",
+    "автобус 5 переполнен, сығылыс",
+    "жүргізуші дөрекі, автобус кешікті",
+    "валидатор не работает, onay не проходит",
+    "в салоне грязно и холодно утром",
+    "драка в автобусе 32 вечером",
+]
+QUERY = ["маршрут 5 опоздал", "автобуста өрт", "неизвестные слова xyz"]
+
+def _featurizer():
+    return SharedFeaturizer({
+        "word": make_word_vectorizer(min_df=1, max_df=1.0),
+        "char": make_char_vectorizer(min_df=1),
+        "aspect": make_char_vectorizer(min_df=1),
+    })
+
+def test_char_and_aspect_share_one_pass():
+    f = _featurizer()
+    assert sorted(map(sorted, f.describe()["shared_groups"])) == [["aspect", "char"], ["word"]]
+
+def test_shared_transform_matches_vectorizers():
+    f = _featurizer()
+    f.fit_transform(TRAIN)
+    out = f.transform(QUERY)
+    for name, v in f.vectorizers.items():
+        ref = v.transform(QUERY)
+        assert out[name].shape == ref.shape
+        assert np.allclose(out[name].toarray(), ref.toarray(), rtol=0, atol=1e-12)
+
+def test_fit_restores_analyzer_and_pickles():
+    f = _featurizer()
+    f.fit_transform(TRAIN)
+    v = pickle.loads(pickle.dumps(f.vectorizers["char"]))
+    assert v.analyzer == "char_wb" and v.ngram_range == (3, 5)
+    assert v.transform(QUERY).shape[1] == len(v.vocabulary_)
+
+def test_hashing_variant_matches_and_has_no_vocabulary():
+    from src.explain_utils import ExplainEngine
+    f = SharedFeaturizer({
+        "word": make_word_vectorizer(hashing=True, n_features=2 ** 12, min_df=1, max_df=1.0),
+        "aspect": make_char_vectorizer(hashing=True, n_features=2 ** 14, min_df=1),
+    })
+    f.fit_transform(TRAIN)
+    out = f.transform(QUERY)
+    for name, v in f.vectorizers.items():
+        assert not hasattr(v, "vocabulary_")
+        ref = pickle.loads(pickle.dumps(v)).transform(QUERY)
+        assert out[name].shape == (len(QUERY), v.n_features)
+        assert np.allclose(out[name].toarray(), ref.toarray(), rtol=0, atol=1e-12)
+    # explain восстанавливает имена токенов по тексту
+    toks = ExplainEngine(f.vectorizers["word"]).explain_batch(out["word"], [None] * 3, texts=QUERY)
+    assert {t for t, _ in toks[0]} <= {"маршрут", "опоздал", "маршрут 5", "5 опоздал"}
+    assert toks[0]
+
+@pytest.mark.parametrize("char_analyzer", ["char", "char_wb"])
+def test_bundles_match_sklearn_with_either_priority_analyzer(tmp_path, char_analyzer):
+    # char — то, что по умолчанию пишет train_priority: priority-char и aspect в разных группах
+    p_path, a_path = train_tiny_bundles(str(tmp_path), n=200, char_analyzer=char_analyzer)
+    P, A = joblib.load(p_path), joblib.load(a_path)
+    assert P["vect_char"].analyzer == char_analyzer and A["vect"].analyzer == "char_wb"
+    f = SharedFeaturizer({"word": P["vect_word"], "char": P["vect_char"], "aspect": A["vect"]})
+    shared = ["aspect", "char"] in map(sorted, f.describe()["shared_groups"])
+    assert shared == (char_analyzer == "char_wb")
+    texts = [r["text"] for r in synthetic_corpus(50, seed=3)] + QUERY
+    out = f.transform(texts)
+    for name, v in f.vectorizers.items():
+        assert np.allclose(out[name].toarray(), v.transform(texts).toarray(), rtol=0, atol=1e-12)
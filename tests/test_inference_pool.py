@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import asyncio, time
+import pytest
+from src.inference_pool import InferencePool, PoolSaturated, DeadlineExceeded
+
+def _slow(x):
+    time.sleep(0.05)
+    return x
+
+def test_pool_rejects_when_queue_full():
+    pool = InferencePool(mode="thread", workers=1, max_queue=1)
+
+    async def main():
+        return await asyncio.gather(*[pool.run(_slow, i) for i in range(4)], return_exceptions=True)
+
+    res = asyncio.run(main())
+    pool.shutdown(wait=True)
+    assert res[:2] == [0, 1]
+    assert all(isinstance(r, PoolSaturated) for r in res[2:])
+    assert pool.stats()["rejected"] == 2
+
+def test_pool_deadline():
+    pool = InferencePool(mode="thread", workers=1, max_queue=4, deadline_ms=10)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(pool.run(_slow, 1))
+    pool.shutdown(wait=True)
+    assert pool.stats()["timeouts"] == 1
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import io, json, time
+import structlog
+from src import logging_conf
+from src.logging_conf import QueueSink
+
+class _SlowStream(io.StringIO):
+    def write(self, s):
+        time.sleep(0.05)  # медленный пайп (journald/docker под нагрузкой)
+        return super().write(s)
+
+def test_queue_sink_drops_instead_of_blocking():
+    stream = _SlowStream()
+    sink = QueueSink(structlog.processors.JSONRenderer(), stream=stream, maxsize=8, batch=4)
+    worst = 0.0
+    for i in range(500):
+        t0 = time.perf_counter()
+        sink.put({"event": "analyze", "i": i, "level": "info"})
+        worst = max(worst, time.perf_counter() - t0)
+    sink.close(timeout=5)
+    assert worst < 0.02  # put никогда не ждёт запись
+    assert sink.dropped > 0
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == sink.written == 500 - sink.dropped
+    assert json.loads(lines[0])["event"] == "analyze"
+
+def test_async_mode_with_sampling(monkeypatch, capsys):
+    monkeypatch.setenv("LOG_ASYNC", "1")
+    monkeypatch.setenv("LOG_SAMPLE", "analyze=0")
+    try:
+        logging_conf.setup_logging()
+        log = structlog.get_logger("t")
+        for _ in range(10):
+            log.info("analyze", n=1)
+        log.warning("analyze", n=2)  # warning и выше не сэмплируются
+        log.info("reload", version="v2")
+        logging_conf.get_sink().close(timeout=5)
+        out = [json.loads(l) for l in capsys.readouterr().out.splitlines() if l.startswith("{")]
+        assert [(r["event"], r["level"]) for r in out] == [("analyze", "warning"), ("reload", "info")]
+        assert logging_conf.log_stats()["sampled_out"] == 10
+    finally:
+        monkeypatch.delenv("LOG_ASYNC")
+        monkeypatch.delenv("LOG_SAMPLE")
+        with capsys.disabled():  # обратно в sync-режим на настоящий stdout
+            logging_conf.setup_logging()
+
+def test_counters_are_exact_under_threads_and_fork_hook_is_shared():
+    import os, threading
+    sink = QueueSink(structlog.processors.JSONRenderer(), stream=io.StringIO(), maxsize=1, batch=1)
+    sampler = logging_conf.EventSampler({"analyze": 0.0})
+
+    def spam():
+        for i in range(2000):
+            sink.put({"event": "x", "level": "info"})
+            try:
+                sampler(None, "info", {"event": "analyze"})
+            except structlog.DropEvent:
+                pass
+
+    threads = [threading.Thread(target=spam) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sink.close(timeout=5)
+    assert sink.dropped + sink.written == 16000
+    assert sampler.sampled_out == 16000
+    # новые приёмники не регистрируют собственных at-fork хуков: после fork перезапускается живой
+    assert sink in logging_conf._live_sinks
+    if hasattr(os, "fork"):
+        live = QueueSink(structlog.processors.JSONRenderer(), stream=io.StringIO())
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if live._thread.is_alive() and not sink._thread.is_alive() else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+        live.close()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from src.metrics import MetricsMiddleware, Registry
+
+def test_render_counter_gauge_histogram():
+    reg = Registry()
+    c = reg.counter("req", "requests", ("reason",))
+    c.labels("rate_limit").inc()
+    c.labels("rate_limit").inc(2)
+    g = reg.gauge("inflight", "in flight")
+    g.inc(); g.inc(); g.dec()
+    h = reg.histogram("lat", "latency", buckets=(0.01, 0.1, 1.0))
+    for v in (0.005, 0.01, 0.05, 5.0):
+        h.observe(v)
+    reg.add_collector(lambda: [("info", "gauge", "info", [("info", {"version": 'a"b'}, 1)])])
+    reg.add_collector(lambda: 1 / 0)  # сломанный коллектор scrape не роняет
+    lines = reg.render().splitlines()
+    assert "# TYPE req counter" in lines
+    assert 'req_total{reason="rate_limit"} 3' in lines
+    assert "inflight 1" in lines
+    # бакеты кумулятивные, граница включительно
+    assert 'lat_bucket{le="0.01"} 2' in lines
+    assert 'lat_bucket{le="0.1"} 3' in lines
+    assert 'lat_bucket{le="1"} 3' in lines
+    assert 'lat_bucket{le="+Inf"} 4' in lines
+    assert "lat_count 4" in lines
+    assert 'info{version="a\\"b"} 1' in lines
+    assert reg.histogram("lat", "latency", buckets=(0.01, 0.1, 1.0)) is h  # повторная регистрация
+
+def test_middleware_route_template():
+    reg = Registry()
+
+    class _Route:
+        path = "/items/{id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = _Route()
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _noop(msg):
+        pass
+
+    mw = MetricsMiddleware(app, registry=reg)
+    asyncio.run(mw({"type": "http", "method": "GET", "path": "/items/42"}, None, _noop))
+    text = reg.render()
+    assert 'haka_http_request_duration_seconds_count{method="GET",route="/items/{id}",status="201"} 1' in text
+    assert "haka_http_requests_in_flight 0" in text
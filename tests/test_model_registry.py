@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+from bench._fixtures import train_tiny_bundles
+from src.model_registry import ModelRegistry, activate, publish
+
+def test_publish_reload_and_swap(tmp_path):
+    root = str(tmp_path / "models")
+    train_tiny_bundles(str(tmp_path), n=200)
+    publish(root, "v1")
+    publish(root, "v2", make_active=False)
+
+    reg = ModelRegistry(root)
+    old = reg.reload()
+    assert old.version == "v1" and not reg.changed()
+
+    activate(root, "v2")
+    assert reg.changed()
+    new = reg.reload()
+    assert reg.current is new and new.version == "v2"
+    # старый набор остаётся рабочим для запросов, которые его уже взяли
+    assert old.predict_with_probs_batch(["автобус опоздал"])[0][0] in old.classes
+
+    with pytest.raises(FileNotFoundError):
+        reg.reload("missing")
+    assert reg.current is new and reg.failures == 1
+
+def test_version_is_persisted_only_after_it_loads(tmp_path):
+    root = str(tmp_path / "models")
+    train_tiny_bundles(str(tmp_path), n=200)
+    publish(root, "v1")
+    publish(root, "v2", make_active=False)
+    os.makedirs(os.path.join(root, "versions", "broken"))  # каталог без бандлов
+    reg = ModelRegistry(root)
+    reg.reload()
+
+    with pytest.raises(Exception):
+        reg.reload("broken", persist=True)
+    assert reg.active_version() == "v1" and reg.current.version == "v1"
+    for bad in ("../x", "..", "v1/../v2"):
+        with pytest.raises(FileNotFoundError):
+            reg.reload(bad, persist=True)
+        with pytest.raises(FileNotFoundError):
+            activate(root, bad)
+    assert reg.reload("v2", persist=True).version == "v2"
+    assert reg.active_version() == "v2" and not reg.changed()
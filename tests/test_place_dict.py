@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import math, os
+from src import place_dict
+from src.place_dict import StopIndex, fuzzy_stop_match
+
+STOPS = {
+    "Almaty": [
+        {"name": "Сайран", "aliases": ["Sayran"], "lat": 43.242, "lon": 76.882},
+        {"name": "Ақсай", "aliases": [], "lat": None, "lon": None},
+    ],
+    "Astana": [
+        {"name": "Сарыарка", "aliases": ["Сарыарқа"], "lat": 51.169, "lon": 71.449},
+        {"name": "Сайран", "aliases": [], "lat": 1.0, "lon": 2.0},  # дубль имени в другом городе
+    ],
+}
+
+def test_stop_index_columns_and_lookup():
+    idx = StopIndex(STOPS)
+    assert len(idx) == 4 and idx.cities == ["Almaty", "Astana"]
+    assert idx.lookup(" Сайран ") == 0  # первая запись с таким именем
+    assert idx.record(0) == {"name": "Сайран", "city": "Almaty", "lat": 43.242, "lon": 76.882}
+    assert idx.record(idx.lookup("Ақсай"))["lat"] is None and math.isnan(idx.lat[1])
+    assert idx.lookup("Абай") is None
+    assert len(idx.variants("Astana")) == 3 and len(idx.variants("Nowhere")) == 6
+
+def test_fuzzy_stop_match_uses_city_partition(monkeypatch):
+    monkeypatch.setattr(place_dict, "STOP_DICT", STOPS)
+    assert fuzzy_stop_match("у остановки sayran", city_hint="Almaty") == ("Сайран", 100)
+    assert fuzzy_stop_match("Сарыарқа аялдамасы", city_hint="Astana") == ("Сарыарка", 100)
+    # в разделе Almaty Сарыарки нет — только fuzzy-скор ниже 100
+    assert fuzzy_stop_match("Сарыарқа", city_hint="Almaty")[1] < 100
+    assert fuzzy_stop_match("   ") == (None, 0)
+    assert place_dict.get_stop_index().source is STOPS  # индекс пересобран под новый словарь
+
+def test_matcher_prefers_longest_whole_word_match():
+    idx = StopIndex({"Astana": [{"name": "Арқа"}, {"name": "Сарыарқа"}, {"name": "Абай"},
+                                {"name": "Абай даңғылы"}]})
+    # «Арқа» внутри «Сарыарқа» и «Абай» внутри «Абай даңғылы» проигрывают более длинным
+    assert idx.match("на остановке Сарыарқа")[0] == "Сарыарқа"
+    assert idx.match("Абай даңғылы бойында")[0] == "Абай даңғылы"
+    # ru/kk окончание после названия и пропущенный пробел перед ним
+    assert idx.match("Абайда тұрдық") == ("Абай", 100)
+    assert idx.match("у остановкиСарыарқа") == ("Сарыарқа", 100)
+    # подстрока внутри чужого слова — не прямое вхождение
+    assert idx.match("табайды")[1] < 100
+    found = idx.find_stops("Абай даңғылы мен Сарыарқа")
+    assert [(f["name"], f["tier"]) for f in found] == [("Абай", 2), ("Абай даңғылы", 2), ("Сарыарқа", 2)]
+
+def test_trigram_shortlist_keeps_typo_target():
+    stops = [{"name": f"Остановка {i}"} for i in range(300)] + [{"name": "Кетпаркет көшесі"}]
+    idx = StopIndex({"Almaty": stops[:150], "Astana": stops[150:]})
+    ids = idx.candidates(place_dict._norm_text("на остановке Кетпракет кошеси"), k=4)
+    assert len(ids) <= 4 and idx.lookup("Кетпаркет көшесі") in ids
+    # большой раздел — шорт-лист, тот же ответ, что и полный перебор
+    assert idx.match("на Кетпракет кошеси", shortlist=4) == idx.match("на Кетпракет кошеси", shortlist=0)
+    assert idx.match("на Кетпракет кошеси", shortlist=4)[0] == "Кетпаркет көшесі"
+    # город учитывается и в шорт-листе
+    assert idx.match("Кетпракет кошеси", city_hint="Almaty", shortlist=4)[0] != "Кетпаркет көшесі"
+    assert idx.match("zzz qqq", shortlist=4) == (None, 0)
+
+def _write_gtfs(path):
+    files = {
+        "stops.txt": "﻿stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+                     "S1,Абай,43.1,76.1,0,\nS1b,Абай,43.2,76.2,0,\nS2,Сайран,43.3,76.3,0,\n"
+                     "S3,Самал,43.4,76.4,0,\nE1,Вход,43.5,76.5,2,S2\n",
+        "routes.txt": "route_id,route_short_name,route_long_name\nR19,19,\nR32,032,\n",
+        "trips.txt": "route_id,service_id,trip_id\nR19,W,T1\nR32,W,T2\n",
+        "stop_times.txt": "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+                          "T1,08:00:00,08:00:00,S1,1\nT1,08:05:00,08:05:00,S2,2\nT2,09:00:00,09:00:00,S1b,1\n"
+                          "T2,09:05:00,09:05:00,S3,2\n",
+    }
+    path.mkdir()
+    for name, body in files.items():
+        (path / name).write_text(body, encoding="utf-8")
+
+def test_gtfs_feed_builds_route_index(tmp_path, monkeypatch):
+    _write_gtfs(tmp_path / "Almaty")
+    monkeypatch.setenv("GTFS_DIRS", str(tmp_path / "Almaty"))
+    base = {"Almaty": [{"name": "Сайран", "aliases": ["Sayran"], "lat": None, "lon": None}]}
+    d = place_dict._merge_gtfs(base, place_dict._load_gtfs_feeds())
+    recs = {r["name"]: r for r in d["Almaty"]}
+    # платформы одного имени слиты, вход пропущен, координаты дописаны к записи из YAML
+    assert sorted(recs) == ["Абай", "Сайран", "Самал"]
+    assert recs["Абай"]["routes"] == ["032", "19"] and recs["Абай"]["lat"] == 43.1
+    assert recs["Сайран"]["routes"] == ["19"] and recs["Сайран"]["aliases"] == ["Sayran"]
+    assert recs["Сайран"]["lat"] == 43.3
+
+    idx = StopIndex(d)
+    assert [idx.names[i] for i in idx.route_stops("19")] == ["Сайран", "Абай"]
+    assert [idx.names[i] for i in idx.route_stops(" 32 ")] == ["Абай", "Самал"]
+    # «Самран» чуть ближе к «Сайран», но 32-й через Сайран не ходит
+    assert idx.match("у остановки Самран")[0] == "Сайран"
+    assert idx.match("у остановки Самран", route="32")[0] == "Самал"
+    assert idx.match("у остановки Самран", route="19")[0] == "Сайран"
+    # прямое вхождение вне маршрута всё равно находится; неизвестный маршрут — обычный поиск
+    assert idx.match("Самал", route="19") == ("Самал", 100)
+    assert idx.match("у остановки Самран", route="777") == idx.match("у остановки Самран")
+
+def test_reload_stops_swaps_all_indexes(tmp_path, monkeypatch):
+    from src import extractors, geocode
+    for name in ("_SNAPSHOT", "STOP_DICT", "_INDEX"):  # вернуть как было после теста
+        monkeypatch.setattr(place_dict, name, getattr(place_dict, name))
+    monkeypatch.setenv("STOP_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("STOPS_GLOB", str(tmp_path / "*.yaml"))
+    monkeypatch.setenv("GTFS_DIRS", str(tmp_path / "nogtfs"))
+    y = tmp_path / "astana.yaml"
+    y.write_text("city: Astana\nstops:\n  - name: Сарыарка\n", encoding="utf-8")
+    assert place_dict.stops_changed()
+    st = place_dict.reload_stops()
+    assert st["stops"] == 1 and st["reloads"] >= 1 and st["last_reload_ms"] is not None
+    assert not place_dict.stops_changed()
+    assert fuzzy_stop_match("на Сарыарқа", city_hint="Astana")[1] < 100
+
+    # оператор добавил алиас — после reload он матчится напрямую, ALL_STOPS обновлён
+    y.write_text("city: Astana\nstops:\n  - name: Сарыарка\n    aliases: [Сарыарқа]\n", encoding="utf-8")
+    os.utime(y, ns=(1, 1))  # mtime гарантированно другой
+    assert place_dict.stops_changed()
+    old = place_dict.stop_snapshot()
+    place_dict.reload_stops()
+    new = place_dict.stop_snapshot()
+    assert new is not old and place_dict.get_stop_index() is new.index is not old.index
+    assert fuzzy_stop_match("на Сарыарқа", city_hint="Astana") == ("Сарыарка", 100)
+    assert extractors.ALL_STOPS == ["Сарыарка", "Сарыарқа"] and extractors.STOP_DICT is place_dict.STOP_DICT
+    # снимок, взятый запросом до reload, остаётся целым: свой словарь, индекс, geocode и ALL_STOPS
+    assert new.index.source is new.stop_dict and old.index.source is old.stop_dict
+    assert old["all_stops"] == ["Сарыарка"] and new["geocode"] is not None and "geocode" in old.derived
+    assert old.index.match("на Сарыарқа", city_hint="Astana")[1] < 100
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from src.profiling import profile_call
+
+def _slow(n):
+    acc = 0
+    for i in range(n):
+        acc += _inner(i)
+    return acc
+
+def _inner(i):
+    return i * i
+
+def test_profile_call_returns_result_and_top_functions():
+    res, prof = profile_call(_slow, 1000, top=5, sort="ncalls")
+    assert res == sum(i * i for i in range(1000))
+    assert prof["sort"] == "ncalls" and len(prof["top"]) <= 5
+    top = prof["top"][0]
+    assert "_inner" in top["func"] and top["ncalls"] == 1000
+    assert prof["wall_ms"] >= top["tottime_ms"] >= 0
+
+def test_profiled_calls_are_serialized():
+    import threading, time
+    active, peak = [0], [0]
+    guard = threading.Lock()
+
+    def work():
+        with guard:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with guard:
+            active[0] -= 1
+
+    threads = [threading.Thread(target=profile_call, args=(work,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 1
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os, uuid
+import pytest
+from src.ratelimit import (CostExceedsLimit, LocalBackend, Policy, RateLimiter, RateLimitExceeded,
+                           SharedMemoryBackend, parse_key_policies)
+
+T0 = 60.0 * 1000  # начало окна
+
+def _allowed(rl, n, ip="1.1.1.1", key=None, now=T0):
+    ok = 0
+    for i in range(n):
+        try:
+            rl.check(ip, key, now=now + i * 0.01)
+            ok += 1
+        except RateLimitExceeded:
+            pass
+    return ok
+
+@pytest.fixture(params=["local", "shm"])
+def backend(request):
+    if request.param == "local":
+        yield LocalBackend(max_keys=64)
+    else:
+        b = SharedMemoryBackend(name=f"test-rl-{uuid.uuid4().hex[:8]}", slots=256)
+        yield b
+        b.close(unlink=True)
+
+def test_sliding_window_and_key_policy(backend):
+    rl = RateLimiter(backend, Policy(5, 60), parse_key_policies("vip=50/60"))
+    assert _allowed(rl, 8) == 5
+    with pytest.raises(RateLimitExceeded) as e:
+        rl.check("1.1.1.1", now=T0 + 1)
+    assert 0 < e.value.retry_after <= 60
+    # через пол-окна прошлое окно весит половину: 5 * 0.5 = 2.5 → ещё 2 запроса
+    assert _allowed(rl, 5, now=T0 + 90) == 2
+    # свой лимит у API-ключа, не связанный с IP
+    assert _allowed(rl, 60, key="vip") == 50
+
+def test_memory_is_bounded_under_scanning(backend):
+    rl = RateLimiter(backend, Policy(5, 60))
+    for i in range(5000):
+        rl.check(f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", now=T0 + i * 0.001)
+    st = rl.stats()
+    assert st["keys"] <= 256 and st["evictions"] > 0
+
+def test_shm_limit_is_shared_between_workers():
+    name = f"test-rl-{uuid.uuid4().hex[:8]}"
+    a = SharedMemoryBackend(name=name, slots=256)
+    b = SharedMemoryBackend(name=name, slots=256)  # второй «воркер» подключается к той же таблице
+    try:
+        ra, rb = RateLimiter(a, Policy(10, 60)), RateLimiter(b, Policy(10, 60))
+        assert _allowed(ra, 6) + _allowed(rb, 6, now=T0 + 0.1) == 10
+        if hasattr(os, "fork"):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if _allowed(RateLimiter(a, Policy(10, 60)), 3, now=T0 + 0.2) == 0 else 1)
+            assert os.waitpid(pid, 0)[1] == 0
+    finally:
+        b.close()
+        a.close(unlink=True)
+
+def test_cost_is_charged_all_or_nothing(backend):
+    rl = RateLimiter(backend, Policy(10, 60))
+    assert rl.check("2.2.2.2", now=T0, cost=7) == 3
+    with pytest.raises(RateLimitExceeded):
+        rl.check("2.2.2.2", now=T0 + 1, cost=4)  # не влезает — не списывается ничего
+    assert rl.check("2.2.2.2", now=T0 + 2, cost=3) == 0
+    with pytest.raises(CostExceedsLimit) as e:
+        rl.check("3.3.3.3", now=T0, cost=11)  # больше лимита — не пройдёт никогда, ждать нечего
+    assert e.value.policy.limit == 10
+    assert rl.check("3.3.3.3", now=T0, cost=10) == 0  # отказ ничего не списал
+
+def test_short_window_traffic_keeps_long_window_counters(backend):
+    rl = RateLimiter(backend, Policy(1000, 1), parse_key_policies("slow=3/3600"))
+    assert _allowed(rl, 5, key="slow") == 3
+    # IP-трафик с окном 1 с идёт дальше; простой ключа «slow» меряется его часом, а не секундой
+    for i in range(300):
+        rl.check(f"9.9.9.{i % 20}", now=T0 + 10 + i)
+    assert _allowed(rl, 3, key="slow", now=T0 + 400) == 0
+
+def test_shm_segment_is_unlinked_only_by_its_owner():
+    from multiprocessing import shared_memory
+    name = f"test-rl-{uuid.uuid4().hex[:8]}"
+    a = SharedMemoryBackend(name=name, slots=64)
+    a.close()  # создатель без claim (первый воркер uvicorn) сегмент не удаляет
+    b = SharedMemoryBackend(name=name, slots=64)
+    b.hit("k", 5, 60, T0)
+    c = SharedMemoryBackend(name=name, slots=64)
+    assert int(c.table["cur"].sum()) == 1  # счётчики общие, сегмент тот же
+    c.close()
+    b.claim()
+    pid = os.fork()
+    if pid == 0:  # форкнутый воркер владельца тоже не удаляет
+        b.close()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    shared_memory.SharedMemory(name=name).close()
+    RateLimiter(b, Policy(1, 1)).close()
+    b.close()  # повторный close — no-op
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import asyncio, time
+from src.result_cache import ResultCache
+
+def test_lru_eviction_and_ttl():
+    c = ResultCache(max_items=2, ttl_sec=0.05)
+    c.put("a", 1); c.put("b", 2)
+    assert c.lookup("a") == (True, 1)
+    c.put("c", 3)  # "b" — самый старый по использованию
+    assert c.lookup("b") == (False, None)
+    assert c.stats()["evictions"] == 1
+    time.sleep(0.06)
+    assert c.lookup("a") == (False, None)
+
+def test_inflight_requests_share_one_computation():
+    c = ResultCache(max_items=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "res"
+
+    async def main():
+        return await asyncio.gather(*[c.get_or_compute("k", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["res"] * 5
+    assert len(calls) == 1
+    assert c.stats()["coalesced"] == 4
+
+def test_cancelled_leader_does_not_fail_coalesced_waiters():
+    c = ResultCache(max_items=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "res"
+
+    async def main():
+        leader = asyncio.ensure_future(c.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(c.get_or_compute("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()  # клиент первого запроса отключился
+        res = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        return res
+
+    assert asyncio.run(main()) == ["res"] * 3
+    assert len(calls) == 1 and c.lookup("k") == (True, "res") and c.stats()["inflight"] == 0
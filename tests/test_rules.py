@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import random, re
+from src import extractors as E
+from src import rules
+from src.constants import ASPECT_PATTERNS
+from src.rules import RuleSet
+
+# --- прежние реализации (по отдельной регулярке на правило) — эталон для scan_rules ---
+def _legacy_route(t):
+    for pat in E.ROUTE_PATTERNS:
+        m = pat.search(t)
+        if m:
+            for g in m.groups():
+                if g: return g
+    return None
+
+def _legacy_time(t):
+    if not t: return None
+    m = E.TIME_PAT.search(t)
+    if m: return m.group(0)
+    for label, p in E.TIME_WORDS:
+        if re.search(p, t, flags=re.I): return label
+    return None
+
+def _legacy_city(t):
+    t = t.lower()
+    for city, pats in E._CITY_PATTERNS.items():
+        for p in pats:
+            if re.search(p, t, flags=re.I): return city
+    return None
+
+def _legacy_aspects(t):
+    found = {asp for asp, pats in ASPECT_PATTERNS.items() if any(re.search(p, t, flags=re.I) for p in pats)}
+    return sorted(found) if found else ["other"]
+
+def _legacy_participant(t):
+    for pat, label in E.PARTICIPANT_PATTERNS:
+        m = pat.search(t)
+        if m: return {"role": label, "match": m.group(0)}
+    return None
+
+_FRAGMENTS = [
+    "маршрут 12", "маршрута№7", "N 45", "№128", "автобусы 32", "автобус", "19 бағыт", "5-бағыт", "12:30",
+    "9:05", "24:00", "в 7", "Астана", "НУР-СУЛТАН", "нурсултан", "NS", "алма ата", "Алматы", "almaty",
+    "водитель", "водителя", "жүргізуші", "хам", "грубил", "кондуктор", "контролёр", "инспектору",
+    "диспетчер", "оператор", "пассажиры", "кешке", "КЕШ", "кешігіп", "утром", "таңертең", "днем", "түс",
+    "учения", "плановая", "жоспарлы", "опасно", "драка", "авария", "өрт", "толы", "сығылыс", "переполнен",
+    "грязно", "лас", "шум", "двери не", "валидатор", "onay", "холодно", "ыстық", "Сайран", "остановке",
+    "a", "-", ",", ".", "\n", "  ", "x1", "١٢", "ſ",
+]
+
+def _texts(n=3000, seed=5):
+    rnd = random.Random(seed)
+    out = ["", "   ", "маршрут 12 опоздал", "автобусы 128 не остановились", "в 08:30", "Жүргізуші хам, Астана"]
+    for _ in range(n):
+        out.append("".join(rnd.choice(_FRAGMENTS) + rnd.choice(["", " ", " ", ", "]) for _ in range(rnd.randint(1, 12))))
+    return out
+
+def test_scan_rules_matches_legacy_extractors():
+    for t in _texts():
+        r = E.scan_rules(t)
+        assert r["route"] == _legacy_route(t), t
+        assert r["time"] == _legacy_time(t), t
+        assert r["city"] == _legacy_city(t), t
+        assert r["aspects"] == _legacy_aspects(t), t
+        assert r["participant"] == _legacy_participant(t), t
+        assert r["negated_safety"] == bool(E.NEGATE_SAFETY.search(t)), t
+        # обёртки сканируют только свой вид и останавливаются, как только ответ известен
+        assert (E.extract_route(t), E.extract_time(t), E.detect_city_hint(t), E.extract_participant(t)) == \
+            (r["route"], r["time"], r["city"], r["participant"]), t
+    assert E.scan_rules("Астана, №7", ("city", "route")) == {"city": "Astana", "route": "7"}
+    t = "Алматы, маршрут 19 кешке: водитель хамил, учения"
+    assert (E.extract_route(t), E.extract_time(t), E.detect_city_hint(t)) == ("19", "evening", "Almaty")
+    assert E.detect_aspects(t) == ["other"] and E.is_negated_safety(t)
+    assert E.extract_participant(t) == {"role": "driver", "match": "водитель"}
+
+def test_rule_set_finds_every_rule_at_its_first_match():
+    rs = RuleSet([
+        ("word", r"\bкеш\b"),           # только с начала слова
+        ("prefix", r"\bкеш\w*"),        # то же начало — совпадает в той же позиции
+        ("inner", r"еш"),               # внутри чужого совпадения
+        ("num", r"№\s*\d+"),            # «свободное» правило на не-букве
+        ("after", r"\b\d+\b"),          # начало слова сразу после №
+        ("kelvin", r"\bk\w+"),          # K (знак Кельвина) совпадает с k под re.I
+    ])
+    t = "кешке №12 кеш \u212aelvin"
+    assert rs.scan(t) == {"prefix": 0, "inner": 1, "num": 6, "after": 7, "word": 10, "kelvin": 14}
+    assert rs.match("num", t, 6).group(0) == "№12"
+    assert rs.scan("") == {} and rs.scan("ничего") == {}
+
+    # шаблон без разбираемых первых символов переводит набор на простой путь, ответ тот же
+    plain = RuleSet([("any", r"(?<=х)у"), ("word", r"\bкеш\b")])
+    assert not plain.prefiltered and plain.scan("хук кеш") == {"any": 1, "word": 4}
+
+def test_prefilter_is_pinned_and_degrades_to_plain_search(monkeypatch):
+    # на версиях из PREFILTER_VERSIONS предфильтр обязан включаться на правилах экстракторов
+    assert E.RULES.prefiltered == rules.prefilter_supported()
+    plain = RuleSet(E.RULE_SPECS, prefilter=False)
+    assert not plain.prefiltered
+    for t in _texts(800, seed=11):
+        assert E.RULES.scan(t) == plain.scan(t), t
+    # приватный разбор разошёлся с версией re — тот же набор, простой путь
+    def broken(*a, **kw):
+        raise AttributeError("SUBPATTERN")
+    monkeypatch.setattr(rules, "_first", broken)
+    degraded = RuleSet(E.RULE_SPECS)
+    assert not degraded.prefiltered and degraded.scan("Астана, №7 кешке") == plain.scan("Астана, №7 кешке")
+    monkeypatch.setattr(rules, "PREFILTER_VERSIONS", ((3, 0), (3, 1)))
+    assert not rules.prefilter_supported()
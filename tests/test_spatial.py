@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import math, random
+from src.place_dict import StopIndex
+from src.spatial import ComplaintStore, StopTree
+
+def _haversine(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * 6371008.8 * math.asin(math.sqrt(a))
+
+def test_stop_tree_matches_brute_force():
+    rnd = random.Random(3)
+    d = {c: [{"name": f"{c}-{i}", "lat": lat + rnd.uniform(-0.2, 0.2), "lon": lon + rnd.uniform(-0.2, 0.2)}
+             for i in range(300)] for c, lat, lon in (("Almaty", 43.24, 76.9), ("Astana", 51.16, 71.45))}
+    d["Almaty"].append({"name": "без координат", "lat": None, "lon": None})
+    tree = StopTree(StopIndex(d))
+    assert len(tree) == 600
+    recs = [r for c in ("Almaty", "Astana") for r in d[c] if r["lat"] is not None]
+    for lat, lon in ((43.25, 76.95), (51.0, 71.3), (47.0, 74.0)):
+        got = tree.nearest(lat, lon, k=5)
+        want = sorted(recs, key=lambda r: _haversine(lat, lon, r["lat"], r["lon"]))[:5]
+        assert [g["name"] for g in got] == [w["name"] for w in want]
+        assert abs(got[0]["distance_m"] - _haversine(lat, lon, want[0]["lat"], want[0]["lon"])) < 1.0
+
+    # фильтр по городу: из точки в Алматы — всё равно остановки Астаны
+    near = tree.nearest(43.25, 76.95, k=3, city="Astana")
+    assert len(near) == 3 and {r["city"] for r in near} == {"Astana"}
+    assert tree.nearest(43.25, 76.95, city="Nowhere") == []
+    # радиус: всё в пределах, и из центра степи ничего
+    assert all(r["distance_m"] <= 5000 for r in tree.nearest(43.24, 76.9, k=50, radius_m=5000))
+    assert tree.nearest(47.0, 74.0, radius_m=10000) == []
+
+def test_complaint_hotspots_window_priority_and_ring():
+    st = ComplaintStore(capacity=10)
+    now = 1_000_000.0
+    dlat = 500 / 111320.0
+    lat0 = (math.floor(43.24 / dlat) + 0.5) * dlat  # центр ячейки, чтобы не попасть на границу
+    for i in range(4):
+        st.add(lat0 + i * 1e-4, 76.9000, "high", "safety", ts=now - 60)
+    st.add(lat0 - 1e-4, 76.9001, "low", "crowding", ts=now - 30)
+    st.add(51.1600, 71.4500, "low", "punctuality", ts=now - 10)
+    st.add(43.2400, 76.9000, "high", "safety", ts=now - 7200)  # вне окна
+
+    h = st.hotspots(window_sec=3600, cell_m=500, now=now)
+    assert h["total"] == 6 and [c["count"] for c in h["cells"]] == [5, 1]
+    top = h["cells"][0]
+    assert top["priorities"] == {"high": 4, "low": 1} and top["aspects"] == {"safety": 4, "crowding": 1}
+    assert abs(top["lat"] - 43.24) < 0.005 and abs(top["lon"] - 76.9) < 0.01
+    assert [c["count"] for c in st.hotspots(cell_m=500, priority="low", now=now)["cells"]] == [1, 1]
+    assert st.hotspots(priority="critical", now=now)["total"] == 0
+    assert len(st.hotspots(cell_m=500, top=1, now=now)["cells"]) == 1
+
+    # кольцо: новые затирают самые старые
+    for i in range(10):
+        st.add(-33.9 - i * 1e-4, 18.4, "medium", "other", ts=now)
+    h = st.hotspots(window_sec=3600 * 24, now=now)
+    assert st.stats() == {"size": 10, "capacity": 10, "added": 17}
+    assert h["total"] == 10 and len(h["cells"]) == 1 and abs(h["cells"][0]["lat"] + 33.9) < 0.01
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from src import stop_cache
+from src.place_dict import StopIndex
+
+def test_cached_rebuilds_only_when_source_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("STOP_CACHE", "1")
+    monkeypatch.setenv("STOP_CACHE_DIR", str(tmp_path / "cache"))
+    src = tmp_path / "stops.csv"
+    src.write_text("name,lat,lon\nСайран,43.2,76.8\n", encoding="utf-8")
+    calls = []
+
+    def build():
+        calls.append(1)
+        return StopIndex({"Almaty": [{"name": "Сайран", "aliases": ["Sayran"]}]})
+
+    idx = stop_cache.cached("t", [str(src)], build)
+    again = stop_cache.cached("t", [str(src)], build)
+    assert len(calls) == 1 and again is not idx
+    # индекс из pickle рабочий: trie, триграммы и колонки на месте
+    assert again.match("у остановки sayran") == ("Сайран", 100)
+    assert again.match("на Сайрн")[0] == "Сайран"
+
+    src.write_text("name,lat,lon\nСайран,43.2,76.8\nАбай,43.1,76.9\n", encoding="utf-8")
+    stop_cache.cached("t", [str(src)], build)
+    stop_cache.cached("t", [str(src)], build, extra={"STOPS_GLOB": "x/*.yaml"})
+    assert len(calls) == 3
+
+    monkeypatch.setenv("STOP_CACHE", "0")
+    stop_cache.cached("t", [str(src)], build)
+    assert len(calls) == 4
+
+def test_broken_cache_file_is_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setenv("STOP_CACHE", "1")
+    monkeypatch.setenv("STOP_CACHE_DIR", str(tmp_path))
+    (tmp_path / "t.pkl").write_bytes(b"not a pickle")
+    assert stop_cache.cached("t", [], lambda: {"ok": 1}) == {"ok": 1}
+    assert stop_cache.load(str(tmp_path / "t.pkl"), stop_cache.cache_key([])) == {"ok": 1}
+    assert stop_cache.read_header(str(tmp_path / "t.pkl"))["files"] == []